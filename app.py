@@ -1,22 +1,60 @@
-from flask import Flask, render_template, request, redirect, session, url_for, flash, jsonify, json
+from flask import Flask, render_template, request, redirect, session, url_for, flash, jsonify, json, abort, g, Response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from models import db, User, Customer, Restaurant, UserType, MenuItem, CartItem, DeliveryArea, Order, OrderItem, Platform
-from flask_socketio import SocketIO, emit, join_room
-from datetime import datetime
-from sqlalchemy.orm import joinedload
+from flask_socketio import emit, join_room
+from datetime import datetime, timedelta
+from sqlalchemy import insert, update
+from sqlalchemy.orm import joinedload, selectinload
 from decimal import Decimal
+import hashlib
+import csv
+from delivery_index import delivery_index
+from events import socketio, queue_order_event, restaurant_room, customer_room, ORDER_CREATED
+import os
+import click
+from config import Config, install_sqlite_pragmas
+from pagination import order_page
+from cache import menu_cache, configure_menu_cache
+from fragments import fragment_cache, configure_fragment_cache
+from cart import cart_store, configure_cart_store, UnknownMenuItem, UnavailableMenuItem
+from jobs import job_queue, init_jobs, enqueue, job_handler, on_commit, PermanentJobError
+from order_state import (transition, can_transition, OrderNotFound, InvalidTransition,
+                         PROCESSING, BEING_PREPARED, COMPLETED, CANCELLED)
+from instrumentation import init_instrumentation, request_stats
+from auth import login_required, current_principal, configure_principal_cache
+from passwords import password_hasher, configure_password_hasher, PasswordPoolBusy
+from metrics import (registry, observe_transition, ORDERS_CREATED, CHECKOUT_FAILURES, CHECKOUT_SECONDS, CART_ITEMS,
+                     TRANSITION_SECONDS, SOCKET_JOINS)
+from message_queue import socketio_options
+import menu_bulk
+from search import search, search_available, rebuild_search_index, include_object as search_include_object
+from menu_bulk import MenuImportError
+from assets import assets, build_assets, configure_assets, manifest_path
+from ledger import record_platform_fee, platform_balance, rollup_platform_fees, reconcile_restaurant_balances
 
 app = Flask(__name__)
 
-# database configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///lieferspatz.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# database configuration (DATABASE_URL, pool and SQLite PRAGMAs come from the environment, see config.py)
+app.config.from_object(Config)
 
 db.init_app(app)
-migrate = Migrate(app, db)
-socketio = SocketIO(app)
-app.secret_key = 'your_secret_key' 
+with app.app_context():
+    install_sqlite_pragmas(db.engine, app.config['SQLITE_PRAGMAS'])
+    # registered before any other request hook so the timings cover them
+    init_instrumentation(app, db.engine)
+configure_menu_cache(app)
+configure_fragment_cache(app)
+configure_principal_cache(app)
+configure_password_hasher(app)
+configure_cart_store(app)
+configure_assets(app)
+init_jobs(app)
+registry.configure(app.config['METRICS_DIR'], app.config['METRICS_FLUSH_SECONDS'])
+# the FTS search tables are created by hand in their migration, autogenerate must not drop them
+migrate = Migrate(app, db, include_object=search_include_object)
+# SOCKETIO_MESSAGE_QUEUE fans events out across worker processes, see config.py and serve.py
+socketio.init_app(app, **socketio_options(app.config))
 
 
 @socketio.on('join_user')
@@ -26,11 +64,36 @@ def handle_user_join(data):
     if user_id and tab_session_id:
         room = f"user_{user_id}_{tab_session_id}"
         join_room(room)
-        print(f"User {user_id} joined room {room}")
+        SOCKET_JOINS.inc(kind='user')
+        app.logger.debug("user %s joined room %s", user_id, room)
+
+
+@socketio.on('join_customer')
+def handle_customer_join(data=None):
+    # customers receive events about their own orders only
+    if session.get('user_id') and session.get('user_type') == UserType.Customer.value:
+        join_room(customer_room(session['user_id']))
+        SOCKET_JOINS.inc(kind='customer')
+
+
+@socketio.on('join_restaurant')
+def handle_restaurant_join(data):
+    restaurant_id = (data or {}).get('restaurant_id')
+    if not restaurant_id or not session.get('user_id'):
+        return
+
+    # only the restaurant's own account may listen to its orders
+    restaurant = Restaurant.query.filter_by(RestaurantID=restaurant_id, UserID=session['user_id']).first()
+    if restaurant:
+        join_room(restaurant_room(restaurant.RestaurantID))
+        SOCKET_JOINS.inc(kind='restaurant')
 
 
 @app.before_request
 def validate_tab_session():
+    # assets are cached by browsers and proxies, their responses must not depend on or set the session
+    if request.endpoint == 'static':
+        return
     tab_session_id = request.form.get('tab_session_id') or request.args.get('tab_session_id')
     if 'tab_session_id' in session and session['tab_session_id'] != tab_session_id:
         session.clear()  # clear session if tab_session_id doesn't match
@@ -63,9 +126,8 @@ def restaurant_orders():
         flash("Restaurant not found.", "danger")
         return redirect(url_for('home'))  
 
-    # statuses for ongoing and completed orders
+    # statuses for ongoing orders
     ongoing_statuses = ['Processing', 'Being Prepared']
-    completed_statuses = ['Completed', 'Cancelled']  
 
     # fetch orders with related order items using joinedload for optimization
     ongoing_orders = Order.query.filter(
@@ -73,31 +135,55 @@ def restaurant_orders():
         Order.Status.in_(ongoing_statuses)
     ).options(joinedload(Order.order_items)).all()
 
-    completed_orders = Order.query.filter(
-        Order.RestaurantID == restaurant_id,
-        Order.Status.in_(completed_statuses)
-    ).options(joinedload(Order.order_items)).all()
+    # completed orders grow without bound, only the newest page is rendered, the rest is fetched on scroll
+    completed_orders, next_cursor = order_page(completed_orders_query(restaurant_id))
 
     return render_template(
         'restaurant-orders.html',
         ongoing_orders=ongoing_orders,
         completed_orders=completed_orders,
-        restaurant=restaurant
+        restaurant=restaurant,
+        next_url=url_for('restaurant_orders_page', restaurant_id=restaurant_id, cursor=next_cursor) if next_cursor else None
     )
 
 
+def completed_orders_query(restaurant_id):
+    return Order.query.filter(
+        Order.RestaurantID == restaurant_id,
+        Order.Status.in_(['Completed', 'Cancelled'])
+    ).options(selectinload(Order.order_items))
+
+
+@app.route('/restaurant_orders/page')
+def restaurant_orders_page():
+    # next page of completed orders for the infinite scroll on /restaurant_orders
+    restaurant_id = request.args.get('restaurant_id', type=int)
+    if not restaurant_id:
+        return {"error": "Restaurant ID is missing."}, 400
+
+    try:
+        completed_orders, next_cursor = order_page(completed_orders_query(restaurant_id), request.args.get('cursor'))
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
+    return {
+        "html": render_template('restaurant-order-cards.html', orders=completed_orders),
+        "next_url": url_for('restaurant_orders_page', restaurant_id=restaurant_id, cursor=next_cursor) if next_cursor else None
+    }
+
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     # redirect logged-in users based on their user type
     if 'user_id' in session:
-        user = db.session.get(User, session['user_id'])
-        if user is None:  # clear session if user ID is invalid
+        principal = current_principal()
+        if principal is None:  # clear session if user ID is invalid
             session.clear()
             return redirect(url_for('login'))
 
-        if user.UserType == UserType.Customer:
+        if principal.UserType == UserType.Customer:
             return redirect(url_for('orders'))  # redirect to customer orders page
-        elif user.UserType == UserType.Restaurant:
+        elif principal.UserType == UserType.Restaurant:
             return redirect(url_for('restaurant_dashboard'))  # redirect to restaurant dashboard
 
     if request.method == 'POST':
@@ -105,14 +191,24 @@ def login():
         password = request.form['password']
         tab_session_id = request.form.get('tab_session_id')
 
-        # query the database for the user
-        user = User.query.filter_by(EmailAddress=email).first()
+        # query the database for the user, together with the profile shown in the welcome message
+        user = User.query.options(joinedload(User.customer), joinedload(User.restaurant)).filter_by(EmailAddress=email).first()
 
         if not user:  # no user found
             flash('No account found with this email. Please sign up.', 'warning')
             return redirect(url_for('signup'))
 
-        if user.Password != password:  # invalid password
+        try:
+            valid, needs_rehash = password_hasher.verify(password, user.Password)
+            if valid and needs_rehash:
+                # legacy plaintext or outdated cost parameters, upgraded now that the password is known
+                user.Password = password_hasher.hash(password)
+                db.session.commit()
+        except PasswordPoolBusy:
+            flash('The server is busy, please try again in a moment.', 'warning')
+            return render_template('log-in.html'), 503
+
+        if not valid:  # invalid password
             flash('Invalid email or password.', 'danger')
             return render_template('log-in.html')
 
@@ -136,20 +232,9 @@ def login():
 
 
 @app.route('/restaurant_dashboard')
+@login_required(UserType.Restaurant)
 def restaurant_dashboard():
-    if 'user_id' not in session:
-        flash("You need to log in first.", "warning")
-        return redirect(url_for('login'))
-    
-    user_id = session['user_id']
-    user = db.session.get(User, user_id)
-    
-    if user and user.UserType == UserType.Restaurant:
-        restaurant = user.restaurant
-        return render_template('restaurant-dashboard.html', restaurant=restaurant)
-    else:
-        flash("You do not have access to this page.", "danger")
-        return redirect(url_for('login'))
+    return render_template('restaurant-dashboard.html', restaurant=g.principal.restaurant)
 
 @app.route('/logout')
 def logout():
@@ -186,7 +271,7 @@ def sign_up_customer():
                 return render_template('sign-up-customer.html', user_type=user_type)
 
             # create new user with UserType as Customer
-            new_user = User(EmailAddress=email, Password=password, UserType=user_type)
+            new_user = User(EmailAddress=email, Password=password_hasher.hash(password), UserType=user_type)
             db.session.add(new_user)
             db.session.commit()
 
@@ -208,6 +293,9 @@ def sign_up_customer():
             flash('Customer sign-up successful! Please log in.', 'success')
             return redirect(url_for('login'))  # redirect to login page
 
+        except PasswordPoolBusy:
+            flash('The server is busy, please try again in a moment.', 'warning')
+            return render_template('sign-up-customer.html', user_type='Customer'), 503
         except Exception as e:
             flash(f"An error occurred: {e}", 'danger')
             print(f"Error: {str(e)}")
@@ -251,7 +339,7 @@ def sign_up_restaurant():
             # create new user
             new_user = User(
                 EmailAddress=email,
-                Password=password, 
+                Password=password_hasher.hash(password),
                 UserType=UserType.Restaurant
             )
             db.session.add(new_user)
@@ -284,6 +372,9 @@ def sign_up_restaurant():
             flash('Restaurant sign-up successful! Please log in.', 'success')
             return redirect(url_for('login'))
 
+        except PasswordPoolBusy:
+            flash('The server is busy, please try again in a moment.', 'warning')
+            return render_template('sign-up-restaurant.html', user_type='Restaurant'), 503
         except Exception as e:
             db.session.rollback()  # rollback changes if there's an error
             flash(f"An error occurred: {e}", 'danger')
@@ -293,16 +384,41 @@ def sign_up_restaurant():
 
 
 @app.route('/orders')
+@login_required()
 def orders():
-    if 'user_id' not in session:
-        flash("You need to log in first.", "warning")
-        return redirect(url_for('login'))
+    user_id = g.principal.UserID
+
+    # newest page of the order history, older pages are fetched on scroll
+    orders, next_cursor = order_page(
+        Order.query.filter_by(CustomerID=user_id).options(selectinload(Order.order_items))
+    )
+
+    return render_template(
+        'customer-orders.html',
+        orders=customer_order_data(orders),
+        next_url=url_for('orders_page', cursor=next_cursor) if next_cursor else None
+    )
+
+
+@app.route('/orders/page')
+@login_required(api=True)
+def orders_page():
+    # next page of the customer's order history for the infinite scroll on /orders
+    try:
+        orders, next_cursor = order_page(
+            Order.query.filter_by(CustomerID=g.principal.UserID).options(selectinload(Order.order_items)),
+            request.args.get('cursor')
+        )
+    except ValueError as e:
+        return {"error": str(e)}, 400
 
-    user_id = session['user_id']
+    return {
+        "html": render_template('customer-order-cards.html', orders=customer_order_data(orders)),
+        "next_url": url_for('orders_page', cursor=next_cursor) if next_cursor else None
+    }
 
-    # fetch orders with order items in one query (optimized)
-    orders = Order.query.filter_by(CustomerID=user_id).options(joinedload(Order.order_items)).all()
 
+def customer_order_data(orders):
     order_data = []
     for order in orders:
         items = [
@@ -322,22 +438,25 @@ def orders():
             'total': total
         })
 
-    return render_template('customer-orders.html', orders=order_data)
+    return order_data
 
 @app.route('/create_order', methods=['POST'])
+@CHECKOUT_SECONDS.time()
+@login_required(UserType.Customer)
 def create_order():
     try:
-        # retrieve customer id from the session
-        customer_id = session.get('user_id')
-        if not customer_id:
-            flash("You need to be logged in to place an order.", "error")
-            return redirect(url_for('login'))
-
-        # retrieve customer and cart items based on the session's user_id
-        customer = Customer.query.filter_by(UserID=customer_id).first()
-        cart_items = CartItem.query.filter_by(UserID=customer_id).all()
-
-        if not cart_items:
+        customer_id = g.principal.UserID
+        # a key-value cart is copied into CartItems within this transaction
+        cart_store.materialize(customer_id)
+
+        # one joined read of the cart lines and their menu items
+        cart_lines = db.session.query(
+            CartItem.Quantity, MenuItem.MenuItemID, MenuItem.RestaurantID, MenuItem.Name, MenuItem.Price,
+            MenuItem.IsAvailable
+        ).outerjoin(MenuItem, CartItem.MenuItemID == MenuItem.MenuItemID).filter(CartItem.UserID == customer_id).all()
+
+        if not cart_lines:
+            CHECKOUT_FAILURES.inc(reason='empty_cart')
             flash("Your cart is empty!", "error")
             return redirect(url_for('cart'))
         
@@ -345,22 +464,19 @@ def create_order():
         additional_note = request.form.get('note', '').strip()
 
         # check if all items belong to the same restaurant
-        restaurant_id = None
-        total_amount = Decimal(0)
-        for item in cart_items:
-            menu_item = db.session.get(MenuItem, item.MenuItemID)
-            if not menu_item:
-                flash("One of the items is no longer available.", "error")
-                return redirect(url_for('cart'))
-
-            if restaurant_id is None:
-                restaurant_id = menu_item.RestaurantID
-            elif restaurant_id != menu_item.RestaurantID:
-                flash("You can only order from one restaurant at a time.", "error")
-                return redirect(url_for('cart'))
-
-            item_price = Decimal(menu_item.Price)  # ensure price is Decimal
-            total_amount += item_price * item.Quantity  # multiply using Decimal
+        restaurant_ids = {line.RestaurantID for line in cart_lines}
+        # deleted, or marked unavailable by the restaurant since it was added to the cart
+        if None in restaurant_ids or any(line.IsAvailable is False for line in cart_lines):
+            CHECKOUT_FAILURES.inc(reason='item_unavailable')
+            flash("One of the items is no longer available.", "error")
+            return redirect(url_for('cart'))
+        if len(restaurant_ids) > 1:
+            CHECKOUT_FAILURES.inc(reason='several_restaurants')
+            flash("You can only order from one restaurant at a time.", "error")
+            return redirect(url_for('cart'))
+        restaurant_id = restaurant_ids.pop()
+
+        total_amount = sum((Decimal(line.Price) * line.Quantity for line in cart_lines), Decimal(0))
 
         # round the total amount to 2 decimal places
         total_amount = total_amount.quantize(Decimal('0.01'))
@@ -372,8 +488,16 @@ def create_order():
         restaurant_amount = total_amount - platform_fee
         restaurant_amount = restaurant_amount.quantize(Decimal('0.01'))
 
-        # check if the customer has sufficient balance
-        if customer.Balance < total_amount:
+        # deduct from customer balance in one guarded statement, nothing is updated if it does not cover the total
+        charged = db.session.execute(
+            update(Customer)
+            .where(Customer.UserID == customer_id, Customer.Balance >= float(total_amount))
+            .values(Balance=Customer.Balance - float(total_amount))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not charged:
+            db.session.rollback()
+            CHECKOUT_FAILURES.inc(reason='insufficient_balance')
             flash("Insufficient balance to place the order.", "error")
             return redirect(url_for('cart'))
 
@@ -390,44 +514,59 @@ def create_order():
         db.session.add(new_order)
         db.session.flush()  # get OrderID before commit
 
-        # create Order Items
-        for item in cart_items:
-            menu_item = db.session.get(MenuItem, item.MenuItemID)
-            order_item = OrderItem(
-                OrderID=new_order.OrderID,
-                MenuItemName=menu_item.Name,  # populate MenuItemName
-                MenuItemPrice=menu_item.Price,  # populate MenuItemPrice
-                Quantity=item.Quantity
-            )
-            db.session.add(order_item)
-
-        # deduct from customer balance
-        customer.Balance -= float(total_amount)  # convert Decimal back to float
+        # create all Order Items with a single executemany, name and price are copied at order time
+        db.session.execute(insert(OrderItem), [
+            {
+                "OrderID": new_order.OrderID,
+                "MenuItemName": line.Name,
+                "MenuItemPrice": line.Price,
+                "Quantity": line.Quantity
+            }
+            for line in cart_lines
+        ])
 
-        # update platform balance
-        platform = Platform.query.first()
-        if not platform:
-            platform = Platform(Balance=platform_fee)
-            db.session.add(platform)
-        else:
-            platform.Balance += platform_fee
+        # append the platform fee to the ledger, the Platform row is only written by the rollup
+        record_platform_fee(new_order.OrderID, platform_fee)
 
         # remove cart items after the order is created
         CartItem.query.filter_by(UserID=customer_id).delete()
 
+        # notify restaurant and customer once the order is committed
+        queue_order_event(db.session, ORDER_CREATED, new_order)
+
         # commit transaction
         db.session.commit()
+        cart_store.checked_out(customer_id)
+        ORDERS_CREATED.inc()
+        CART_ITEMS.observe(sum(line.Quantity for line in cart_lines))
 
         flash("Order placed successfully!", "success")
         return redirect(url_for('orders'))
 
     except Exception as e:
         db.session.rollback()
+        CHECKOUT_FAILURES.inc(reason='error')
         flash(f"Error: {str(e)}", "error")
         return redirect(url_for('cart'))
 
 
+def _transition_key(order, target):
+    # a second click on the same button (same order, same version) finds the job of the first one
+    return f"order-{order.OrderID}:v{order.Version}->{target}"
+
+
+def _run_transition(order_id, status, expected_status):
+    # one conditional UPDATE with its balance effects, committed by the job worker
+    try:
+        change = transition(order_id, status, expected_status)
+    except (OrderNotFound, InvalidTransition) as e:
+        raise PermanentJobError(str(e)) from e
+    if change is not None:
+        on_commit(observe_transition, change.previous_status, change.status, change.since)
+
+
 @app.route('/update-order-status/<int:order_id>', methods=['POST'])
+@TRANSITION_SECONDS.time(route='update_order_status')
 def update_order_status(order_id):
     data = request.get_json()
     status = data.get('status')
@@ -438,41 +577,35 @@ def update_order_status(order_id):
     if not order:
         return jsonify({"message": "Order not found!"}), 404
 
-    # handle the status update and balances
-    if status == "Being Prepared":  # if the restaurant accepts the order
-        # deduct from the customer's balance
-        customer = db.session.get(Customer, order.CustomerID)
-        if customer.Balance < order.TotalAmount:
-            return jsonify({"message": "Insufficient balance to process the order!"}), 400
-
-        customer.Balance -= order.TotalAmount
+    # nothing to change, answer without queueing a job
+    if status == order.Status:
+        return jsonify({"message": f"Order is already {status}.", "orderStatus": order.Status}), 200
 
-        # add to the restaurant's balance (restaurant amount after platform fee)
-        restaurant = db.session.get(Restaurant, order.RestaurantID)
-        restaurant.Balance += order.RestaurantAmount  # add restaurant's share
+    if not can_transition(order.Status, status):
+        return jsonify({"message": f"An order that is {order.Status} cannot become {status}!"}), 409
 
-        db.session.commit()  # commit changes to balances
-
-    # update the order status based on whether the restaurant is marking it as "done"
-    if status == "Completed":
-        # update the status for the restaurant to 'Completed'
-        order.Status = "Completed"
-        # also mark it as "Delivered" for the customer
-        order.CustomerStatus = "Delivered" # update the customer status
-        db.session.commit()
-
-    # update the order status
-    order.Status = status
+    # the change and its balance updates run in the job worker, answer once it is durably queued; the
+    # order_status_changed event tells the clients when it was applied
+    client_key = request.headers.get('Idempotency-Key')
+    job_id, _ = enqueue('update_order_status', {"order_id": order_id, "status": status, "expected_status": order.Status},
+                        f"update_order_status:{client_key}" if client_key else _transition_key(order, status))
     db.session.commit()
 
     return jsonify({
-        "message": "Order status updated successfully!",
-        "orderStatus": order.Status,
-        "customerBalance": customer.Balance if customer else None,
-        "restaurantBalance": restaurant.Balance if restaurant else None
-    }), 200
+        "message": "Order status update queued!",
+        "jobId": job_id,
+        "status": "queued"
+    }), 202
+
+@job_handler('update_order_status')
+def update_order_status_job(order_id, status, expected_status=None):
+    _run_transition(order_id, status, expected_status)
+
+# restaurant actions and the status they lead to
+ORDER_ACTIONS = {'accept': BEING_PREPARED, 'reject': CANCELLED}
 
 @app.route('/accept_or_reject_order/<int:order_id>/<string:action>', methods=['POST'])
+@TRANSITION_SECONDS.time(route='accept_or_reject_order')
 def accept_or_reject_order(order_id, action):
     order = Order.query.get(order_id)
 
@@ -480,37 +613,29 @@ def accept_or_reject_order(order_id, action):
         flash("Order not found.", "danger")
         return redirect(url_for('restaurant_orders', restaurant_id=session.get('restaurant_id')))
 
-    if action == 'accept':
-        order.Status = 'Being Prepared'  # update the status to 'Being Prepared'
-    elif action == 'reject':
-        order.Status = 'Cancelled'
-        reverse_payment(order) 
+    if action not in ORDER_ACTIONS:
+        flash("Unknown action.", "danger")
+        return redirect(url_for('restaurant_orders', restaurant_id=order.RestaurantID))
 
+    if order.Status != PROCESSING:
+        flash(f"Order #{order.OrderID} is already {order.Status.lower()}.", "warning")
+        return redirect(url_for('restaurant_orders', restaurant_id=order.RestaurantID))
+
+    enqueue('accept_or_reject_order', {"order_id": order_id, "action": action, "expected_status": order.Status},
+            _transition_key(order, ORDER_ACTIONS[action]))
     db.session.commit()
-    flash(f"Order {action}ed successfully.", "success")
+    flash(f"Order #{order.OrderID}: {'acceptance' if action == 'accept' else 'rejection'} queued.", "success")
 
     # redirect back to the restaurant orders page with restaurant_id
     return redirect(url_for('restaurant_orders', restaurant_id=order.RestaurantID))
 
-
-def process_payment(order):
-    # deduct balance from customer account
-    if order.Status == 'Being Prepared':
-        customer = order.customer 
-        customer.balance -= order.TotalAmount  # deduct the order amount from customer's balance
-        db.session.commit()  # commit changes to the database
-
-def reverse_payment(order):
-    # ensure the order has a valid customer
-    if not order.customer or not order.customer.customer:  # access the 'Customer' model via 'User'
-        raise ValueError("The order does not have an associated customer with a balance.")
-
-    customer = order.customer.customer  # access the Customer model
-    customer.Balance += float(order.TotalAmount)  # adjust the customer's balance
-    db.session.commit()
+@job_handler('accept_or_reject_order')
+def accept_or_reject_order_job(order_id, action, expected_status=None):
+    _run_transition(order_id, ORDER_ACTIONS[action], expected_status)
 
 
 @app.route('/mark_as_done/<int:order_id>', methods=['POST'])
+@TRANSITION_SECONDS.time(route='mark_as_done')
 def mark_as_done(order_id):
     order = Order.query.get(order_id)
 
@@ -518,23 +643,19 @@ def mark_as_done(order_id):
         flash("Order not found.", "danger")
         return redirect(url_for('restaurant_orders'))
 
-    if order.Status != 'Being Prepared':
+    if order.Status != BEING_PREPARED:
         flash("Only orders that are being prepared can be marked as done.", "warning")
         return redirect(url_for('restaurant_orders'))
 
-    # update the order status to 'Completed'
-    order.Status = 'Completed'
-
-    # access the associated customer
-    customer = order.customer 
-
-    if customer:
-        pass
-
+    enqueue('mark_as_done', {"order_id": order_id}, _transition_key(order, COMPLETED))
     db.session.commit()
-    flash(f"Order #{order.OrderID} has been marked as completed.", "success")
+    flash(f"Order #{order.OrderID}: completion queued.", "success")
     return redirect(url_for('restaurant_orders', restaurant_id=order.RestaurantID))
 
+@job_handler('mark_as_done')
+def mark_as_done_job(order_id):
+    _run_transition(order_id, COMPLETED, BEING_PREPARED)
+
 
 @app.route('/about')
 def about():
@@ -549,15 +670,14 @@ def restaurant_menu():
         flash("Restaurant ID is required.", "danger")
         return redirect(url_for('show_restaurants'))  # redirects to the restaurant list
 
-    # fetch restaurant details from the database
-    restaurant = db.session.get(Restaurant, restaurant_id)
+    # restaurant details and menu items, cached until the menu is edited
+    menu = menu_cache.get(restaurant_id)
 
-    if not restaurant:
+    if not menu:
         flash("Restaurant not found.", "danger")
         return redirect(url_for('show_restaurants'))  # redirects to the restaurant list
     
-    # fetch the menu items for this restaurant
-    menu_items = MenuItem.query.filter_by(RestaurantID=restaurant_id).all()
+    restaurant, menu_items = menu
 
     # get the current logged-in user
     user_type = session.get('user_type') 
@@ -569,67 +689,132 @@ def restaurant_menu():
 
 
 @app.route('/restaurants', methods=['GET'])
+@login_required(UserType.Customer)
 def show_restaurants():
-    # ensure the user is logged in
-    if 'user_id' not in session:
-        flash("Please log in first", "warning")
-        return redirect(url_for('login'))
-
-    user_id = session['user_id']
-    user = db.session.get(User, user_id)
-
-    if user.UserType != UserType.Customer:
-        flash("Only customers can access this page.", "danger")
-        return redirect(url_for('home'))
-
     # retrieve the customer's postal code
-    customer = user.customer
+    customer = g.principal.customer
     if not customer:
         flash("Customer details not found.", "danger")
         return redirect(url_for('home'))
 
     customer_postal_code = customer.PostNumber
 
-    # get the current time
-    current_time = datetime.now().time()
-
-    # find restaurants delivering to the customer's postal code
-    delivery_areas = DeliveryArea.query.filter_by(PostalCode=customer_postal_code).all()
-    restaurant_ids = [area.RestaurantID for area in delivery_areas]
-    restaurants = Restaurant.query.filter(Restaurant.RestaurantID.in_(restaurant_ids)).all()
-
-    # prepare a list of open restaurants with delivery areas
-    restaurant_data = []
-    for restaurant in restaurants:
-        # check if the restaurant is currently open
-        if restaurant.OpenTime <= current_time <= restaurant.CloseTime:
-            # fetch delivery areas for this restaurant
-            delivery_areas = DeliveryArea.query.filter_by(RestaurantID=restaurant.RestaurantID).all()
-            delivery_area_list = [area.PostalCode for area in delivery_areas]
-            delivery_area_str = ", ".join(delivery_area_list)
-
-            open_time_formatted = restaurant.OpenTime.strftime('%H:%M')
-            close_time_formatted = restaurant.CloseTime.strftime('%H:%M')
-            # add restaurant info along with delivery area string
-            restaurant_data.append({
-                "restaurant": restaurant,
-                "delivery_area_str": delivery_area_str
-            })
+    # open restaurants delivering to the customer's postal code, served from the in-memory index
+    restaurant_data = [
+        {"restaurant": summary, "delivery_area_str": summary.delivery_area_str}
+        for summary in delivery_index.open_restaurants_for(customer_postal_code, datetime.now())
+    ]
 
     if not restaurant_data:
         flash("No restaurants found that deliver to your area and are currently open.", "warning")
 
-    # pass filtered restaurants to the template
+    # pass filtered restaurants to the template, their cards are cached by the summary's content Version
     return render_template('restaurants.html', restaurants=restaurant_data)
 
+
+@app.route('/api/restaurants', methods=['GET'])
+@login_required(UserType.Customer, api=True)
+def api_restaurants():
+    # compact JSON version of /restaurants for the auto-refresh, answers 304 when nothing changed
+    if not g.principal.customer:
+        return {"error": "Customer details not found"}, 404
+
+    postal_code = g.principal.customer.PostNumber
+    summaries, next_change = delivery_index.open_listing(postal_code, datetime.now())
+
+    # built from the content only, so every worker (and a restarted one) gives the same ETag for the same list
+    versions = ",".join(f"{summary.RestaurantID}:{summary.Version}" for summary in summaries)
+    next_change_str = next_change.isoformat() if next_change else ''
+    etag = hashlib.sha1(f"{postal_code}|{versions}|{next_change_str}".encode()).hexdigest()
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = jsonify({
+            "restaurants": [
+                {
+                    "id": summary.RestaurantID,
+                    "name": summary.Name,
+                    "description": summary.Description,
+                    "delivery_areas": summary.delivery_area_str,
+                    "open_time": summary.OpenTime.strftime('%H:%M'),
+                    "close_time": summary.CloseTime.strftime('%H:%M'),
+                    "url": url_for('customer_menu', restaurant_id=summary.RestaurantID)
+                }
+                for summary in summaries
+            ],
+            # when one of these restaurants opens or closes next
+            "next_change": next_change_str or None
+        })
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
  
+@app.route('/api/search')
+@login_required(UserType.Customer, api=True)
+def api_search():
+    # ranked restaurants and menu items among those delivering to the customer and open now
+    if not g.principal.customer:
+        return {"error": "Customer details not found"}, 404
+    if not search_available(db.session):
+        return {"error": "Search is not available on this database"}, 501
+    query = request.args.get('q', '').strip()
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 50)
+
+    restaurants, items = search(db.session, query, g.principal.customer.PostNumber, datetime.now(), limit)
+    return {
+        "query": query,
+        "restaurants": [
+            {
+                "id": summary.RestaurantID,
+                "name": summary.Name,
+                "description": summary.Description,
+                "url": url_for('customer_menu', restaurant_id=summary.RestaurantID)
+            }
+            for summary in restaurants
+        ],
+        "items": [
+            {
+                "id": item.MenuItemID,
+                "name": item.Name,
+                "description": item.Description,
+                "category": item.Category,
+                "price": str(item.Price),
+                "available": item.IsAvailable is not False,
+                "restaurant_id": item.RestaurantID,
+                "restaurant_name": restaurant.Name,
+                "url": url_for('customer_menu', restaurant_id=item.RestaurantID)
+            }
+            for item, restaurant in items
+        ]
+    }
+
+
 @app.route('/restaurant/<int:restaurant_id>', methods=['GET'])
 def customer_menu(restaurant_id):
-    restaurant = Restaurant.query.get_or_404(restaurant_id)
-    menu_items = MenuItem.query.filter_by(RestaurantID=restaurant_id).all()
+    menu = menu_cache.get(restaurant_id)
+    if not menu:
+        abort(404)
+    restaurant, menu_items = menu
     
     return render_template('customer-menu.html', restaurant=restaurant, menu_items=menu_items)
 
+@app.route('/metrics/cache')
+def cache_metrics():
+    return jsonify({"menu": menu_cache.stats(), "fragments": fragment_cache.stats()})
+
+@app.route('/metrics/jobs')
+def job_metrics():
+    return jsonify(job_queue.stats())
+
+@app.route('/metrics/requests')
+def request_metrics():
+    return jsonify(request_stats.routes())
+
+@app.route('/metrics')
+def prometheus_metrics():
+    return registry.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
 @app.route('/add_item/<int:restaurant_id>', methods=['GET', 'POST'])
 def restaurant_add_item(restaurant_id):
     # fetch the restaurant using the ID
@@ -675,12 +860,9 @@ def restaurant_delete_item(restaurant_id):
     
     if request.method == 'POST':
         # get the list of items to delete
-        item_ids_to_delete = request.form.getlist('delete_items')
+        item_ids_to_delete = request.form.getlist('delete_items', type=int)
         if item_ids_to_delete:
-            for item_id in item_ids_to_delete:
-                item = MenuItem.query.get(item_id)
-                if item:
-                    db.session.delete(item)
+            menu_bulk.delete_items(restaurant_id, item_ids_to_delete)
             db.session.commit()
             flash("Selected items have been deleted.", "success")
         else:
@@ -726,15 +908,11 @@ def restaurant_edit_item(restaurant_id, item_id):
 @app.route('/delete_items/<int:restaurant_id>', methods=['POST'])
 def delete_items(restaurant_id):
     # get the list of items to delete
-    item_ids_to_delete = request.form.getlist('delete_items')
+    item_ids_to_delete = request.form.getlist('delete_items', type=int)
     if item_ids_to_delete:
-        for item_id in item_ids_to_delete:
-            # find and delete the menu item
-            item = MenuItem.query.get(item_id)
-            if item:
-                db.session.delete(item)
+        deleted = menu_bulk.delete_items(restaurant_id, item_ids_to_delete)
         db.session.commit()
-        flash(f"{len(item_ids_to_delete)} item(s) have been deleted.", "success")
+        flash(f"{deleted} item(s) have been deleted.", "success")
     else:
         flash("No items selected for deletion.", "warning")
     
@@ -759,84 +937,147 @@ def update_item(item_id):
     return redirect(url_for('restaurant_menu', restaurant_id=item.RestaurantID))
 
 
+# bulk menu API for restaurants, each call is one transaction with a fixed number of statements
+@app.route('/api/menu/export')
+@login_required(UserType.Restaurant, api=True)
+def api_menu_export():
+    restaurant = g.principal.restaurant
+    if not restaurant:
+        return {"error": "Restaurant not found"}, 404
+    fmt = request.args.get('format', 'csv')
+    if fmt not in ('csv', 'json'):
+        return {"error": "Format must be csv or json"}, 400
+
+    export = menu_bulk.export_csv if fmt == 'csv' else menu_bulk.export_json
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/json'
+    return Response(stream_with_context(export(restaurant.RestaurantID)), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="menu-{restaurant.RestaurantID}.{fmt}"',
+    })
+
+
+def _menu_upload():
+    upload = request.files.get('file')
+    if upload is not None:
+        if upload.filename.lower().endswith('.json') or upload.mimetype == 'application/json':
+            return menu_bulk.parse_json(json.load(upload.stream))
+        return menu_bulk.parse_csv(upload.stream)
+    if request.mimetype == 'text/csv':
+        return menu_bulk.parse_csv(request.stream)
+    data = request.get_json(silent=True)
+    if data is None:
+        raise MenuImportError(None, "Upload a CSV or JSON file, or send the items as JSON")
+    return menu_bulk.parse_json(data)
+
+
+@app.route('/api/menu/import', methods=['POST'])
+@login_required(UserType.Restaurant, api=True)
+def api_menu_import():
+    restaurant = g.principal.restaurant
+    if not restaurant:
+        return {"error": "Restaurant not found"}, 404
+    replace = request.args.get('replace', '').lower() in ('1', 'true', 'yes')
+
+    try:
+        counts = menu_bulk.import_menu(restaurant.RestaurantID, _menu_upload(), replace=replace)
+    # MenuImportError, undecodable or malformed JSON are all ValueErrors
+    except (ValueError, csv.Error) as e:
+        db.session.rollback()
+        return {"error": str(e)}, 400
+    db.session.commit()
+    return counts
+
+
+@app.route('/api/menu/items', methods=['PATCH', 'DELETE'])
+@login_required(UserType.Restaurant, api=True)
+def api_menu_items():
+    restaurant = g.principal.restaurant
+    if not restaurant:
+        return {"error": "Restaurant not found"}, 404
+    data = request.get_json(silent=True)
+
+    try:
+        if request.method == 'PATCH':
+            updated = menu_bulk.batch_update(restaurant.RestaurantID, menu_bulk.parse_json(data))
+            result = {"updated": updated}
+        else:
+            item_ids = data.get('ids') if isinstance(data, dict) else data
+            if not isinstance(item_ids, list):
+                return {"error": "Expected a list of menu item IDs or {\"ids\": [...]}"}, 400
+            result = {"deleted": menu_bulk.delete_items(restaurant.RestaurantID, item_ids)}
+    except MenuImportError as e:
+        db.session.rollback()
+        return {"error": str(e)}, 400
+    except (TypeError, ValueError):
+        db.session.rollback()
+        return {"error": "Menu item IDs must be numbers"}, 400
+    db.session.commit()
+    return result
+
+
 @app.route('/balance')
+@login_required(api=True)
 def balance():
-    if 'user_id' not in session:
-        return {"error": "User not logged in"}, 401
-
-    user = db.session.get(User, session['user_id'])
+    principal = g.principal
 
-    if user.UserType == UserType.Restaurant:
-        restaurant = user.restaurant
-        if not restaurant:
+    # balances change with every order, so they are read fresh rather than from the cached principal
+    if principal.UserType == UserType.Restaurant:
+        if not principal.restaurant:
             return {"error": "Restaurant not found"}, 404
 
-        completed_orders = Order.query.filter_by(RestaurantID=restaurant.RestaurantID, Status='Completed').all()
-        total_balance = sum(order.RestaurantAmount for order in completed_orders)
+        # running balance, maintained on every transition to or from 'Completed'
+        balance = db.session.query(Restaurant.Balance).filter_by(RestaurantID=principal.restaurant.RestaurantID).scalar()
+        return {"balance": round(float(balance), 2)}
 
-        return {"balance": round(float(total_balance), 2)}
-
-    elif user.UserType == UserType.Customer:
-        customer = user.customer
-        if not customer:
+    elif principal.UserType == UserType.Customer:
+        if not principal.customer:
                 return {"error": "Customer not found"}, 404
-        return {"balance": round(float(customer.Balance), 2)}
+        balance = db.session.query(Customer.Balance).filter_by(UserID=principal.UserID).scalar()
+        return {"balance": round(float(balance), 2)}
 
     return {"error": "Balance not found"}, 404
 
 
-@app.route('/cart')
-def cart():
-    user_id = session.get('user_id')
-    if user_id is None:
-        return redirect(url_for('login'))
-    
-    # query cart items and join with menu items
-    cart_items = db.session.query(CartItem, MenuItem).join(MenuItem).filter(CartItem.UserID == user_id).all()
-
-    # calculate the total price
-    total_price = sum(float(menu_item.Price) * cart_item.Quantity for cart_item, menu_item in cart_items)
-
-    # convert data to serializable format
-    cart_items_serializable = [
+def _cart_json(user_id):
+    lines = cart_store.lines(user_id)
+    items = [
         {
-            'CartItemID': cart_item.CartItemID,
-            'MenuItemID': menu_item.MenuItemID,
-            'Name': menu_item.Name,
-            'Description': menu_item.Description,
-            'Price': str(menu_item.Price),  # convert Decimal to string
-            'Quantity': cart_item.Quantity
+            'MenuItemID': line.MenuItemID,
+            'Name': line.Name,
+            'Description': line.Description,
+            'Price': str(line.Price),  # convert Decimal to string
+            'Quantity': line.Quantity
         }
-        for cart_item, menu_item in cart_items
+        for line in lines
     ]
+    total = sum((Decimal(line.Price) * line.Quantity for line in lines), Decimal(0))
+    return items, total.quantize(Decimal('0.01'))
 
-    return render_template('customer-cart.html', cart_items=cart_items_serializable, total_price=total_price)
+
+@app.route('/cart')
+@login_required()
+def cart():
+    cart_items, total_price = _cart_json(g.principal.UserID)
+    return render_template('customer-cart.html', cart_items=cart_items, total_price=float(total_price))
 
 
 @app.route('/add_to_cart/<int:menu_item_id>')
+@login_required()
 def add_to_cart(menu_item_id):
-    if 'user_id' not in session:
-        flash("Please log in first", "warning")
-        return redirect(url_for('login'))
+    user_id = g.principal.UserID
 
-    user_id = session['user_id']
-    user = db.session.get(User, user_id)
-
-    if user.UserType == UserType.Restaurant:
+    if g.principal.UserType == UserType.Restaurant:
         flash("Restaurants cannot add items to the cart.", "warning")
         return redirect(url_for('restaurant_dashboard'))  # or redirect to a relevant restaurant page
 
-    cart_item = CartItem.query.filter_by(UserID=user_id, MenuItemID=menu_item_id).first()
-
-    if cart_item:
-        # increment the quantity if the cart item already exists
-        cart_item.Quantity += 1
-    else:
-        # create a new cart item if it doesn't exist
-        cart_item = CartItem(UserID=user_id, MenuItemID=menu_item_id, Quantity=1)
-        db.session.add(cart_item)
-
-    # commit the session to save changes
+    # one upsert, repeated clicks add up on the same line
+    try:
+        cart_store.add(user_id, menu_item_id)
+    except UnknownMenuItem:
+        flash("This item is no longer available.", "error")
+        return redirect(url_for('cart'))
+    except UnavailableMenuItem:
+        flash("This item is currently unavailable.", "error")
+        return redirect(url_for('cart'))
     db.session.commit()
 
     flash("Item added to cart", "success")
@@ -844,24 +1085,133 @@ def add_to_cart(menu_item_id):
 
 
 @app.route('/remove_from_cart/<int:menu_item_id>')
+@login_required()
 def remove_from_cart(menu_item_id):
-    if 'user_id' not in session:
-        flash("Please log in first", "warning")
-        return redirect(url_for('login'))
+    cart_store.remove(g.principal.UserID, menu_item_id)
+    db.session.commit()
+
+    flash("Item removed from cart", "success")
+    return redirect(url_for('cart'))
+
+
+# cart API for the cart and menu pages, every call answers with the whole updated cart
+@app.route('/api/cart')
+@login_required(UserType.Customer, api=True)
+def api_cart():
+    items, total = _cart_json(g.principal.UserID)
+    return {"items": items, "total": str(total)}
 
-    user_id = session['user_id']
-    cart_item = CartItem.query.filter_by(UserID=user_id, MenuItemID=menu_item_id).first()
 
-    if cart_item:
-        if cart_item.Quantity > 1:
-            cart_item.Quantity -= 1
+@app.route('/api/cart/items/<int:menu_item_id>', methods=['POST', 'PUT', 'DELETE'])
+@login_required(UserType.Customer, api=True)
+def api_cart_item(menu_item_id):
+    user_id = g.principal.UserID
+    data = request.get_json(silent=True) or {}
+
+    try:
+        if request.method == 'POST':
+            amount = int(data.get('quantity', 1))
+            if amount < 1:
+                return {"error": "Quantity must be at least 1"}, 400
+            cart_store.add(user_id, menu_item_id, amount)
+        elif request.method == 'PUT':
+            if 'quantity' not in data:
+                return {"error": "Quantity is required"}, 400
+            cart_store.set_quantity(user_id, menu_item_id, int(data['quantity']))
         else:
-            db.session.delete(cart_item)
-        db.session.commit()
+            cart_store.remove(user_id, menu_item_id)
+    except (TypeError, ValueError):
+        return {"error": "Quantity must be a number"}, 400
+    except UnknownMenuItem:
+        return {"error": "Menu item not found"}, 404
+    except UnavailableMenuItem:
+        return {"error": "Menu item is currently unavailable"}, 409
+    db.session.commit()
 
-    flash("Item removed from cart", "success")
-    return redirect(url_for('cart'))
+    items, total = _cart_json(user_id)
+    return {"items": items, "total": str(total)}
+
+
+@app.cli.command('rollup-platform-fees')
+def rollup_platform_fees_command():
+    """Fold new platform fee ledger entries into the platform balance."""
+    amount = rollup_platform_fees()
+    print(f"Rolled up {amount} €, platform balance is {platform_balance()} €")
+
+
+@app.cli.command('reconcile-restaurant-balances')
+@click.option('--fix', is_flag=True, help="Reset mismatching running balances to the recomputed value.")
+def reconcile_restaurant_balances_command(fix):
+    """Verify every running restaurant balance against the sum of its completed orders."""
+    mismatches = reconcile_restaurant_balances(fix=fix)
+    for restaurant_id, running, expected in mismatches:
+        print(f"Restaurant {restaurant_id}: running balance {running} €, completed orders sum to {expected} €")
+    if not mismatches:
+        print("All restaurant balances match their completed orders.")
+    elif fix:
+        print(f"Fixed {len(mismatches)} restaurant balance(s).")
+
+
+@app.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Recreate the full-text search tables and triggers and index every restaurant and menu item."""
+    if not search_available(db.session):
+        print("Error: full-text search needs SQLite with FTS5")
+        return
+    with db.engine.begin() as connection:
+        rebuild_search_index(connection)
+    print("Search index rebuilt.")
+
+
+@app.cli.command('run-jobs')
+@click.option('--workers', type=int, default=None, help="Worker threads (default: JOB_WORKERS, at least 1).")
+def run_jobs_command(workers):
+    """Work the background job queue in the foreground until interrupted."""
+    workers = workers or max(app.config['JOB_WORKERS'], 1)
+    print(f"Running {workers} job worker(s), Ctrl+C to stop")
+    job_queue.run(app, workers)
+
+
+@app.cli.command('prune-jobs')
+@click.option('--days', type=int, default=None, help="Keep jobs finished within this many days (default: JOB_RETENTION_DAYS).")
+def prune_jobs_command(days):
+    """Delete finished background jobs (and their idempotency keys) older than --days, as idle workers do."""
+    days = app.config['JOB_RETENTION_DAYS'] if days is None else days
+    print(f"Deleted {job_queue.prune(timedelta(days=days))} finished job(s)")
+
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """Fingerprint, minify and precompress static/ for far-future caching (see assets.py)."""
+    if not app.config['ASSETS_DIR']:
+        raise click.UsageError("ASSETS_DIR is empty, the asset pipeline is turned off")
+    manifest = build_assets(app.static_folder, app.config['ASSETS_DIR'], app.static_url_path)
+    assets.load(manifest_path(app))
+    stats = manifest.stats
+    print(f"Built {stats['files']} asset(s) and {stats['webp']} WebP variant(s) into "
+          f"{os.path.join(app.static_folder, app.config['ASSETS_DIR'])}: {stats['bytes_in']} -> {stats['bytes_out']} bytes "
+          f"before compression")
+
+
+@app.cli.command('platform-balance')
+def platform_balance_command():
+    """Print the aggregate platform balance (rolled-up balance plus pending ledger entries)."""
+    print(f"{platform_balance()} €")
+
+
+def run_platform_fee_rollup(interval):
+    # periodic rollup so the pending part of the ledger stays small
+    while True:
+        socketio.sleep(interval)
+        with app.app_context():
+            try:
+                rollup_platform_fees()
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error: platform fee rollup failed: {e}")
 
 
 if __name__ == '__main__':
+    if app.config['PLATFORM_FEE_ROLLUP_SECONDS'] > 0:
+        socketio.start_background_task(run_platform_fee_rollup, app.config['PLATFORM_FEE_ROLLUP_SECONDS'])
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,313 @@
+"""Build step and serving for the files under static/.
+
+``flask build-assets`` copies every asset into static/<ASSETS_DIR> under a
+content-hashed name (css/globals.3f9a1c7d2e.css), minified and with .gz
+(and .br, if the brotli package is installed) next to it, converts PNGs to
+WebP at several widths (if Pillow is installed) and writes a manifest. While
+the manifest exists, ``url_for('static', filename=...)`` points at the hashed
+copies, which are served precompressed and cached by browsers for a year:
+a changed file gets a new name, so no browser ever revalidates one.
+"""
+from threading import Lock
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+
+from flask import request, send_from_directory
+from markupsafe import Markup, escape
+
+ONE_YEAR = 365 * 24 * 3600
+WEBP_WIDTHS = (320, 640, 1280)
+COMPRESSIBLE = {'.css', '.js', '.svg', '.json', '.txt', '.html'}
+# smaller than this, a compressed copy costs more in headers and CPU than it saves
+MIN_COMPRESS_BYTES = 256
+
+_CSS_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+_CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+_CSS_BACKGROUND = re.compile(r'background-image:\s*url\(\s*([\'"]?)([^\'")]+)\1\s*\)\s*;')
+
+
+def minify_css(text):
+    text = _CSS_COMMENT.sub('', text)
+    text = re.sub(r'\s+', ' ', text)
+    # a space before ":" can be a descendant selector ("a :hover"), so only the one after it goes
+    text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+    text = re.sub(r':\s+', ':', text)
+    return text.replace(';}', '}').strip()
+
+
+def minify_js(text):
+    # whole-line comments and indentation only, anything smarter needs a real parser
+    lines = (line.strip() for line in text.splitlines())
+    return '\n'.join(line for line in lines if line and not line.startswith('//'))
+
+
+def minify_svg(text):
+    text = re.sub(r'<!--.*?-->', '', text, flags=re.S)
+    return re.sub(r'>\s+<', '><', text).strip()
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js, '.svg': minify_svg}
+
+
+def hashed_name(filename, data):
+    root, ext = posixpath.splitext(filename)
+    return f"{root}.{hashlib.sha256(data).hexdigest()[:10]}{ext}"
+
+
+def _brotli(data):
+    try:
+        import brotli  # optional dependency, gzip alone when missing
+    except ImportError:
+        return None
+    return brotli.compress(data, quality=11)
+
+
+def _webp_variants(data, widths):
+    """WebP encodings of a PNG at ``widths`` no larger than the image, and at its own width."""
+    try:
+        from PIL import Image  # optional dependency, no WebP copies when missing
+    except ImportError:
+        return []
+    from io import BytesIO
+
+    image = Image.open(BytesIO(data))
+    image.load()
+    variants = []
+    for width in sorted({w for w in widths if w < image.width} | {image.width}):
+        resized = image if width == image.width else image.resize(
+            (width, round(image.height * width / image.width)), Image.LANCZOS)
+        out = BytesIO()
+        resized.save(out, 'WEBP', quality=80, method=6)
+        variants.append((width, out.getvalue()))
+    return variants
+
+
+class AssetBuilder:
+    """One build of ``static_folder`` into ``static_folder/output``, see ``build_assets``."""
+
+    def __init__(self, static_folder, output, url_prefix, webp_widths):
+        self.static_folder = static_folder
+        self.output = output
+        self.url_prefix = url_prefix.strip('/')
+        self.webp_widths = webp_widths
+        self.files, self.webp, self.encodings = {}, {}, {}
+        self.bytes_in = self.bytes_out = 0
+
+    def sources(self):
+        for root, dirs, names in os.walk(self.static_folder):
+            rel_root = os.path.relpath(root, self.static_folder)
+            if rel_root == self.output or rel_root.startswith(self.output + os.sep):
+                dirs[:] = []
+                continue
+            for name in names:
+                if not name.startswith('.'):
+                    yield posixpath.normpath(posixpath.join(rel_root.replace(os.sep, '/'), name))
+
+    def write(self, filename, data):
+        built = posixpath.join(self.output, filename)
+        path = os.path.join(self.static_folder, *built.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        self.bytes_out += len(data)
+
+        if posixpath.splitext(filename)[1] in COMPRESSIBLE and len(data) >= MIN_COMPRESS_BYTES:
+            encodings = []
+            for coding, suffix, compressed in (('br', '.br', _brotli(data)),
+                                               ('gzip', '.gz', gzip.compress(data, 9, mtime=0))):
+                if compressed is not None and len(compressed) < len(data):
+                    with open(path + suffix, 'wb') as f:
+                        f.write(compressed)
+                    encodings.append(coding)
+            if encodings:
+                self.encodings[built] = encodings
+        return built
+
+    def add(self, filename, data, size=None):
+        self.bytes_in += len(data) if size is None else size
+        ext = posixpath.splitext(filename)[1].lower()
+        if ext in MINIFIERS:
+            data = MINIFIERS[ext](data.decode()).encode()
+        self.files[filename] = self.write(hashed_name(filename, data), data)
+        if ext == '.png':
+            root = posixpath.splitext(filename)[0]
+            variants = _webp_variants(data, self.webp_widths)
+            widest = max((width for width, _ in variants), default=None)
+            self.webp[filename] = [
+                [width, self.write(hashed_name(f"{root}.webp" if width == widest else f"{root}-{width}w.webp", webp), webp)]
+                for width, webp in variants
+            ]
+
+    def _resolve(self, css_filename, ref):
+        # a reference as the browser resolves it against the stylesheet's URL, as a filename under static/
+        if re.match(r'^([a-z]+:|//|#)', ref):
+            return None
+        path = ref.split('?')[0].split('#')[0]
+        if path.startswith('/'):
+            url = posixpath.normpath(path.lstrip('/'))
+        else:
+            url = posixpath.normpath(posixpath.join(self.url_prefix, posixpath.dirname(css_filename), path))
+        if not url.startswith(self.url_prefix + '/'):
+            return None
+        return url[len(self.url_prefix) + 1:]
+
+    def rewrite_css(self, filename, text):
+        """Point url() references at the hashed copies, relative to where the stylesheet is built."""
+        built_dir = posixpath.dirname(posixpath.join(self.output, filename))
+
+        def relative(target):
+            return posixpath.relpath(target, built_dir)
+
+        def background(match):
+            target = self._resolve(filename, match.group(2))
+            if target not in self.files:
+                return match.group(0)
+            declaration = f"background-image: url({relative(self.files[target])});"
+            if self.webp.get(target):
+                # browsers without image-set() keep the first declaration
+                widest = self.webp[target][-1][1]
+                declaration += (f" background-image: image-set(url({relative(widest)}) type(\"image/webp\"),"
+                                f" url({relative(self.files[target])}) type(\"image/png\"));")
+            return declaration
+
+        def url(match):
+            target = self._resolve(filename, match.group(2))
+            if target not in self.files:
+                return match.group(0)
+            return f"url({relative(self.files[target])})"
+
+        return _CSS_URL.sub(url, _CSS_BACKGROUND.sub(background, text))
+
+
+def build_assets(static_folder, output='dist', url_prefix='static', webp_widths=WEBP_WIDTHS):
+    """Fingerprint, minify and precompress everything under ``static_folder`` into ``output``.
+
+    Stylesheets are built last so their url() references can point at the
+    hashed images. Earlier builds are left in place, pages cached before a
+    deploy keep working. Returns the Manifest, which is also written to
+    ``output/manifest.json``.
+    """
+    builder = AssetBuilder(static_folder, output, url_prefix, webp_widths)
+    sources = sorted(builder.sources(), key=lambda filename: filename.endswith('.css'))
+    for filename in sources:
+        with open(os.path.join(static_folder, *filename.split('/')), 'rb') as f:
+            data = f.read()
+        size = len(data)
+        if filename.endswith('.css'):
+            data = builder.rewrite_css(filename, data.decode()).encode()
+        builder.add(filename, data, size)
+
+    manifest = Manifest(builder.files, builder.webp, builder.encodings)
+    manifest.stats = {"files": len(builder.files), "bytes_in": builder.bytes_in, "bytes_out": builder.bytes_out,
+                      "webp": sum(len(variants) for variants in builder.webp.values())}
+    manifest.save(os.path.join(static_folder, output, 'manifest.json'))
+    return manifest
+
+
+class Manifest:
+    """Source filename -> hashed filename, its WebP variants and the precompressed encodings of each."""
+
+    def __init__(self, files=None, webp=None, encodings=None):
+        self.files = files or {}
+        self.webp = webp or {}
+        self.encodings = encodings or {}
+        self.built = set(self.files.values()) | {path for variants in self.webp.values() for _, path in variants}
+        self.stats = {}
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data["files"], data["webp"], data["encodings"])
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'w') as f:
+            json.dump({"files": self.files, "webp": self.webp, "encodings": self.encodings}, f, indent=1, sort_keys=True)
+        os.replace(path + '.tmp', path)
+
+
+class AssetPipeline:
+    """Serves the built assets of the current manifest; without one, static files are served as they are."""
+
+    def __init__(self):
+        self.manifest = None
+        self.static_folder = None
+        self._lock = Lock()
+
+    def load(self, path):
+        with self._lock:
+            self.manifest = Manifest.load(path) if path and os.path.exists(path) else None
+
+    def url(self, filename):
+        if self.manifest is None:
+            return filename
+        return self.manifest.files.get(filename, filename)
+
+    def srcset(self, filename):
+        """The WebP ``srcset`` of a PNG, empty when it has no WebP variants."""
+        from flask import url_for
+        variants = self.manifest.webp.get(filename) if self.manifest else None
+        if not variants:
+            return ''
+        return ', '.join(f"{url_for('static', filename=path)} {width}w" for width, path in variants)
+
+    def picture(self, filename, sizes='100vw', **attrs):
+        """An <img> for ``filename``, wrapped in a <picture> offering its WebP variants when there are any."""
+        from flask import url_for
+        img = '<img src="{}"{} />'.format(
+            escape(url_for('static', filename=filename)),
+            ''.join(f' {name.rstrip("_")}="{escape(value)}"' for name, value in attrs.items()),
+        )
+        srcset = self.srcset(filename)
+        if not srcset:
+            return Markup(img)
+        return Markup(f'<picture><source type="image/webp" srcset="{escape(srcset)}" sizes="{escape(sizes)}" />{img}</picture>')
+
+    def send(self, filename):
+        """Response for a built file, precompressed when the client accepts it; None for anything else."""
+        if self.manifest is None or filename not in self.manifest.built:
+            return None
+        mimetype = mimetypes.guess_type(filename)[0]
+        for coding in self.manifest.encodings.get(filename, ()):
+            if request.accept_encodings[coding]:
+                response = send_from_directory(self.static_folder, f"{filename}.{'br' if coding == 'br' else 'gz'}",
+                                               mimetype=mimetype, max_age=ONE_YEAR)
+                response.headers['Content-Encoding'] = coding
+                break
+        else:
+            response = send_from_directory(self.static_folder, filename, mimetype=mimetype, max_age=ONE_YEAR)
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+
+assets = AssetPipeline()
+
+
+def manifest_path(app):
+    return os.path.join(app.static_folder, app.config['ASSETS_DIR'], 'manifest.json') if app.config['ASSETS_DIR'] else None
+
+
+def configure_assets(app):
+    """Fingerprinted static URLs and their serving, from the manifest of the last ``flask build-assets``."""
+    assets.static_folder = app.static_folder
+    assets.load(manifest_path(app))
+    app.jinja_env.globals['picture'] = assets.picture
+    serve_static = app.view_functions['static']
+
+    @app.url_defaults
+    def _fingerprint_static_urls(endpoint, values):
+        if endpoint == 'static' and 'filename' in values:
+            values['filename'] = assets.url(values['filename'])
+
+    def static(filename):
+        return assets.send(filename) or serve_static(filename=filename)
+
+    app.view_functions['static'] = static
@@ -0,0 +1,109 @@
+from collections import namedtuple
+from functools import wraps
+
+from flask import flash, g, redirect, session, url_for
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, joinedload
+
+from cache import LRUBackend
+from models import User, Customer, Restaurant
+
+# identity and profile of the logged-in user; balances change on every order and are never cached here
+CustomerProfile = namedtuple('CustomerProfile', ['UserID', 'FirstName', 'LastName', 'Address', 'PostNumber'])
+RestaurantProfile = namedtuple('RestaurantProfile', ['RestaurantID', 'Name', 'PostalCode'])
+Principal = namedtuple('Principal', ['UserID', 'EmailAddress', 'UserType', 'customer', 'restaurant'])
+
+# columns a cached principal is built from, changes to any other column keep it valid
+PROFILE_COLUMNS = {
+    User: {'EmailAddress', 'UserType'},
+    Customer: set(CustomerProfile._fields),
+    Restaurant: set(RestaurantProfile._fields) | {'UserID'},
+}
+
+principal_cache = LRUBackend(maxsize=4096, ttl=30)
+
+
+def configure_principal_cache(app):
+    principal_cache.maxsize = app.config['PRINCIPAL_CACHE_SIZE']
+    principal_cache.ttl = app.config['PRINCIPAL_CACHE_TTL'] or None
+
+
+def _load_principal(user_id):
+    # one query for the user and whichever profile it has
+    user = User.query.options(joinedload(User.customer), joinedload(User.restaurant)).filter_by(UserID=user_id).first()
+    if user is None:
+        return None
+    customer, restaurant = user.customer, user.restaurant
+    return Principal(
+        user.UserID, user.EmailAddress, user.UserType,
+        CustomerProfile(*(getattr(customer, f) for f in CustomerProfile._fields)) if customer else None,
+        RestaurantProfile(*(getattr(restaurant, f) for f in RestaurantProfile._fields)) if restaurant else None,
+    )
+
+
+def current_principal():
+    """The logged-in user's Principal, loaded at most once per request; None when logged out."""
+    if 'principal' not in g:
+        user_id = session.get('user_id')
+        principal = None
+        if user_id is not None:
+            principal = principal_cache.get(user_id)
+            if principal is None:
+                principal = _load_principal(user_id)
+                if principal is not None:
+                    principal_cache.set(user_id, principal)
+        g.principal = principal
+    return g.principal
+
+
+def login_required(user_type=None, api=False):
+    """Only let logged-in users (of ``user_type``, if given) through, with ``g.principal`` set.
+
+    Pages redirect with a flash message, ``api=True`` routes answer 401/403 JSON.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            principal = current_principal()
+            if principal is None:
+                if 'user_id' in session:
+                    session.clear()  # the user no longer exists
+                if api:
+                    return {"error": "User not logged in"}, 401
+                flash("Please log in first.", "warning")
+                return redirect(url_for('login'))
+
+            if user_type is not None and principal.UserType != user_type:
+                if api:
+                    return {"error": f"Only {user_type.value.lower()}s can access this resource"}, 403
+                flash("You do not have access to this page.", "danger")
+                return redirect(url_for('home'))
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _changes_profile(obj):
+    state = inspect(obj)
+    return any(state.attrs[column].history.has_changes() for column in PROFILE_COLUMNS[type(obj)])
+
+
+# drop cached principals once a commit changed the user's account or profile, other
+# processes pick the change up when their entry expires
+@event.listens_for(Session, 'after_flush')
+def _track_profile_changes(session, flush_context):
+    user_ids = {obj.UserID for obj in session.new | session.deleted if type(obj) in PROFILE_COLUMNS}
+    user_ids.update(obj.UserID for obj in session.dirty if type(obj) in PROFILE_COLUMNS and _changes_profile(obj))
+    if user_ids:
+        session.info.setdefault('stale_principals', set()).update(user_ids)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    for user_id in session.info.pop('stale_principals', ()):
+        principal_cache.delete(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('stale_principals', None)
@@ -0,0 +1,108 @@
+"""Bytes and requests per page view with static/ served as it is vs. built by `flask build-assets`.
+
+Renders the public pages, then fetches every stylesheet, script and image
+they reference (including url() references inside the stylesheets) the way
+a browser with gzip/br and WebP support on a 2x display would. A repeat
+view counts the requests the browser still has to make: the raw files are
+served with ``no-cache`` and are all revalidated, the built ones are
+``immutable``. The build goes into a temporary copy of static/, the working
+tree is not touched.
+
+Usage: python -m benchmarks.assets [--pages / /login /signup /about]
+"""
+import argparse
+import os
+import posixpath
+import re
+import shutil
+import tempfile
+from urllib.parse import urljoin
+
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'assets.db')}"
+os.environ.setdefault('JOB_WORKERS', '0')
+
+from app import app  # noqa: E402
+from assets import assets, build_assets, manifest_path  # noqa: E402
+
+ASSET_RE = re.compile(r'<(?:link[^>]*href|script[^>]*src|img[^>]*src)="(/static/[^"]+)"')
+SOURCE_RE = re.compile(r'<source type="image/webp" srcset="([^"]+)" sizes="(\d+)px"')
+CSS_URL_RE = re.compile(r'url\(([^)"\']+)\)')
+# a PNG background followed by its image-set(), of which the browser fetches the WebP only
+IMAGE_SET_RE = re.compile(r'background-image:\s*url\([^)]+\);\s*background-image:\s*image-set\(url\(([^)]+)\)[^;]*;')
+DPR = 2
+
+
+def pick_webp(srcset, size):
+    # what a browser on a DPR-2 display picks from the srcset
+    candidates = sorted((int(width[:-1]), url) for url, width in (entry.split() for entry in srcset.split(', ')))
+    for width, url in candidates:
+        if width >= size * DPR:
+            return url
+    return candidates[-1][1]
+
+
+def page_assets(client, page):
+    html = client.get(page).get_data(as_text=True)
+    urls = []
+    for srcset, size in SOURCE_RE.findall(html):
+        urls.append(pick_webp(srcset.replace('&#39;', "'"), int(size)))
+    # the <img> inside a <picture> is not fetched when the WebP source is used
+    skipped = {match.group(0) for match in re.finditer(r'<picture>.*?</picture>', html, re.S)}
+    for block in skipped:
+        html = html.replace(block, '')
+    urls.extend(ASSET_RE.findall(html))
+
+    for url in [url for url in urls if url.endswith('.css')]:
+        css = client.get(url, headers={'Accept-Encoding': 'identity'}).get_data(as_text=True)
+        css = IMAGE_SET_RE.sub(lambda match: f"url({match.group(1)})", css)
+        for ref in CSS_URL_RE.findall(css):
+            if not re.match(r'^([a-z]+:|//)', ref):
+                urls.append(posixpath.normpath(urljoin(url, ref)))
+    return list(dict.fromkeys(urls))
+
+
+def measure(client, pages):
+    total_bytes = total_requests = revalidated = 0
+    seen = set()
+    for page in pages:
+        for url in page_assets(client, page):
+            if url in seen:
+                continue
+            seen.add(url)
+            response = client.get(url, headers={'Accept-Encoding': 'gzip, br'})
+            if response.status_code != 200:
+                print(f"  {url}: {response.status_code}")
+                continue
+            total_bytes += len(response.data)
+            total_requests += 1
+            if 'immutable' not in (response.headers.get('Cache-Control') or ''):
+                revalidated += 1
+    return total_requests, total_bytes, revalidated
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--pages', nargs='+', default=['/', '/login', '/signup', '/about'])
+    args = parser.parse_args()
+
+    static_copy = os.path.join(tempfile.mkdtemp(), 'static')
+    shutil.copytree(app.static_folder, static_copy, ignore=shutil.ignore_patterns(app.config['ASSETS_DIR'] or 'dist'))
+    app.static_folder = assets.static_folder = static_copy
+    client = app.test_client()
+
+    assets.load(None)
+    raw = measure(client, args.pages)
+    manifest = build_assets(static_copy, app.config['ASSETS_DIR'] or 'dist', app.static_url_path)
+    assets.load(manifest_path(app))
+    built = measure(client, args.pages)
+
+    print(f"{len(args.pages)} page(s): {', '.join(args.pages)}; {manifest.stats['webp']} WebP variant(s) built"
+          + ("" if manifest.stats['webp'] else " (Pillow is not installed)"))
+    print(f"{'':<8}{'requests':>10}{'KiB':>10}{'repeat-view requests':>22}")
+    for name, (requests, size, revalidated) in (('raw', raw), ('built', built)):
+        print(f"{name:<8}{requests:>10}{size / 1024:>10.1f}{revalidated:>22}")
+    print(f"bytes: {1 - built[1] / raw[1]:.0%} fewer on a first visit")
+
+
+if __name__ == '__main__':
+    main()
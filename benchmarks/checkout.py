@@ -0,0 +1,85 @@
+"""Checkout cost by cart size: SQL statements and latency of POST /create_order.
+
+Runs the real route through the Flask test client against a throwaway
+SQLite database (DATABASE_URL is pointed at a temporary file).
+
+Usage: python -m benchmarks.checkout [--orders 50] [--sizes 1 10 100]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from datetime import time as dtime
+
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'checkout.db')}"
+
+from sqlalchemy import event  # noqa: E402
+
+from app import app  # noqa: E402
+from models import db, User, UserType, Customer, Restaurant, MenuItem, CartItem  # noqa: E402
+
+
+def seed(max_items):
+    db.create_all()
+    db.session.add_all([
+        User(UserID=1, EmailAddress='customer@bench', Password='x', UserType=UserType.Customer),
+        User(UserID=2, EmailAddress='restaurant@bench', Password='x', UserType=UserType.Restaurant),
+    ])
+    db.session.add(Customer(UserID=1, FirstName='Bench', LastName='Mark', Address='Hauptstr. 1',
+                            PostNumber='47051', Balance=10 ** 9))
+    db.session.add(Restaurant(RestaurantID=1, UserID=2, Name='Bench', Address='Hauptstr. 2', PostalCode='47051',
+                              OpenTime=dtime(0), CloseTime=dtime(23, 59)))
+    db.session.flush()
+    db.session.execute(db.insert(MenuItem), [
+        {"MenuItemID": i, "RestaurantID": 1, "Name": f"Item {i}", "Description": "bench", "Price": 9.99}
+        for i in range(1, max_items + 1)
+    ])
+    db.session.commit()
+
+
+def fill_cart(size):
+    db.session.execute(db.insert(CartItem), [
+        {"UserID": 1, "MenuItemID": i, "Quantity": 2} for i in range(1, size + 1)
+    ])
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--orders', type=int, default=50)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 100])
+    args = parser.parse_args()
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+        session['user_type'] = UserType.Customer.value
+
+    with app.app_context():
+        seed(max(args.sizes))
+        engine = db.engine
+
+    statements = []
+    event.listen(engine, 'before_cursor_execute', lambda *a: statements.append(1))
+
+    for size in args.sizes:
+        latencies, counts = [], []
+        for _ in range(args.orders):
+            with app.app_context():
+                fill_cart(size)
+            statements.clear()
+            start = time.perf_counter()
+            response = client.post('/create_order', data={'note': ''})
+            latencies.append((time.perf_counter() - start) * 1000)
+            counts.append(len(statements))
+            assert response.status_code == 302 and response.location.endswith('/orders'), response.location
+
+        latencies.sort()
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        print(f"{size:>4} line items: {statistics.mean(counts):5.1f} statements/checkout  "
+              f"p50 {statistics.median(latencies):7.2f} ms  p99 {p99:7.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
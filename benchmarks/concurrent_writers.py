@@ -0,0 +1,106 @@
+"""Concurrent writer/reader throughput: default SQLite settings vs. the tuned PRAGMAs in config.py.
+
+Writer threads place small orders (insert an order plus its items, like
+create_order) while reader threads keep listing orders, against a file
+database in a temporary directory.
+
+Usage: python -m benchmarks.concurrent_writers [--writers 8] [--readers 4] [--seconds 5]
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from config import engine_options, install_sqlite_pragmas, sqlite_pragmas
+
+SCHEMA = [
+    "CREATE TABLE Orders (OrderID INTEGER PRIMARY KEY, CustomerID INTEGER NOT NULL, "
+    "RestaurantID INTEGER NOT NULL, Status VARCHAR NOT NULL, TotalAmount NUMERIC(10, 2) NOT NULL)",
+    "CREATE INDEX ix_Orders_RestaurantID_Status ON Orders (RestaurantID, Status)",
+    "CREATE TABLE OrderItems (OrderItemID INTEGER PRIMARY KEY, OrderID INTEGER NOT NULL, "
+    "MenuItemName VARCHAR(255) NOT NULL, Quantity INTEGER NOT NULL)",
+    "CREATE INDEX ix_OrderItems_OrderID ON OrderItems (OrderID)",
+]
+
+LEGACY_PRAGMAS = {'journal_mode': 'DELETE', 'synchronous': 'FULL'}
+
+
+def run(label, pragmas, options, writers, readers, seconds):
+    directory = tempfile.mkdtemp()
+    url = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+    engine = create_engine(url, **options)
+    install_sqlite_pragmas(engine, pragmas)
+    with engine.begin() as conn:
+        for statement in SCHEMA:
+            conn.execute(text(statement))
+
+    stop = threading.Event()
+    counts = {'writes': 0, 'reads': 0, 'locked': 0}
+    lock = threading.Lock()
+
+    def bump(key):
+        with lock:
+            counts[key] += 1
+
+    def writer(worker):
+        while not stop.is_set():
+            try:
+                with engine.begin() as conn:
+                    order_id = conn.execute(
+                        text("INSERT INTO Orders (CustomerID, RestaurantID, Status, TotalAmount) "
+                             "VALUES (:c, :r, 'Processing', 12.50)"),
+                        {'c': worker, 'r': worker % 10}
+                    ).lastrowid
+                    conn.execute(
+                        text("INSERT INTO OrderItems (OrderID, MenuItemName, Quantity) VALUES (:o, 'Pizza', 2)"),
+                        [{'o': order_id}] * 3
+                    )
+                bump('writes')
+            except OperationalError:
+                bump('locked')
+
+    def reader(worker):
+        while not stop.is_set():
+            try:
+                with engine.connect() as conn:
+                    conn.execute(
+                        text("SELECT * FROM Orders JOIN OrderItems USING (OrderID) "
+                             "WHERE RestaurantID = :r AND Status = 'Processing' ORDER BY OrderID DESC LIMIT 50"),
+                        {'r': worker % 10}
+                    ).fetchall()
+                bump('reads')
+            except OperationalError:
+                bump('locked')
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    threads += [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+
+    print(f"{label:>7}: {counts['writes'] / seconds:9.1f} writes/s  {counts['reads'] / seconds:9.1f} reads/s  "
+          f"{counts['locked']} 'database is locked' errors")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    # the legacy setup: rollback journal, full fsync, pysqlite's default pool and timeout
+    run('legacy', LEGACY_PRAGMAS, {}, args.writers, args.readers, args.seconds)
+    run('tuned', sqlite_pragmas(), engine_options('sqlite:///bench.db'), args.writers, args.readers, args.seconds)
+
+
+if __name__ == '__main__':
+    main()
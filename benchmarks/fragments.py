@@ -0,0 +1,90 @@
+"""Render time of a large menu page with and without the fragment cache.
+
+Renders customer-menu.html and restaurant-menu.html for one restaurant with
+--items menu items: without the cache, with a cold cache (every card
+rendered and stored), with a warm cache (no card rendered) and after one
+item was edited (one card rendered). Runs against a throwaway SQLite
+database.
+
+Usage: python -m benchmarks.fragments [--items 500] [--repeat 50]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from datetime import time as dtime
+
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'fragments.db')}"
+os.environ.setdefault('JOB_WORKERS', '0')
+
+from flask import render_template  # noqa: E402
+
+from app import app  # noqa: E402
+from cache import LRUBackend, menu_cache  # noqa: E402
+from fragments import fragment_cache  # noqa: E402
+from models import db, User, UserType, Restaurant, MenuItem  # noqa: E402
+
+TEMPLATES = ['customer-menu.html', 'restaurant-menu.html']
+
+
+def seed(n_items):
+    db.create_all()
+    db.session.add(User(UserID=1, EmailAddress="r1@bench", Password="x", UserType=UserType.Restaurant))
+    db.session.add(Restaurant(RestaurantID=1, UserID=1, Name="Restaurant 1", Address="Hauptstr. 1", PostalCode="47051",
+                              Description="bench", OpenTime=dtime(0), CloseTime=dtime(0)))
+    db.session.execute(db.insert(MenuItem), [
+        {"RestaurantID": 1, "Name": f"Item {i}", "Description": f"Description of item {i} " * 3, "Price": 4.5 + i % 10}
+        for i in range(n_items)
+    ])
+    db.session.commit()
+
+
+def render(template):
+    restaurant, items = menu_cache.get(1)
+    started = time.perf_counter()
+    render_template(template, restaurant=restaurant, menu_items=items, is_restaurant=True)
+    return (time.perf_counter() - started) * 1000
+
+
+def timed(template, repeat, before=None):
+    samples = []
+    for _ in range(repeat):
+        if before:
+            before()
+        samples.append(render(template))
+    return statistics.median(samples), max(samples)
+
+
+def edit_one_item():
+    item = db.session.get(MenuItem, 1)
+    item.Price = float(item.Price) + 1
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--items', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    with app.app_context():
+        seed(args.items)
+
+    print(f"{args.items} menu items, median/max of {args.repeat} renders in ms")
+    print(f"{'template':<22}{'no cache':>14}{'cold':>14}{'warm':>14}{'1 item edited':>16}")
+    for template in TEMPLATES:
+        with app.test_request_context('/menu?restaurant_id=1'):
+            fragment_cache.backend = None
+            uncached = timed(template, args.repeat)
+            fragment_cache.backend = LRUBackend(maxsize=app.config['FRAGMENT_CACHE_SIZE'])
+            cold = timed(template, args.repeat, before=fragment_cache.backend._data.clear)
+            warm = timed(template, args.repeat)
+            edited = timed(template, args.repeat, before=edit_one_item)
+        print(f"{template:<22}" + "".join(f"{median:>8.2f}/{worst:<5.1f}" for median, worst in (uncached, cold, warm))
+              + f"{edited[0]:>10.2f}/{edited[1]:<5.1f}")
+    print(f"fragment cache: {fragment_cache.stats()}")
+
+
+if __name__ == '__main__':
+    main()
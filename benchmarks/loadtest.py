@@ -0,0 +1,299 @@
+"""Replay concurrent customer and restaurant sessions against the app and report per-route latency.
+
+Every virtual customer signs up, logs in, and then places orders in a loop:
+/restaurants, /restaurant/<id>, add_to_cart, /cart, create_order. Each
+restaurant session logs in and polls /restaurant_orders, accepting and
+completing every order it finds until all customers are done.
+
+Requests go through the Flask test client (default) or through a local
+threaded HTTP server (--transport server). Either way the app runs against
+a throwaway SQLite database. The seed fixes the dataset, every customer's
+choices and the number of requests, so runs on the same machine are
+comparable.
+
+--save writes the report as JSON. --baseline compares against a saved
+report and exits non-zero when a route's p95 latency or throughput is worse
+than --tolerance allows, or when any request failed.
+
+Usage: python -m benchmarks.loadtest [--customers 16] [--restaurants 4] [--iterations 5]
+           [--transport client|server] [--seed 1] [--save report.json] [--baseline report.json]
+"""
+import argparse
+import http.cookiejar
+import json
+import logging
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from datetime import time as dtime
+
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'loadtest.db')}"
+os.environ.setdefault('PLATFORM_FEE_ROLLUP_SECONDS', '0')
+
+from werkzeug.serving import make_server  # noqa: E402
+
+from app import app  # noqa: E402
+from models import db, User, UserType, Restaurant, MenuItem, DeliveryArea  # noqa: E402
+
+POSTAL_CODE = '47051'
+ITEMS_PER_RESTAURANT = 20
+PASSWORD = 'loadtest'
+
+ACCEPT_RE = re.compile(rb'/accept_or_reject_order/(\d+)/accept')
+DONE_RE = re.compile(rb'/mark_as_done/(\d+)')
+
+
+def seed(n_restaurants, rng):
+    db.create_all()
+    db.session.execute(db.insert(User), [
+        {"UserID": i, "EmailAddress": f"restaurant{i}@load", "Password": PASSWORD, "UserType": UserType.Restaurant}
+        for i in range(1, n_restaurants + 1)
+    ])
+    db.session.execute(db.insert(Restaurant), [
+        {
+            "RestaurantID": i, "UserID": i, "Name": f"Restaurant {i}", "Address": "Hauptstr. 1",
+            "PostalCode": POSTAL_CODE, "Description": "load test",
+            "OpenTime": dtime(0), "CloseTime": dtime(23, 59),
+        }
+        for i in range(1, n_restaurants + 1)
+    ])
+    db.session.execute(db.insert(DeliveryArea), [
+        {"RestaurantID": i, "PostalCode": POSTAL_CODE} for i in range(1, n_restaurants + 1)
+    ])
+    db.session.execute(db.insert(MenuItem), [
+        {
+            "MenuItemID": (i - 1) * ITEMS_PER_RESTAURANT + j, "RestaurantID": i, "Name": f"Item {j}",
+            "Description": "load test", "Price": rng.choice([3.5, 4.9, 7.5, 8.9, 9.99]),
+        }
+        for i in range(1, n_restaurants + 1) for j in range(1, ITEMS_PER_RESTAURANT + 1)
+    ])
+    db.session.commit()
+
+
+class ClientTransport:
+    """One user session on the Flask test client."""
+
+    def __init__(self):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None):
+        response = self.client.open(path, method=method, data=data)
+        return response.status_code, response.headers.get('Location', ''), response.get_data()
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HTTPTransport:
+    """One user session over HTTP, with its own cookie jar; redirects are reported, not followed."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect()
+        )
+
+    def request(self, method, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        req = urllib.request.Request(self.base_url + path, data=body, method=method)
+        try:
+            with self.opener.open(req) as response:
+                return response.status, response.headers.get('Location', ''), response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers.get('Location', ''), e.read()
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def call(self, transport, label, method, path, data=None):
+        start = time.perf_counter()
+        status, location, body = transport.request(method, path, data)
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.latencies[label].append(elapsed)
+            if status >= 500:
+                self.errors[label] += 1
+        return status, location, body
+
+
+def customer_session(make_transport, recorder, index, args, placed):
+    rng = random.Random(args.seed * 100003 + index)
+    transport = make_transport()
+    email = f"customer{index}@load"
+
+    recorder.call(transport, 'POST /sign_up_customer', 'POST', '/sign_up_customer', {
+        "first_name": "Load", "last_name": f"Customer {index}", "email": email, "password": PASSWORD,
+        "confirm_password": PASSWORD, "address": "Hauptstr. 2", "post_number": POSTAL_CODE,
+    })
+    recorder.call(transport, 'POST /login', 'POST', '/login', {"email": email, "password": PASSWORD})
+
+    for _ in range(args.iterations):
+        recorder.call(transport, 'GET /restaurants', 'GET', '/restaurants')
+        restaurant_id = rng.randint(1, args.restaurants)
+        recorder.call(transport, 'GET /restaurant/<id>', 'GET', f'/restaurant/{restaurant_id}')
+        for _ in range(rng.randint(1, 3)):
+            menu_item_id = (restaurant_id - 1) * ITEMS_PER_RESTAURANT + rng.randint(1, ITEMS_PER_RESTAURANT)
+            recorder.call(transport, 'GET /add_to_cart/<id>', 'GET', f'/add_to_cart/{menu_item_id}')
+        recorder.call(transport, 'GET /cart', 'GET', '/cart')
+        _, location, _ = recorder.call(transport, 'POST /create_order', 'POST', '/create_order', {"note": ""})
+        if location.endswith('/orders'):
+            with recorder.lock:
+                placed['orders'] += 1
+
+
+def restaurant_session(make_transport, recorder, restaurant_id, customers_done, args):
+    transport = make_transport()
+    recorder.call(transport, 'POST /login', 'POST', '/login',
+                  {"email": f"restaurant{restaurant_id}@load", "password": PASSWORD})
+
+    while True:
+        finished = customers_done.is_set()
+        _, _, body = recorder.call(transport, 'GET /restaurant_orders', 'GET',
+                                   f'/restaurant_orders?restaurant_id={restaurant_id}')
+        to_accept, to_complete = ACCEPT_RE.findall(body), DONE_RE.findall(body)
+        for order_id in to_accept:
+            recorder.call(transport, 'POST /accept_or_reject_order', 'POST',
+                          f'/accept_or_reject_order/{int(order_id)}/accept')
+        for order_id in to_complete:
+            recorder.call(transport, 'POST /mark_as_done/<id>', 'POST', f'/mark_as_done/{int(order_id)}')
+        if not to_accept and not to_complete:
+            if finished:
+                return
+            time.sleep(args.poll_interval)
+
+
+def percentile(sorted_values, q):
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def report(recorder, elapsed, args, placed):
+    routes = {}
+    for label, latencies in sorted(recorder.latencies.items()):
+        latencies.sort()
+        routes[label] = {
+            "count": len(latencies),
+            "errors": recorder.errors[label],
+            "rps": round(len(latencies) / elapsed, 1),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+            "max_ms": round(latencies[-1] * 1000, 2),
+        }
+    return {
+        "config": {key: getattr(args, key) for key in ('customers', 'restaurants', 'iterations', 'transport', 'seed')},
+        "elapsed_s": round(elapsed, 3),
+        "orders_placed": placed['orders'],
+        "routes": routes,
+    }
+
+
+def print_report(result):
+    print(f"{'route':<32}{'count':>7}{'err':>5}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for label, stats in result['routes'].items():
+        print(f"{label:<32}{stats['count']:>7}{stats['errors']:>5}{stats['rps']:>9}"
+              f"{stats['p50_ms']:>9}{stats['p95_ms']:>9}{stats['p99_ms']:>9}{stats['max_ms']:>9}")
+    print(f"{result['orders_placed']} orders placed in {result['elapsed_s']} s")
+
+
+def regressions(result, baseline, tolerance):
+    problems = []
+    if result['config'] != baseline['config']:
+        problems.append(f"config differs from baseline: {baseline['config']}")
+    for label, old in baseline['routes'].items():
+        new = result['routes'].get(label)
+        if new is None:
+            problems.append(f"{label}: missing from this run")
+            continue
+        if new['p95_ms'] > old['p95_ms'] * (1 + tolerance):
+            problems.append(f"{label}: p95 {new['p95_ms']} ms vs. {old['p95_ms']} ms in baseline")
+        if new['rps'] < old['rps'] * (1 - tolerance):
+            problems.append(f"{label}: {new['rps']} req/s vs. {old['rps']} req/s in baseline")
+    for label, stats in result['routes'].items():
+        if stats['errors']:
+            problems.append(f"{label}: {stats['errors']} failed requests")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--customers', type=int, default=16, help="concurrent customer sessions")
+    parser.add_argument('--restaurants', type=int, default=4, help="restaurants, each with its own session")
+    parser.add_argument('--iterations', type=int, default=5, help="orders attempted per customer")
+    parser.add_argument('--transport', choices=['client', 'server'], default='client')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--poll-interval', type=float, default=0.05)
+    parser.add_argument('--save', metavar='PATH', help="write the report as JSON")
+    parser.add_argument('--baseline', metavar='PATH', help="fail on regressions against this JSON report")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed relative slowdown")
+    args = parser.parse_args()
+
+    with app.app_context():
+        seed(args.restaurants, random.Random(args.seed))
+
+    server = None
+    if args.transport == 'server':
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)  # no access log per request
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_port}"
+        make_transport = lambda: HTTPTransport(base_url)  # noqa: E731
+    else:
+        make_transport = ClientTransport
+
+    recorder = Recorder()
+    placed = {'orders': 0}
+    customers_done = threading.Event()
+    customers = [
+        threading.Thread(target=customer_session, args=(make_transport, recorder, i, args, placed))
+        for i in range(1, args.customers + 1)
+    ]
+    restaurants = [
+        threading.Thread(target=restaurant_session, args=(make_transport, recorder, i, customers_done, args))
+        for i in range(1, args.restaurants + 1)
+    ]
+
+    start = time.perf_counter()
+    for worker in customers + restaurants:
+        worker.start()
+    for worker in customers:
+        worker.join()
+    customers_done.set()
+    for worker in restaurants:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    if server:
+        server.shutdown()
+
+    result = report(recorder, elapsed, args, placed)
+    print_report(result)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(result, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = regressions(result, json.load(f), args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""Statements and time per bulk menu change, per item vs. the menu_bulk paths.
+
+For each menu size, imports the menu, changes every item's price and
+availability and deletes half of the items, once the way the form routes
+did it (one ORM object per item, MenuItem.query.get per ID) and once with
+menu_bulk. Counts the statements sent to the database; the bulk paths stay
+at a handful however large the batch is. Runs against a throwaway SQLite
+database.
+
+Usage: python -m benchmarks.menu_bulk [--sizes 300 3000]
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import time as dtime
+from decimal import Decimal
+
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'menu_bulk.db')}"
+os.environ.setdefault('JOB_WORKERS', '0')
+
+from sqlalchemy import event  # noqa: E402
+
+from app import app  # noqa: E402
+import menu_bulk  # noqa: E402
+from models import db, User, UserType, Restaurant, MenuItem, CartItem  # noqa: E402
+
+statements = 0
+
+
+def count_statement(conn, cursor, statement, parameters, context, executemany):
+    global statements
+    statements += 1
+
+
+def seed():
+    db.create_all()
+    db.session.add(User(UserID=1, EmailAddress="r1@bench", Password="x", UserType=UserType.Restaurant))
+    db.session.add(Restaurant(RestaurantID=1, UserID=1, Name="Restaurant 1", Address="Hauptstr. 1", PostalCode="47051",
+                              Description="bench", OpenTime=dtime(0), CloseTime=dtime(0)))
+    db.session.commit()
+
+
+def rows(n):
+    return [{"Name": f"Item {i}", "Description": f"Description of item {i}", "Price": f"{4.5 + i % 10:.2f}",
+             "Category": "Pizza"} for i in range(n)]
+
+
+def item_ids():
+    return db.session.execute(db.select(MenuItem.MenuItemID).where(MenuItem.RestaurantID == 1)).scalars().all()
+
+
+def per_item_import(n):
+    for row in rows(n):
+        db.session.add(MenuItem(RestaurantID=1, **row))
+    db.session.commit()
+
+
+def per_item_update(ids):
+    for item_id in ids:
+        item = MenuItem.query.get(item_id)
+        item.Price = item.Price + 1
+        item.IsAvailable = not item.IsAvailable
+    db.session.commit()
+
+
+def per_item_delete(ids):
+    for item_id in ids:
+        item = MenuItem.query.get(item_id)
+        if item:
+            CartItem.query.filter_by(MenuItemID=item.MenuItemID).delete()
+            db.session.delete(item)
+    db.session.commit()
+
+
+def bulk_import(n):
+    menu_bulk.import_menu(1, rows(n))
+    db.session.commit()
+
+
+def bulk_update(ids):
+    menu_bulk.batch_update(1, [{"MenuItemID": item_id, "Price": Decimal('5.50'), "IsAvailable": False} for item_id in ids])
+    db.session.commit()
+
+
+def bulk_delete(ids):
+    menu_bulk.delete_items(1, ids)
+    db.session.commit()
+
+
+def measure(step, *args):
+    global statements
+    db.session.expunge_all()
+    statements = 0
+    started = time.perf_counter()
+    step(*args)
+    return statements, (time.perf_counter() - started) * 1000
+
+
+def run(n, import_, update_, delete_):
+    results = [measure(import_, n)]
+    ids = item_ids()
+    results.append(measure(update_, ids))
+    results.append(measure(delete_, ids[::2]))
+    measure(delete_, item_ids())
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[300, 3000])
+    args = parser.parse_args()
+
+    with app.app_context():
+        seed()
+        event.listen(db.engine, 'before_cursor_execute', count_statement)
+        print("statements / ms per step; the delete removes half of the items")
+        print(f"{'items':>6} {'path':<9}{'import':>16}{'update all':>16}{'delete half':>16}")
+        for n in args.sizes:
+            for name, steps in (('per item', (per_item_import, per_item_update, per_item_delete)),
+                                ('bulk', (bulk_import, bulk_update, bulk_delete))):
+                results = run(n, *steps)
+                print(f"{n:>6} {name:<9}" + "".join(f"{count:>7} /{ms:>7.1f}" for count, ms in results))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+"""Stress test: concurrent status transitions must have exactly-once balance effects.
+
+Worker threads keep trying to accept, reject and complete the same orders
+at once, like restaurant tabs clicking at the same moment. Afterwards every
+customer balance must equal its starting balance minus its orders plus the
+refunds of its cancelled orders, every restaurant balance must equal its
+completed orders, and every order's Version must equal the number of
+transitions applied to it. ``--legacy`` runs the former read-modify-write
+code for comparison.
+
+Runs against a throwaway SQLite database (DATABASE_URL is pointed at a
+temporary file).
+
+Usage: python -m benchmarks.order_transitions [--orders 200] [--threads 8]
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import time as dtime
+from decimal import Decimal
+
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'transitions.db')}"
+os.environ.setdefault('JOB_WORKERS', '0')
+os.environ.setdefault('SLOW_QUERY_MS', '0')
+
+from sqlalchemy import func, insert, select  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+
+from app import app  # noqa: E402
+from ledger import apply_restaurant_balance, reconcile_restaurant_balances  # noqa: E402
+from models import db, User, UserType, Customer, Restaurant, Order  # noqa: E402
+from order_state import (transition, InvalidTransition, TransitionConflict,  # noqa: E402
+                         BEING_PREPARED, COMPLETED, CANCELLED)
+
+START_BALANCE = Decimal(1000)
+TARGETS = [BEING_PREPARED, CANCELLED, COMPLETED]
+
+
+def seed(n_orders, n_customers, n_restaurants, rng):
+    db.drop_all()
+    db.create_all()
+    orders = []
+    for order_id in range(1, n_orders + 1):
+        total = Decimal(rng.randint(500, 5000)) / 100
+        fee = (total * Decimal('0.15')).quantize(Decimal('0.01'))
+        orders.append({"OrderID": order_id, "CustomerID": rng.randint(1, n_customers),
+                       "RestaurantID": rng.randint(1, n_restaurants), "Status": 'Processing',
+                       "TotalAmount": total, "PlatformFee": fee, "RestaurantAmount": total - fee})
+
+    # customers have already paid for their orders at checkout
+    paid = {}
+    for order in orders:
+        paid[order["CustomerID"]] = paid.get(order["CustomerID"], 0) + order["TotalAmount"]
+
+    db.session.execute(insert(User), [
+        {"UserID": i, "EmailAddress": f"u{i}@bench", "Password": "x",
+         "UserType": UserType.Customer if i <= n_customers else UserType.Restaurant}
+        for i in range(1, n_customers + n_restaurants + 1)
+    ])
+    db.session.execute(insert(Customer), [
+        {"UserID": i, "FirstName": "Bench", "LastName": str(i), "Address": "Hauptstr. 1", "PostNumber": "47051",
+         "Balance": float(START_BALANCE - paid.get(i, 0))}
+        for i in range(1, n_customers + 1)
+    ])
+    db.session.execute(insert(Restaurant), [
+        {"RestaurantID": i, "UserID": n_customers + i, "Name": f"Restaurant {i}", "Address": "Hauptstr. 2",
+         "PostalCode": "47051", "OpenTime": dtime(0), "CloseTime": dtime(23, 59), "Balance": 0}
+        for i in range(1, n_restaurants + 1)
+    ])
+    db.session.execute(insert(Order), orders)
+    db.session.commit()
+    return orders
+
+
+def legacy_transition(order_id, status):
+    # the former route bodies: read the order, set the status, adjust balances in Python
+    order = db.session.get(Order, order_id)
+    previous_status = order.Status
+    if status == BEING_PREPARED:
+        customer = db.session.get(Customer, order.CustomerID)
+        customer.Balance -= float(order.TotalAmount)
+    if status == CANCELLED:
+        customer = db.session.get(Customer, order.CustomerID)
+        customer.Balance += float(order.TotalAmount)
+    order.Status = status
+    apply_restaurant_balance(order, previous_status, status)
+    return True
+
+
+def hammer(order_ids, threads, attempts, legacy, seed_value):
+    applied = {}
+    counts = {'applied': 0, 'conflicts': 0, 'invalid': 0, 'locked': 0}
+    lock = threading.Lock()
+    start_line = threading.Barrier(threads)
+
+    def worker(n):
+        rng = random.Random(seed_value + n)
+        start_line.wait()
+        for _ in range(attempts):
+            order_id = rng.choice(order_ids)
+            status = rng.choice(TARGETS)
+            with app.app_context():
+                try:
+                    if legacy:
+                        done = legacy_transition(order_id, status)
+                    else:
+                        done = transition(order_id, status) is not None
+                    db.session.commit()
+                    key = 'applied' if done else 'invalid'
+                except TransitionConflict:
+                    db.session.rollback()
+                    key, done = 'conflicts', False
+                except InvalidTransition:
+                    db.session.rollback()
+                    key, done = 'invalid', False
+                except OperationalError:
+                    db.session.rollback()
+                    key, done = 'locked', False
+            with lock:
+                counts[key] += 1
+                if done:
+                    applied[order_id] = applied.get(order_id, 0) + 1
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return counts, applied, time.perf_counter() - started
+
+
+def check(orders, applied, versions=True):
+    problems = []
+    statuses = dict(db.session.execute(select(Order.OrderID, Order.Status)).all())
+
+    # what is left after checkout, plus one refund per cancelled order
+    expected = {}
+    for order in orders:
+        refund = order["TotalAmount"] if statuses[order["OrderID"]] == CANCELLED else 0
+        expected[order["CustomerID"]] = expected.get(order["CustomerID"], START_BALANCE) - order["TotalAmount"] + refund
+    for user_id, balance in db.session.execute(select(Customer.UserID, Customer.Balance)):
+        want = expected.get(user_id, START_BALANCE)
+        if abs(Decimal(str(balance)) - want) > Decimal('0.005'):
+            problems.append(f"customer {user_id}: balance {balance:.2f}, expected {want:.2f}")
+
+    for restaurant_id, running, recomputed in reconcile_restaurant_balances():
+        problems.append(f"restaurant {restaurant_id}: balance {running}, completed orders sum to {recomputed}")
+
+    if versions:
+        for order_id, version in db.session.execute(select(Order.OrderID, Order.Version)):
+            if version != applied.get(order_id, 0):
+                problems.append(f"order {order_id}: version {version}, {applied.get(order_id, 0)} transitions applied")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--orders', type=int, default=200)
+    parser.add_argument('--customers', type=int, default=20)
+    parser.add_argument('--restaurants', type=int, default=5)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--attempts', type=int, default=300, help="transition attempts per thread")
+    parser.add_argument('--legacy', action='store_true', help="run the former read-modify-write transitions")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    with app.app_context():
+        orders = seed(args.orders, args.customers, args.restaurants, random.Random(args.seed))
+
+    counts, applied, elapsed = hammer(list(range(1, args.orders + 1)), args.threads, args.attempts, args.legacy, args.seed)
+    print(f"{'legacy' if args.legacy else 'state machine'}: {sum(counts.values())} attempts in {elapsed:.2f} s, "
+          + ", ".join(f"{count} {key}" for key, count in counts.items()))
+
+    with app.app_context():
+        by_status = dict(db.session.execute(select(Order.Status, func.count()).group_by(Order.Status)).all())
+        print("final statuses: " + ", ".join(f"{count} {status}" for status, count in sorted(by_status.items())))
+        # the legacy code does not bump the version, only its balances can be checked
+        problems = check(orders, applied, versions=not args.legacy)
+    for problem in problems[:20]:
+        print(f"  {problem}")
+    print(f"{len(problems)} balance/version mismatches")
+    raise SystemExit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""Sustained login throughput, and what it costs the other requests, with and without the hashing pool.
+
+Starts the app on a local threaded HTTP server. For each mode, --clients
+threads log in as fast as they can for --seconds while a probe thread keeps
+fetching a cheap page (/about) and records its latency. "inline" hashes on
+the request threads (PASSWORD_WORKERS=0), so every concurrent login takes
+a CPU; "pool" bounds hashing to --workers at a time and leaves the rest of
+the CPU to other requests. Logins refused with 503 (pool full) are counted
+separately. Runs against a throwaway SQLite database.
+
+Usage: python -m benchmarks.passwords [--clients 8] [--workers 1] [--seconds 10]
+"""
+import argparse
+import http.client
+import logging
+import os
+import statistics
+import tempfile
+import threading
+import time
+import urllib.parse
+
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'passwords.db')}"
+os.environ.setdefault('JOB_WORKERS', '0')
+os.environ.setdefault('PLATFORM_FEE_ROLLUP_SECONDS', '0')
+os.environ.setdefault('SLOW_QUERY_MS', '0')
+
+from werkzeug.serving import make_server  # noqa: E402
+
+from app import app  # noqa: E402
+from models import db, User, UserType, Customer  # noqa: E402
+from passwords import password_hasher  # noqa: E402
+
+PASSWORD = 'correct horse battery staple'
+
+
+def seed(n_users):
+    db.create_all()
+    hashed = password_hasher.hash(PASSWORD)
+    db.session.execute(db.insert(User), [
+        {"UserID": i, "EmailAddress": f"user{i}@bench", "Password": hashed, "UserType": UserType.Customer}
+        for i in range(1, n_users + 1)
+    ])
+    db.session.execute(db.insert(Customer), [
+        {"UserID": i, "FirstName": "Bench", "LastName": str(i), "Address": "Hauptstr. 1", "PostNumber": "47051"}
+        for i in range(1, n_users + 1)
+    ])
+    db.session.commit()
+
+
+def request(port, method, path, body=None):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    try:
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'} if body else {}
+        connection.request(method, path, body=body, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        return response.status
+    finally:
+        connection.close()
+
+
+def run(port, clients, n_users, seconds):
+    stop = threading.Event()
+    counts = {'ok': 0, 'busy': 0, 'failed': 0}
+    probe_ms = []
+    lock = threading.Lock()
+
+    def login(n):
+        i = 0
+        while not stop.is_set():
+            email = f"user{(n + i * clients) % n_users + 1}@bench"
+            status = request(port, 'POST', '/login', urllib.parse.urlencode({'email': email, 'password': PASSWORD}))
+            key = 'ok' if status == 302 else 'busy' if status == 503 else 'failed'
+            with lock:
+                counts[key] += 1
+            i += 1
+
+    def probe():
+        while not stop.is_set():
+            started = time.perf_counter()
+            request(port, 'GET', '/about')
+            probe_ms.append((time.perf_counter() - started) * 1000)
+            time.sleep(0.01)
+
+    threads = [threading.Thread(target=login, args=(n,)) for n in range(clients)] + [threading.Thread(target=probe)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    probe_ms.sort()
+    return counts, probe_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--clients', type=int, default=8, help="concurrent login loops")
+    parser.add_argument('--workers', type=int, default=1, help="hashing pool size in pool mode")
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--users', type=int, default=100)
+    args = parser.parse_args()
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    with app.app_context():
+        seed(args.users)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_port
+
+    print(f"{password_hasher.scheme} {password_hasher.params}, {os.cpu_count()} CPU(s), "
+          f"{args.clients} login clients, {args.seconds:g} s per mode")
+    print(f"{'mode':<18}{'logins/s':>10}{'503s':>7}{'/about p50':>12}{'p95':>9}{'p99':>9}")
+    modes = [('idle', None, 0), ('inline', 0, args.clients), (f"pool ({args.workers})", args.workers, args.clients)]
+    for name, workers, clients in modes:
+        if workers is not None:
+            password_hasher.shutdown()
+            password_hasher.workers = workers
+        counts, probe_ms = run(port, clients, args.users, args.seconds)
+        if counts['failed']:
+            print(f"  {counts['failed']} logins failed")
+        quantile = lambda q: probe_ms[min(int(len(probe_ms) * q), len(probe_ms) - 1)]  # noqa: E731
+        print(f"{name:<18}{counts['ok'] / args.seconds:>10.1f}{counts['busy']:>7}"
+              f"{statistics.median(probe_ms):>10.1f}ms{quantile(0.95):>7.1f}ms{quantile(0.99):>7.1f}ms")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""Concurrent checkouts: single hot Platform row vs. the append-only fee ledger.
+
+Each simulated checkout inserts an order and books its platform fee, either
+by incrementing the one Platform row (before) or by appending a PlatformFee
+row (after). Pass --url to run against another database than a temporary
+SQLite file.
+
+Usage: python -m benchmarks.platform_fees [--threads 16] [--seconds 5] [--url URL]
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from datetime import time as dtime
+from decimal import Decimal
+
+from flask import Flask
+from sqlalchemy import insert, update
+from sqlalchemy.exc import OperationalError
+
+from config import engine_options, install_sqlite_pragmas, sqlite_pragmas
+from ledger import platform_balance, record_platform_fee, rollup_platform_fees
+from models import db, Order, Platform, Restaurant, User, UserType
+
+FEE = Decimal('1.50')
+
+
+def build_app(url):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(url)
+    db.init_app(app)
+    with app.app_context():
+        install_sqlite_pragmas(db.engine, sqlite_pragmas())
+        db.drop_all()
+        db.create_all()
+        db.session.add(User(UserID=1, EmailAddress='bench@bench', Password='x', UserType=UserType.Restaurant))
+        db.session.add(Restaurant(RestaurantID=1, UserID=1, Name='Bench', Address='x', PostalCode='1',
+                                  OpenTime=dtime(0), CloseTime=dtime(23)))
+        db.session.add(Platform(PlatformID=1, Balance=0, RolledUpFeeID=0))
+        db.session.commit()
+    return app
+
+
+def book_fee_on_platform_row(order_id):
+    db.session.execute(
+        update(Platform).where(Platform.PlatformID == 1).values(Balance=Platform.Balance + FEE)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def book_fee_in_ledger(order_id):
+    record_platform_fee(order_id, FEE)
+
+
+def run(label, app, book_fee, threads, seconds):
+    stop = threading.Event()
+    done = {'checkouts': 0, 'errors': 0}
+    lock = threading.Lock()
+
+    def checkout_loop():
+        with app.app_context():
+            while not stop.is_set():
+                try:
+                    order_id = db.session.execute(insert(Order).values(
+                        CustomerID=1, RestaurantID=1, Status='Processing',
+                        TotalAmount=10, PlatformFee=FEE, RestaurantAmount=8.5
+                    )).inserted_primary_key[0]
+                    book_fee(order_id)
+                    db.session.commit()
+                    key = 'checkouts'
+                except OperationalError:
+                    db.session.rollback()
+                    key = 'errors'
+                with lock:
+                    done[key] += 1
+
+    workers = [threading.Thread(target=checkout_loop) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    time.sleep(seconds)
+    stop.set()
+    for worker in workers:
+        worker.join()
+    print(f"{label:>13}: {done['checkouts'] / seconds:8.1f} checkouts/s  {done['errors']} errors")
+    return done['checkouts']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--url', default=f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'fees.db')}")
+    args = parser.parse_args()
+
+    app = build_app(args.url)
+    run('platform row', app, book_fee_on_platform_row, args.threads, args.seconds)
+
+    app = build_app(args.url)
+    checkouts = run('fee ledger', app, book_fee_in_ledger, args.threads, args.seconds)
+    with app.app_context():
+        start = time.perf_counter()
+        balance = platform_balance()
+        read_ms = (time.perf_counter() - start) * 1000
+        rollup_platform_fees()
+        assert platform_balance() == balance == FEE * checkouts, (balance, FEE * checkouts)
+        print(f"aggregate balance {balance} € read in {read_ms:.1f} ms, matches {checkouts} booked fees")
+
+
+if __name__ == '__main__':
+    main()
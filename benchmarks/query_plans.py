@@ -0,0 +1,46 @@
+"""Fail if any query the routes run needs a full table scan.
+
+Drives the real routes through the Flask test client against a small
+seeded SQLite database: login, sign-up and the principal load, browsing,
+search, the cart, checkout, order history pages, status changes and the
+job worker that applies them, /metrics, the restaurant menu pages and
+their item forms, and the bulk menu export, import and edits. Every
+statement is checked with EXPLAIN QUERY PLAN (see plan_check.py); any
+plain ``SCAN <table>``, automatic index or sort of a whole paginated
+result is reported and the script exits non-zero.
+tests/test_query_plans.py runs the same check.
+
+Usage: python -m benchmarks.query_plans
+"""
+import os
+import sys
+import tempfile
+
+from models import db
+from plan_check import check_routes
+
+
+def main():
+    # the app reads its configuration at import time
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'plans.db')}"
+    os.environ.setdefault('JOB_WORKERS', '0')
+    os.environ.setdefault('PASSWORD_WORKERS', '0')
+    os.environ.setdefault('PLATFORM_FEE_ROLLUP_SECONDS', '0')
+    from app import app
+
+    with app.app_context():
+        db.create_all()
+    results = check_routes(app)
+    failures = 0
+    for name, statement, scans in results:
+        if scans:
+            failures += 1
+            print(f"[FAIL] {name}: {'; '.join(scans)}\n       {' '.join(statement.split())[:200]}")
+    if failures:
+        print(f"{failures} quer{'y' if failures == 1 else 'ies'} with full table scans")
+        sys.exit(1)
+    print(f"all ok, {len(results)} statements in {len({name for name, _, _ in results})} route steps")
+
+
+if __name__ == '__main__':
+    main()
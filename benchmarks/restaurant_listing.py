@@ -0,0 +1,120 @@
+"""Benchmark the /restaurants listing: legacy N+1 queries vs. the delivery index.
+
+Usage: python -m benchmarks.restaurant_listing [--restaurants 10000] [--areas 100000]
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime, time as dtime
+
+from flask import Flask
+from sqlalchemy import event
+
+from models import db, User, UserType, Restaurant, DeliveryArea
+from delivery_index import DeliveryIndex
+
+
+def build_app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+
+def seed(n_restaurants, n_areas, n_postal_codes, rng):
+    postal_codes = [str(10000 + i) for i in range(n_postal_codes)]
+    db.session.execute(db.insert(User), [
+        {"UserID": i, "EmailAddress": f"r{i}@bench", "Password": "x", "UserType": UserType.Restaurant}
+        for i in range(1, n_restaurants + 1)
+    ])
+    db.session.execute(db.insert(Restaurant), [
+        {
+            "RestaurantID": i, "UserID": i, "Name": f"Restaurant {i}", "Address": "Hauptstr. 1",
+            "PostalCode": rng.choice(postal_codes), "Description": "bench",
+            "OpenTime": dtime(rng.randint(0, 10)), "CloseTime": dtime(rng.randint(18, 23)),
+        }
+        for i in range(1, n_restaurants + 1)
+    ])
+    db.session.execute(db.insert(DeliveryArea), [
+        {"RestaurantID": rng.randint(1, n_restaurants), "PostalCode": rng.choice(postal_codes)}
+        for _ in range(n_areas)
+    ])
+    db.session.commit()
+    return postal_codes
+
+
+def legacy_listing(postal_code, now):
+    # the pre-index implementation of show_restaurants
+    current_time = now.time()
+    delivery_areas = DeliveryArea.query.filter_by(PostalCode=postal_code).all()
+    restaurant_ids = [area.RestaurantID for area in delivery_areas]
+    restaurants = Restaurant.query.filter(Restaurant.RestaurantID.in_(restaurant_ids)).all()
+    data = []
+    for restaurant in restaurants:
+        if restaurant.OpenTime <= current_time <= restaurant.CloseTime:
+            areas = DeliveryArea.query.filter_by(RestaurantID=restaurant.RestaurantID).all()
+            data.append({"restaurant": restaurant, "delivery_area_str": ", ".join(a.PostalCode for a in areas)})
+    return data
+
+
+def indexed_listing(index, postal_code, now):
+    return [
+        {"restaurant": s, "delivery_area_str": s.delivery_area_str}
+        for s in index.open_restaurants_for(postal_code, now)
+    ]
+
+
+def measure(name, fn, postal_codes, requests, rng):
+    counter = {"queries": 0}
+
+    def count(*args):
+        counter["queries"] += 1
+
+    event.listen(db.engine, 'before_cursor_execute', count)
+    latencies = []
+    try:
+        for _ in range(requests):
+            postal_code = rng.choice(postal_codes)
+            start = time.perf_counter()
+            fn(postal_code, datetime(2024, 5, 15, 12))
+            latencies.append((time.perf_counter() - start) * 1000)
+            db.session.expunge_all()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{name:>8}: {counter['queries'] / requests:8.1f} queries/request  "
+          f"p50 {statistics.median(latencies):8.2f} ms  p99 {p99:8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--restaurants', type=int, default=10000)
+    parser.add_argument('--areas', type=int, default=100000)
+    parser.add_argument('--postal-codes', type=int, default=500)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    app = build_app()
+    with app.app_context():
+        db.create_all()
+        rng = random.Random(args.seed)
+        postal_codes = seed(args.restaurants, args.areas, args.postal_codes, rng)
+        print(f"{args.restaurants} restaurants, {args.areas} delivery areas, {args.postal_codes} postal codes")
+
+        index = DeliveryIndex(max_age=None)
+        start = time.perf_counter()
+        index.rebuild()
+        print(f"index build: {(time.perf_counter() - start) * 1000:.1f} ms (once per change)")
+
+        measure("legacy", legacy_listing, postal_codes, args.requests, random.Random(args.seed))
+        measure("indexed", lambda pc, t: indexed_listing(index, pc, t), postal_codes, args.requests,
+                random.Random(args.seed))
+
+
+if __name__ == '__main__':
+    main()
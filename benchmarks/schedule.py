@@ -0,0 +1,98 @@
+"""Open-now evaluation: naive per-row check of OpeningHours vs. the compiled Schedule.
+
+Generates per-weekday opening hours (some closing past midnight, some days
+closed), checks that both give the same answer at random moments of the
+week and compares the cost of asking which of a postal code's candidates
+are open.
+
+Usage: python -m benchmarks.schedule [--restaurants 10000] [--candidates 200]
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from schedule import compile_schedule, time_seconds
+
+
+def generate_hours(n_restaurants, rng):
+    rows = []
+    for restaurant_id in range(1, n_restaurants + 1):
+        for day in range(7):
+            if rng.random() < 0.1:
+                continue  # closed that day
+            open_hour = rng.randint(6, 12)
+            close_hour = rng.choice([rng.randint(18, 23), rng.randint(0, 3)])  # past midnight for some
+            rows.append((restaurant_id, day, f"{open_hour:02d}:00", f"{close_hour:02d}:{rng.choice(['00', '30'])}"))
+    return rows
+
+
+def naive_open(rows_by_restaurant, restaurant_ids, when):
+    # today's hours, plus yesterday's when they run past midnight
+    today, now = when.weekday(), time_seconds(when.time())
+    yesterday = (today - 1) % 7
+    result = []
+    for restaurant_id in restaurant_ids:
+        for day, open_time, close_time in rows_by_restaurant.get(restaurant_id, ()):
+            start, end = time_seconds(open_time), time_seconds(close_time)
+            if day == today and (start <= now < end or (end <= start and now >= start)):
+                break
+            if day == yesterday and end < start and now < end:
+                break
+        else:
+            continue
+        result.append(restaurant_id)
+    return result
+
+
+def timed(fn, cases):
+    latencies = []
+    for args in cases:
+        start = time.perf_counter()
+        fn(*args)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return statistics.median(latencies), latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--restaurants', type=int, default=10000)
+    parser.add_argument('--candidates', type=int, default=200, help="restaurants delivering to one postal code")
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rows = generate_hours(args.restaurants, rng)
+    rows_by_restaurant = {}
+    for restaurant_id, day, open_time, close_time in rows:
+        rows_by_restaurant.setdefault(restaurant_id, []).append((day, open_time, close_time))
+
+    start = time.perf_counter()
+    schedule = compile_schedule(rows, {})
+    print(f"{args.restaurants} restaurants, {len(rows)} opening hours, "
+          f"compiled in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    monday = datetime(2024, 5, 13)
+    cases = [
+        (rng.sample(range(1, args.restaurants + 1), args.candidates),
+         monday + timedelta(seconds=rng.randrange(7 * 24 * 3600)))
+        for _ in range(args.requests)
+    ]
+
+    mismatches = sum(naive_open(rows_by_restaurant, ids, when) != schedule.open_among(ids, when) for ids, when in cases)
+    print(f"{mismatches} of {len(cases)} answers differ")
+
+    for name, fn in [
+        ("naive", lambda ids, when: naive_open(rows_by_restaurant, ids, when)),
+        ("schedule", schedule.open_among),
+        ("next change", schedule.next_change),
+    ]:
+        p50, p99 = timed(fn, cases)
+        print(f"{name:>12}: p50 {p50:8.3f} ms  p99 {p99:8.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
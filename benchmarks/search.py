@@ -0,0 +1,151 @@
+"""Search latency on a large menu corpus: search.search() vs. bm25() ranking vs. LIKE.
+
+Seeds --restaurants restaurants delivering to one to three of --postal-codes
+postal codes each, with --items menu items built from a small dish
+vocabulary, so common words match a large part of the corpus. Then runs
+--queries searches for one or two (partly typed) words from a random postal
+code three ways:
+
+  fts            search.search(), one MATCH per candidate restaurant, two tiers
+  fts, bm25      one MATCH over all candidate restaurants, every hit ranked by bm25()
+  like           LIKE '%word%' on every column, name matches first
+
+and prints latency percentiles. LIKE runs a tenth of the queries, it scans
+the whole corpus every time. Runs against a throwaway SQLite database.
+
+Usage: python -m benchmarks.search [--items 1000000] [--restaurants 3000] [--queries 500]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, time as dtime
+
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'search.db')}"
+os.environ.setdefault('JOB_WORKERS', '0')
+os.environ.setdefault('SLOW_QUERY_MS', '0')
+
+from sqlalchemy import text  # noqa: E402
+
+from app import app  # noqa: E402
+from delivery_index import delivery_index  # noqa: E402
+from models import db, User, UserType, Restaurant, DeliveryArea, MenuItem  # noqa: E402
+from search import OPTIMIZE, match_terms, search  # noqa: E402
+
+DISHES = ['pizza', 'pasta', 'burger', 'salad', 'soup', 'curry', 'sushi', 'taco', 'schnitzel', 'kebab', 'wrap',
+          'bowl', 'noodles', 'risotto', 'lasagne', 'falafel', 'gyros', 'ramen', 'dumplings', 'steak']
+STYLES = ['margherita', 'salami', 'funghi', 'spicy', 'vegan', 'classic', 'grilled', 'crispy', 'creamy', 'tandoori',
+          'teriyaki', 'hawaii', 'diavola', 'bolognese', 'carbonara', 'caesar', 'greek', 'thai', 'wiener', 'käse']
+EXTRAS = ['tomato', 'mozzarella', 'basil', 'onions', 'garlic', 'chili', 'cheese', 'chicken', 'beef', 'tofu',
+          'mushrooms', 'peppers', 'olives', 'rice', 'fries', 'sauce', 'herbs', 'lemon', 'avocado', 'spinach']
+CATEGORIES = ['Pizza', 'Pasta', 'Main', 'Starter', 'Dessert', 'Drinks', 'Sides', 'Specials']
+
+
+def seed(n_restaurants, n_items, n_postal_codes, rng):
+    db.create_all()
+    postal_codes = [str(10000 + i) for i in range(n_postal_codes)]
+    db.session.execute(db.insert(User), [
+        {"UserID": i, "EmailAddress": f"r{i}@bench", "Password": "x", "UserType": UserType.Restaurant}
+        for i in range(1, n_restaurants + 1)
+    ])
+    db.session.execute(db.insert(Restaurant), [
+        {"RestaurantID": i, "UserID": i, "Name": f"{rng.choice(STYLES).title()} {rng.choice(DISHES).title()} {i}",
+         "Address": "Hauptstr. 1", "PostalCode": rng.choice(postal_codes),
+         "Description": f"{rng.choice(DISHES)} and {rng.choice(DISHES)}", "OpenTime": dtime(0), "CloseTime": dtime(0)}
+        for i in range(1, n_restaurants + 1)
+    ])
+    db.session.execute(db.insert(DeliveryArea), [
+        {"RestaurantID": i, "PostalCode": postal_code}
+        for i in range(1, n_restaurants + 1) for postal_code in rng.sample(postal_codes, rng.randint(1, 3))
+    ])
+    for start in range(0, n_items, 50000):
+        db.session.execute(db.insert(MenuItem), [
+            {"RestaurantID": rng.randint(1, n_restaurants), "Name": f"{rng.choice(DISHES).title()} {rng.choice(STYLES)}",
+             "Description": ", ".join(rng.sample(EXTRAS, 3)), "Price": rng.randint(300, 2500) / 100,
+             "Category": rng.choice(CATEGORIES)}
+            for _ in range(start, min(start + 50000, n_items))
+        ])
+    for statement in OPTIMIZE:
+        db.session.execute(text(statement))
+    db.session.commit()
+    return postal_codes
+
+
+def random_query(rng):
+    words = [rng.choice(DISHES + STYLES + EXTRAS) for _ in range(rng.randint(1, 2))]
+    # the last word as it is being typed
+    words[-1] = words[-1][:rng.randint(3, len(words[-1]))]
+    return ' '.join(words)
+
+
+def bm25_ranked(query, postal_code, now, limit=20):
+    # every match among the open restaurants ranked with bm25(), the delivery filter as an OR of restaurant tokens
+    open_ids = [summary.RestaurantID for summary in delivery_index.open_restaurants_for(postal_code, now)]
+    restaurants = ' OR '.join(f"r{restaurant_id}" for restaurant_id in open_ids)
+    return db.session.execute(text("""
+        SELECT rowid FROM MenuItemSearch WHERE MenuItemSearch MATCH :match
+        ORDER BY bm25(MenuItemSearch, 10.0, 1.0, 4.0, 0.0) LIMIT :limit
+    """), {"match": f"- {{Restaurant}}: ({' '.join(match_terms(query))}) AND Restaurant: ({restaurants})",
+           "limit": limit}).all()
+
+
+def like(query, postal_code, now, limit=20):
+    open_ids = [summary.RestaurantID for summary in delivery_index.open_restaurants_for(postal_code, now)]
+    conditions = ' AND '.join(
+        f"(Name LIKE :w{i} OR Description LIKE :w{i} OR Category LIKE :w{i})" for i in range(len(query.split()))
+    )
+    return db.session.execute(text(f"""
+        SELECT MenuItemID FROM MenuItems WHERE {conditions} AND RestaurantID IN ({','.join(map(str, open_ids))})
+        ORDER BY Name LIKE :w0 DESC LIMIT :limit
+    """), {"limit": limit, **{f"w{i}": f"%{word}%" for i, word in enumerate(query.split())}}).all()
+
+
+def timed(fn, workload, now):
+    samples = []
+    hits = 0
+    for query, postal_code in workload:
+        started = time.perf_counter()
+        result = fn(query, postal_code, now)
+        samples.append((time.perf_counter() - started) * 1000)
+        hits += bool(result[1] if isinstance(result, tuple) else result)
+    samples.sort()
+    quantile = lambda q: samples[min(int(len(samples) * q), len(samples) - 1)]  # noqa: E731
+    return statistics.median(samples), quantile(0.95), quantile(0.99), hits / len(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--items', type=int, default=1000000)
+    parser.add_argument('--restaurants', type=int, default=3000)
+    parser.add_argument('--postal-codes', type=int, default=100)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    with app.app_context():
+        started = time.perf_counter()
+        postal_codes = seed(args.restaurants, args.items, args.postal_codes, rng)
+        print(f"{args.items} menu items, {args.restaurants} restaurants, {args.postal_codes} postal codes, "
+              f"seeded and indexed in {time.perf_counter() - started:.1f} s")
+
+        now = datetime.now()
+        workload = [(random_query(rng), rng.choice(postal_codes)) for _ in range(args.queries)]
+        for _, postal_code in workload:
+            delivery_index.open_restaurants_for(postal_code, now)
+
+        print(f"{'':<16}{'p50':>9}{'p95':>9}{'p99':>9}{'with hits':>11}")
+        for name, fn, queries in (
+            ('fts', lambda q, p, n: search(db.session, q, p, n), workload),
+            ('fts, bm25', bm25_ranked, workload),
+            ('like', like, workload[:max(len(workload) // 10, 1)]),
+        ):
+            fn(*queries[0], now)  # warm up the page cache
+            p50, p95, p99, hit_rate = timed(fn, queries, now)
+            print(f"{name:<16}{p50:>7.2f}ms{p95:>7.2f}ms{p99:>7.2f}ms{hit_rate:>11.0%}")
+
+
+if __name__ == '__main__':
+    main()
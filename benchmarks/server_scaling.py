@@ -0,0 +1,165 @@
+"""Throughput of /restaurants and /menu under serve.py with 1, 2, 4, ... worker processes.
+
+Seeds a throwaway SQLite database, then for each worker count starts
+``serve.py`` on a free port and hammers one route at a time from
+``--clients`` load generator processes for ``--seconds``. Reports requests
+per second and the speedup over one worker, which should grow about
+linearly until the workers outnumber the CPUs (the load generators share
+those CPUs too, so leave some headroom or run them from another machine).
+
+Usage: python -m benchmarks.server_scaling [--workers 1,2,4] [--clients 8] [--seconds 5]
+"""
+import argparse
+import http.client
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import time as dtime
+
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'scaling.db')}"
+os.environ.setdefault('SECRET_KEY', 'server-scaling-benchmark')
+os.environ.setdefault('JOB_WORKERS', '0')
+os.environ.setdefault('PLATFORM_FEE_ROLLUP_SECONDS', '0')
+os.environ.setdefault('SLOW_QUERY_MS', '0')
+
+from app import app  # noqa: E402
+from models import db, User, UserType, Customer, Restaurant, MenuItem, DeliveryArea  # noqa: E402
+
+POSTAL_CODE = '47051'
+CUSTOMER_ID = 1
+
+
+def seed(n_restaurants, items, rng):
+    db.create_all()
+    db.session.execute(db.insert(User), [
+        {"UserID": i, "EmailAddress": f"user{i}@scaling", "Password": "x",
+         "UserType": UserType.Customer if i == CUSTOMER_ID else UserType.Restaurant}
+        for i in range(1, n_restaurants + 2)
+    ])
+    db.session.execute(db.insert(Customer), [
+        {"UserID": CUSTOMER_ID, "FirstName": "Bench", "LastName": "Mark", "Address": "Hauptstr. 1",
+         "PostNumber": POSTAL_CODE, "Balance": 100}
+    ])
+    db.session.execute(db.insert(Restaurant), [
+        {"RestaurantID": i, "UserID": i + 1, "Name": f"Restaurant {i}", "Address": "Hauptstr. 2",
+         "PostalCode": POSTAL_CODE, "Description": "scaling", "OpenTime": dtime(0), "CloseTime": dtime(0)}
+        for i in range(1, n_restaurants + 1)
+    ])
+    db.session.execute(db.insert(DeliveryArea), [
+        {"RestaurantID": i, "PostalCode": POSTAL_CODE} for i in range(1, n_restaurants + 1)
+    ])
+    db.session.execute(db.insert(MenuItem), [
+        {"RestaurantID": i, "Name": f"Item {j}", "Description": "scaling", "Price": rng.choice([3.5, 7.5, 9.99])}
+        for i in range(1, n_restaurants + 1) for j in range(items)
+    ])
+    db.session.commit()
+
+
+def session_cookie():
+    serializer = app.session_interface.get_signing_serializer(app)
+    return f"{app.config['SESSION_COOKIE_NAME']}={serializer.dumps({'user_id': CUSTOMER_ID, 'user_type': 'Customer'})}"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers, port):
+    server = subprocess.Popen(
+        [sys.executable, 'serve.py', '--workers', str(workers), '--bind', f"127.0.0.1:{port}"],
+        stdout=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.terminate()
+    raise SystemExit(f"Error: serve.py with {workers} workers did not start")
+
+
+def load(port, paths, cookie, seconds, results):
+    done = errors = 0
+    deadline = time.monotonic() + seconds
+    rng = random.Random(os.getpid())
+    while time.monotonic() < deadline:
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        try:
+            connection.request('GET', rng.choice(paths), headers={'Cookie': cookie})
+            response = connection.getresponse()
+            response.read()
+            if response.status == 200:
+                done += 1
+            else:
+                errors += 1
+        except OSError:
+            errors += 1
+        finally:
+            connection.close()
+    results.put((done, errors))
+
+
+def measure(port, paths, cookie, clients, seconds):
+    results = multiprocessing.Queue()
+    generators = [multiprocessing.Process(target=load, args=(port, paths, cookie, seconds, results))
+                  for _ in range(clients)]
+    for generator in generators:
+        generator.start()
+    totals = [results.get() for _ in generators]
+    for generator in generators:
+        generator.join()
+    return sum(done for done, _ in totals) / seconds, sum(errors for _, errors in totals)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--workers', default='1,2,4', help="comma-separated worker counts")
+    parser.add_argument('--clients', type=int, default=8, help="load generator processes")
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--restaurants', type=int, default=50)
+    parser.add_argument('--items', type=int, default=20, help="menu items per restaurant")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    worker_counts = [int(count) for count in args.workers.split(',')]
+
+    with app.app_context():
+        seed(args.restaurants, args.items, random.Random(args.seed))
+    cookie = session_cookie()
+    routes = {
+        '/restaurants': ['/restaurants'],
+        '/menu': [f"/menu?restaurant_id={i}" for i in range(1, args.restaurants + 1)],
+    }
+
+    cpus = os.cpu_count()
+    print(f"{cpus} CPU(s), {args.clients} load generator processes, {args.seconds:g} s per run")
+    if cpus and cpus < max(worker_counts) + 1:
+        print(f"note: fewer CPUs than workers plus load generators, throughput cannot scale past {cpus} worker(s) here")
+
+    baseline = {}
+    print(f"{'route':<14}{'workers':>8}{'req/s':>10}{'speedup':>9}{'errors':>8}")
+    for workers in worker_counts:
+        port = free_port()
+        server = start_server(workers, port)
+        try:
+            for route, paths in routes.items():
+                # fill every worker's delivery index and menu cache before timing
+                measure(port, paths, cookie, args.clients, 1)
+                rate, errors = measure(port, paths, cookie, args.clients, args.seconds)
+                baseline.setdefault(route, rate)
+                print(f"{route:<14}{workers:>8}{rate:>10.0f}{rate / baseline[route]:>8.2f}x{errors:>8}")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,257 @@
+from collections import OrderedDict, namedtuple
+from threading import Lock
+from types import SimpleNamespace
+import pickle
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import db, Restaurant, MenuItem
+
+
+class LRUBackend:
+    """Bounded in-process cache with least-recently-used eviction and an optional TTL."""
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class LocalKVStore:
+    """In-process stand-in for a Redis client, implementing the subset of commands used here.
+
+    Values are stored as bytes like Redis does, so code written against it
+    behaves the same when a real ``redis.Redis`` client is plugged in.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._expiry = {}
+        self._lock = Lock()
+
+    def _expire(self, name):
+        expires_at = self._expiry.get(name)
+        if expires_at is not None and expires_at < time.monotonic():
+            self._data.pop(name, None)
+            self._expiry.pop(name, None)
+
+    def get(self, name):
+        with self._lock:
+            self._expire(name)
+            return self._data.get(name)
+
+    def set(self, name, value, ex=None):
+        if isinstance(value, str):
+            value = value.encode()
+        with self._lock:
+            self._data[name] = value
+            if ex:
+                self._expiry[name] = time.monotonic() + ex
+            else:
+                self._expiry.pop(name, None)
+        return True
+
+    def delete(self, *names):
+        with self._lock:
+            removed = 0
+            for name in names:
+                self._expiry.pop(name, None)
+                removed += self._data.pop(name, None) is not None
+            return removed
+
+    def dbsize(self):
+        with self._lock:
+            return len(self._data)
+
+    # hashes, stored as dicts of bytes -> bytes
+
+    def hincrby(self, name, key, amount=1):
+        key = key.encode() if isinstance(key, str) else key
+        with self._lock:
+            self._expire(name)
+            hash_ = self._data.setdefault(name, {})
+            value = int(hash_.get(key, 0)) + amount
+            hash_[key] = str(value).encode()
+            return value
+
+    def hset(self, name, key, value):
+        key = key.encode() if isinstance(key, str) else key
+        with self._lock:
+            self._expire(name)
+            hash_ = self._data.setdefault(name, {})
+            added = key not in hash_
+            hash_[key] = str(value).encode()
+            return int(added)
+
+    def hdel(self, name, *keys):
+        with self._lock:
+            hash_ = self._data.get(name, {})
+            removed = sum(hash_.pop(key.encode() if isinstance(key, str) else key, None) is not None for key in keys)
+            if not hash_:
+                self._data.pop(name, None)
+            return removed
+
+    def hgetall(self, name):
+        with self._lock:
+            self._expire(name)
+            return dict(self._data.get(name, {}))
+
+
+class KVBackend:
+    """Cache backend on top of a Redis-compatible client (``redis.Redis`` or LocalKVStore)."""
+
+    def __init__(self, client, prefix='lieferspatz:', ttl=None):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+        self.evictions = 0  # eviction is up to the server's maxmemory policy
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return pickle.loads(value) if value is not None else None
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=self.ttl)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+
+def make_kv_client(url):
+    """Redis-compatible client for ``local://`` (in this process) or ``redis://...`` URLs."""
+    if url.startswith('local://'):
+        return LocalKVStore()
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        import redis  # optional dependency, only needed for a shared store
+        return redis.Redis.from_url(url)
+    raise ValueError(f"Unsupported key-value store URL: {url}")
+
+
+def make_backend(url, maxsize=1024, ttl=None, prefix='lieferspatz:'):
+    """Build a cache backend from a URL: ``memory://`` (default), ``local://`` or ``redis://...``."""
+    if not url or url.startswith('memory://'):
+        return LRUBackend(maxsize=maxsize, ttl=ttl)
+    return KVBackend(make_kv_client(url), prefix=prefix, ttl=ttl)
+
+
+# a restaurant and its menu items as plain snapshots, safe to share between requests
+Menu = namedtuple('Menu', ['restaurant', 'items'])
+
+
+def _snapshot(obj):
+    return SimpleNamespace(**{attr.key: getattr(obj, attr.key) for attr in db.inspect(obj).mapper.column_attrs})
+
+
+class MenuCache:
+    """Per-restaurant menu cache, invalidated after commits that touch the restaurant or its items."""
+
+    def __init__(self, backend=None):
+        self.backend = backend or LRUBackend()
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+
+    @staticmethod
+    def _key(restaurant_id):
+        return f"menu:{restaurant_id}"
+
+    def get(self, restaurant_id):
+        """Return the cached Menu of ``restaurant_id``, loading it on a miss; None if it does not exist."""
+        menu = self.backend.get(self._key(restaurant_id))
+        with self._lock:
+            if menu is not None:
+                self.hits += 1
+                return menu
+            self.misses += 1
+
+        restaurant = db.session.get(Restaurant, restaurant_id)
+        if restaurant is None:
+            return None
+        items = MenuItem.query.filter_by(RestaurantID=restaurant_id).order_by(MenuItem.MenuItemID).all()
+        menu = Menu(_snapshot(restaurant), [_snapshot(item) for item in items])
+        self.backend.set(self._key(restaurant_id), menu)
+        return menu
+
+    def invalidate(self, restaurant_id):
+        self.backend.delete(self._key(restaurant_id))
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        stats = {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.backend.evictions,
+        }
+        if isinstance(self.backend, LRUBackend):
+            stats["size"] = len(self.backend)
+            stats["maxsize"] = self.backend.maxsize
+        return stats
+
+
+menu_cache = MenuCache()
+
+
+def configure_menu_cache(app):
+    menu_cache.backend = make_backend(
+        app.config['MENU_CACHE_URL'],
+        maxsize=app.config['MENU_CACHE_SIZE'],
+        ttl=app.config['MENU_CACHE_TTL'] or None
+    )
+
+
+def mark_menu_stale(session, *restaurant_ids):
+    """Invalidate these menus once ``session`` commits, for changes made with Core statements the ORM does not see."""
+    session.info.setdefault('stale_menus', set()).update(restaurant_ids)
+
+
+# collect the restaurants whose menu changed during a flush, invalidate them once committed
+@event.listens_for(Session, 'after_flush')
+def _track_menu_changes(session, flush_context):
+    changed = session.new | session.dirty | session.deleted
+    restaurant_ids = {obj.RestaurantID for obj in changed if isinstance(obj, (MenuItem, Restaurant))}
+    if restaurant_ids:
+        mark_menu_stale(session, *restaurant_ids)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    for restaurant_id in session.info.pop('stale_menus', ()):
+        menu_cache.invalidate(restaurant_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('stale_menus', None)
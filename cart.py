@@ -0,0 +1,180 @@
+from collections import namedtuple
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+from cache import make_kv_client
+from models import db, CartItem, MenuItem
+
+# one line of a cart as shown on the cart page and the cart API
+CartLine = namedtuple('CartLine', ['MenuItemID', 'RestaurantID', 'Name', 'Description', 'Price', 'Quantity'])
+
+# dialects with INSERT ... ON CONFLICT DO UPDATE, the others UPDATE and INSERT if there was no line
+_UPSERT_INSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+
+class UnknownMenuItem(LookupError):
+    pass
+
+
+class UnavailableMenuItem(Exception):
+    """The restaurant marked the menu item unavailable (IsAvailable false)."""
+
+
+class CartStore:
+    """Carts keyed by user and menu item, every change is one atomic statement.
+
+    Adding an item first looks it up, items the restaurant marked
+    unavailable are refused.
+
+    By default carts live in CartItems and each change is part of the
+    caller's transaction. With a key-value client (``configure_cart_store``)
+    carts are Redis hashes that cost no SQL write per click; they are copied
+    into CartItems only at checkout by ``materialize()``.
+    """
+
+    def __init__(self, kv=None, prefix='lieferspatz:cart:'):
+        self.kv = kv
+        self.prefix = prefix
+
+    def _key(self, user_id):
+        return f"{self.prefix}{user_id}"
+
+    def _upsert(self, user_id, menu_item_id, quantity, increment):
+        dialect = db.session.get_bind().dialect.name
+        if dialect not in _UPSERT_INSERTS:
+            return self._update_or_insert(user_id, menu_item_id, quantity, increment)
+        stmt = _UPSERT_INSERTS[dialect](CartItem).values(UserID=user_id, MenuItemID=menu_item_id, Quantity=quantity)
+        # relies on the unique (UserID, MenuItemID) index
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[CartItem.UserID, CartItem.MenuItemID],
+            set_={'Quantity': CartItem.Quantity + stmt.excluded.Quantity if increment else stmt.excluded.Quantity}
+        ).returning(CartItem.Quantity)
+        try:
+            with db.session.begin_nested():
+                return db.session.execute(stmt).scalar_one()
+        except IntegrityError as e:
+            raise UnknownMenuItem(menu_item_id) from e
+
+    def _update_line(self, user_id, menu_item_id, quantity, increment):
+        return db.session.execute(
+            update(CartItem).where(CartItem.UserID == user_id, CartItem.MenuItemID == menu_item_id)
+            .values(Quantity=CartItem.Quantity + quantity if increment else quantity)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+
+    def _update_or_insert(self, user_id, menu_item_id, quantity, increment):
+        # other dialects (MySQL, ...): UPDATE the line, INSERT it if there was none; a concurrent
+        # INSERT of the same line trips the unique index and the UPDATE is tried once more
+        if not self._update_line(user_id, menu_item_id, quantity, increment):
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(insert(CartItem).values(UserID=user_id, MenuItemID=menu_item_id, Quantity=quantity))
+            except IntegrityError as e:
+                # the foreign key to MenuItems, not a concurrent INSERT, if there is still no line
+                if not self._update_line(user_id, menu_item_id, quantity, increment):
+                    raise UnknownMenuItem(menu_item_id) from e
+        return self._quantity(user_id, menu_item_id)
+
+    def _quantity(self, user_id, menu_item_id):
+        return db.session.execute(
+            select(CartItem.Quantity).where(CartItem.UserID == user_id, CartItem.MenuItemID == menu_item_id)
+        ).scalar() or 0
+
+    def _check_menu_item(self, menu_item_id):
+        # a NULL IsAvailable (rows from before the column was used) counts as available; the SQL store
+        # also has a foreign key, for an item deleted after this check
+        row = db.session.execute(select(MenuItem.IsAvailable).where(MenuItem.MenuItemID == menu_item_id)).first()
+        if row is None:
+            raise UnknownMenuItem(menu_item_id)
+        if row.IsAvailable is False:
+            raise UnavailableMenuItem(menu_item_id)
+
+    def add(self, user_id, menu_item_id, amount=1):
+        """Add ``amount`` of a menu item to the cart, returns the new quantity."""
+        self._check_menu_item(menu_item_id)
+        if self.kv is None:
+            return self._upsert(user_id, menu_item_id, amount, increment=True)
+        return self.kv.hincrby(self._key(user_id), menu_item_id, amount)
+
+    def remove(self, user_id, menu_item_id, amount=1):
+        """Take ``amount`` of a menu item out of the cart, dropping the line at zero; returns the new quantity."""
+        if self.kv is not None:
+            quantity = self.kv.hincrby(self._key(user_id), menu_item_id, -amount)
+            if quantity <= 0:
+                self.kv.hdel(self._key(user_id), menu_item_id)
+            return max(quantity, 0)
+
+        line = (CartItem.UserID == user_id, CartItem.MenuItemID == menu_item_id)
+        if db.session.execute(delete(CartItem).where(*line, CartItem.Quantity <= amount)).rowcount:
+            return 0
+        stmt = (
+            update(CartItem).where(*line, CartItem.Quantity > amount)
+            .values(Quantity=CartItem.Quantity - amount).execution_options(synchronize_session=False)
+        )
+        if not db.session.get_bind().dialect.update_returning:
+            # MySQL has no UPDATE ... RETURNING, read the line back in the same transaction
+            db.session.execute(stmt)
+            return self._quantity(user_id, menu_item_id)
+        return db.session.execute(stmt.returning(CartItem.Quantity)).scalar() or 0
+
+    def set_quantity(self, user_id, menu_item_id, quantity):
+        """Set the quantity of a line, zero or less removes it; returns the new quantity."""
+        if quantity <= 0:
+            if self.kv is not None:
+                self.kv.hdel(self._key(user_id), menu_item_id)
+            else:
+                db.session.execute(delete(CartItem).where(CartItem.UserID == user_id, CartItem.MenuItemID == menu_item_id))
+            return 0
+        self._check_menu_item(menu_item_id)
+        if self.kv is None:
+            return self._upsert(user_id, menu_item_id, quantity, increment=False)
+        self.kv.hset(self._key(user_id), menu_item_id, quantity)
+        return quantity
+
+    def _quantities(self, user_id):
+        return {int(menu_item_id): int(quantity) for menu_item_id, quantity in self.kv.hgetall(self._key(user_id)).items()}
+
+    def lines(self, user_id):
+        """The cart as CartLines, lines of menu items that no longer exist are left out."""
+        columns = (MenuItem.MenuItemID, MenuItem.RestaurantID, MenuItem.Name, MenuItem.Description, MenuItem.Price)
+        if self.kv is None:
+            rows = db.session.execute(
+                select(*columns, CartItem.Quantity).join(MenuItem, CartItem.MenuItemID == MenuItem.MenuItemID)
+                .where(CartItem.UserID == user_id).order_by(CartItem.CartItemID)
+            )
+            return [CartLine(*row) for row in rows]
+
+        quantities = self._quantities(user_id)
+        if not quantities:
+            return []
+        rows = db.session.execute(select(*columns).where(MenuItem.MenuItemID.in_(quantities)).order_by(MenuItem.MenuItemID))
+        return [CartLine(*row, quantities[row.MenuItemID]) for row in rows]
+
+    def materialize(self, user_id):
+        """Copy a key-value cart into CartItems inside the current transaction, ahead of checkout."""
+        if self.kv is None:
+            return
+        quantities = self._quantities(user_id)
+        db.session.execute(delete(CartItem).where(CartItem.UserID == user_id))
+        if not quantities:
+            return
+        existing = db.session.execute(select(MenuItem.MenuItemID).where(MenuItem.MenuItemID.in_(quantities))).scalars()
+        db.session.execute(insert(CartItem), [
+            {"UserID": user_id, "MenuItemID": menu_item_id, "Quantity": quantities[menu_item_id]}
+            for menu_item_id in existing
+        ])
+
+    def checked_out(self, user_id):
+        """Forget a key-value cart once its order is committed (SQL carts are deleted by the checkout itself)."""
+        if self.kv is not None:
+            self.kv.delete(self._key(user_id))
+
+
+cart_store = CartStore()
+
+
+def configure_cart_store(app):
+    url = app.config['CART_STORE_URL']
+    cart_store.kv = make_kv_client(url) if url else None
@@ -0,0 +1,152 @@
+import os
+
+from sqlalchemy import event
+
+
+def env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value not in (None, '') else default
+
+
+def env_list(name, default=None):
+    value = os.environ.get(name)
+    return [item.strip() for item in value.split(',') if item.strip()] if value else default
+
+
+def env_bool(name, default):
+    value = os.environ.get(name)
+    return value.lower() in ('1', 'true', 'yes', 'on') if value not in (None, '') else default
+
+
+def sqlite_pragmas():
+    """PRAGMAs applied to every new SQLite connection, overridable from the environment."""
+    return {
+        # WAL lets readers run alongside the single writer instead of blocking on it
+        'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+        # NORMAL is durable across application crashes in WAL mode and avoids an fsync per commit
+        'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        # wait for a competing writer instead of failing with "database is locked"
+        'busy_timeout': env_int('SQLITE_BUSY_TIMEOUT_MS', 5000),
+        'mmap_size': env_int('SQLITE_MMAP_SIZE', 256 * 1024 * 1024),
+        # negative values are KiB, so this is a 64 MiB page cache per connection
+        'cache_size': env_int('SQLITE_CACHE_SIZE', -64000),
+        'temp_store': 'MEMORY',
+        'foreign_keys': os.environ.get('SQLITE_FOREIGN_KEYS', 'ON'),
+    }
+
+
+def is_sqlite_memory(database_uri):
+    return database_uri in ('sqlite://', 'sqlite:///:memory:') or 'mode=memory' in database_uri
+
+
+def engine_options(database_uri):
+    """SQLAlchemy engine options for ``database_uri``."""
+    if is_sqlite_memory(database_uri):
+        # Flask-SQLAlchemy uses a single shared connection for in-memory databases
+        return {}
+
+    options = {
+        'pool_size': env_int('DB_POOL_SIZE', 10),
+        'max_overflow': env_int('DB_MAX_OVERFLOW', 20),
+        'pool_timeout': env_int('DB_POOL_TIMEOUT', 30),
+    }
+    if database_uri.startswith('sqlite'):
+        # pooled connections are handed between threads, the busy timeout is set by PRAGMA as well
+        options['connect_args'] = {
+            'check_same_thread': False,
+            'timeout': env_int('SQLITE_BUSY_TIMEOUT_MS', 5000) / 1000,
+        }
+    else:
+        options['pool_pre_ping'] = True
+        options['pool_recycle'] = env_int('DB_POOL_RECYCLE', 1800)
+    return options
+
+
+def install_sqlite_pragmas(engine, pragmas):
+    """Run ``pragmas`` on every new DBAPI connection of a SQLite ``engine``."""
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+class Config:
+    # signs the session cookie, every worker process (and host) must share it; serve.py refuses to start without it
+    SECRET_KEY = os.environ.get('SECRET_KEY', 'your_secret_key')
+    # point DATABASE_URL at any SQLAlchemy URL; relative SQLite paths live in the instance folder
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///lieferspatz.db')
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+    SQLITE_PRAGMAS = sqlite_pragmas()
+    # how often the platform fee ledger is folded into Platform.Balance, 0 disables the background rollup
+    PLATFORM_FEE_ROLLUP_SECONDS = env_int('PLATFORM_FEE_ROLLUP_SECONDS', 60)
+    # memory:// keeps menus in an LRU per process, local:// or redis://host:port/db use a key-value store
+    MENU_CACHE_URL = os.environ.get('MENU_CACHE_URL', 'memory://')
+    MENU_CACHE_SIZE = env_int('MENU_CACHE_SIZE', 1024)
+    # seconds, 0 keeps entries until they are invalidated or evicted
+    MENU_CACHE_TTL = env_int('MENU_CACHE_TTL', 0)
+    # scrypt or pbkdf2_sha256; stored hashes with other settings (and legacy plaintext) are rehashed at login
+    PASSWORD_SCHEME = os.environ.get('PASSWORD_SCHEME', 'scrypt')
+    # scrypt cost: n * r * 128 bytes of memory, about 16 MiB and 50-100 ms of CPU by default
+    PASSWORD_SCRYPT_N = env_int('PASSWORD_SCRYPT_N', 2 ** 14)
+    PASSWORD_SCRYPT_R = env_int('PASSWORD_SCRYPT_R', 8)
+    PASSWORD_SCRYPT_P = env_int('PASSWORD_SCRYPT_P', 1)
+    PASSWORD_PBKDF2_ITERATIONS = env_int('PASSWORD_PBKDF2_ITERATIONS', 600000)
+    # thread, or process under eventlet/gevent where a hashing thread would block the event loop
+    PASSWORD_POOL = os.environ.get('PASSWORD_POOL') or (
+        'process' if os.environ.get('SERVER_ASYNC_MODE') in ('eventlet', 'gevent') else 'thread')
+    # hashes computed at once per process, 0 hashes on the request thread
+    PASSWORD_WORKERS = env_int('PASSWORD_WORKERS', min(os.cpu_count() or 1, 4))
+    # logins and sign-ups beyond this many waiting for the pool get a 503 instead of queueing
+    PASSWORD_MAX_PENDING = env_int('PASSWORD_MAX_PENDING', 32)
+    PASSWORD_TIMEOUT_SECONDS = env_int('PASSWORD_TIMEOUT_SECONDS', 10)
+    # rendered restaurant, menu item and order cards, same URL schemes as MENU_CACHE_URL; empty renders every time
+    FRAGMENT_CACHE_URL = os.environ.get('FRAGMENT_CACHE_URL', 'memory://')
+    FRAGMENT_CACHE_SIZE = env_int('FRAGMENT_CACHE_SIZE', 20000)
+    FRAGMENT_CACHE_TTL = env_int('FRAGMENT_CACHE_TTL', 0)
+    # statements at least this slow are logged with their route, 0 turns the log off
+    SLOW_QUERY_MS = env_int('SLOW_QUERY_MS', 100)
+    # how many of the slowest statements are kept per route on /metrics/requests
+    SLOWEST_STATEMENTS = env_int('SLOWEST_STATEMENTS', 5)
+    # Server-Timing response header, unset means only in debug mode
+    SERVER_TIMING = env_bool('SERVER_TIMING', None)
+    # logged-in users are cached for this many seconds between requests, changes made here invalidate at once
+    PRINCIPAL_CACHE_TTL = env_int('PRINCIPAL_CACHE_TTL', 30)
+    PRINCIPAL_CACHE_SIZE = env_int('PRINCIPAL_CACHE_SIZE', 4096)
+    # shared directory for the /metrics values of all worker processes, unset keeps them per process
+    METRICS_DIR = os.environ.get('METRICS_DIR')
+    METRICS_FLUSH_SECONDS = env_int('METRICS_FLUSH_SECONDS', 1)
+    # empty keeps carts in CartItems, local:// or redis://host:port/db hold them in a key-value store until checkout
+    CART_STORE_URL = os.environ.get('CART_STORE_URL', '')
+    # background job worker threads per web process, 0 leaves the queue to `flask run-jobs`
+    JOB_WORKERS = env_int('JOB_WORKERS', 1)
+    # seconds an idle worker waits before looking for due jobs again (enqueues in the same process wake it at once)
+    JOB_POLL_SECONDS = env_int('JOB_POLL_SECONDS', 1)
+    # a job still running after this many seconds is presumed dead and claimed again
+    JOB_LEASE_SECONDS = env_int('JOB_LEASE_SECONDS', 60)
+    # retries wait JOB_RETRY_SECONDS, then twice as long, and so on
+    JOB_RETRY_SECONDS = env_int('JOB_RETRY_SECONDS', 1)
+    JOB_MAX_ATTEMPTS = env_int('JOB_MAX_ATTEMPTS', 5)
+    # finished jobs (and their idempotency keys) are deleted by idle workers after this many days, 0 keeps them
+    JOB_RETENTION_DAYS = env_int('JOB_RETENTION_DAYS', 7)
+    # how often each process's workers look for finished jobs to delete
+    JOB_PRUNE_SECONDS = env_int('JOB_PRUNE_SECONDS', 300)
+    # Socket.IO rooms and emits across worker processes: local:///path.sock uses the hub of serve.py
+    # on one host, redis://host:port/db (or any Flask-SocketIO message queue URL) spans hosts
+    SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE')
+    # e.g. "websocket" -- long-polling keeps its Engine.IO session in one worker, so with several
+    # workers behind a load balancer either allow only websocket here or make the balancer route
+    # each client to the same worker (sticky sessions, e.g. nginx ip_hash or a cookie)
+    SOCKETIO_TRANSPORTS = env_list('SOCKETIO_TRANSPORTS')
+    # threading, eventlet or gevent; unset picks whichever is installed
+    SERVER_ASYNC_MODE = os.environ.get('SERVER_ASYNC_MODE') or None
+    # the load balancer in front of serve.py pins clients to a worker, so long-polling may stay enabled
+    STICKY_SESSIONS = env_bool('STICKY_SESSIONS', False)
+    # `flask build-assets` writes fingerprinted, precompressed copies of static/ here (relative to it); while
+    # its manifest exists they are what url_for('static', ...) links, empty serves static/ as it is
+    ASSETS_DIR = os.environ.get('ASSETS_DIR', 'dist')
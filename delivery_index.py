@@ -0,0 +1,143 @@
+from collections import defaultdict, namedtuple
+from threading import Lock
+import hashlib
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import db, Restaurant, DeliveryArea, OpeningHour
+from schedule import compile_schedule
+
+# immutable snapshot of a restaurant as shown on the /restaurants list; Version is a hash of the other
+# fields, the same in every process and across restarts, usable as a cache validator
+RestaurantSummary = namedtuple(
+    'RestaurantSummary',
+    ['RestaurantID', 'Name', 'Description', 'OpenTime', 'CloseTime', 'delivery_area_str', 'Version']
+)
+
+
+def _summary(*fields):
+    return RestaurantSummary(*fields, hashlib.sha1(repr(fields).encode()).hexdigest()[:16])
+
+
+class DeliveryIndex:
+    """In-process map of postal code -> restaurants delivering there.
+
+    The index is built with two queries and then served from memory until a
+    Restaurant or DeliveryArea row changes, so listing restaurants for a
+    postal code costs O(matching restaurants) and no SQL. ``max_age`` bounds
+    staleness for changes made by other processes.
+
+    Opening hours are compiled into a Schedule on every rebuild. The open
+    restaurants of a postal code are cached until the next time one of them
+    opens or closes. A rebuild that finds the same restaurants, areas and
+    hours keeps the previous index, schedule and cached listings.
+    """
+
+    def __init__(self, max_age=60):
+        self.max_age = max_age
+        self.generation = 0  # bumped when a rebuild finds changed data, valid in this process only
+        self._by_postal_code = {}
+        self._opening_hours = []
+        self.schedule = compile_schedule((), {})
+        self._open_listings = {}  # postal code -> (generation, valid from, valid until, summaries)
+        self._built_at = None
+        self._stale = True
+        self._lock = Lock()
+
+    def invalidate(self):
+        self._stale = True
+
+    def _needs_rebuild(self):
+        if self._stale or self._built_at is None:
+            return True
+        return self.max_age is not None and time.monotonic() - self._built_at > self.max_age
+
+    def rebuild(self):
+        # clear the flag first so an invalidation during the build is not lost
+        self._stale = False
+
+        areas_by_restaurant = defaultdict(list)
+        # in ID order, so delivery_area_str (and the Version) is the same in every process
+        for restaurant_id, postal_code in db.session.query(
+                DeliveryArea.RestaurantID, DeliveryArea.PostalCode).order_by(DeliveryArea.ID):
+            areas_by_restaurant[restaurant_id].append(str(postal_code))
+
+        by_postal_code = defaultdict(list)
+        rows = db.session.query(
+            Restaurant.RestaurantID, Restaurant.Name, Restaurant.Description,
+            Restaurant.OpenTime, Restaurant.CloseTime
+        ).order_by(Restaurant.RestaurantID).all()
+        for row in rows:
+            areas = areas_by_restaurant.get(row.RestaurantID, [])
+            summary = _summary(*row, ", ".join(areas))
+            for postal_code in set(areas):
+                by_postal_code[postal_code].append(summary)
+        by_postal_code = dict(by_postal_code)
+
+        opening_hours = sorted(tuple(hour) for hour in db.session.query(
+            OpeningHour.RestaurantID, OpeningHour.DayOfWeek, OpeningHour.OpenTime, OpeningHour.CloseTime
+        ))
+        # the max_age rebuild usually finds nothing changed, keep the cached listings then
+        if by_postal_code != self._by_postal_code or opening_hours != self._opening_hours:
+            self.schedule = compile_schedule(opening_hours, {row.RestaurantID: (row.OpenTime, row.CloseTime) for row in rows})
+            self._by_postal_code = by_postal_code
+            self._opening_hours = opening_hours
+            self._open_listings = {}
+            self.generation += 1
+        self._built_at = time.monotonic()
+
+    def restaurants_for(self, postal_code):
+        """Return every restaurant summary delivering to ``postal_code``."""
+        if self._needs_rebuild():
+            with self._lock:
+                if self._needs_rebuild():
+                    self.rebuild()
+        return self._by_postal_code.get(str(postal_code), [])
+
+    def open_listing(self, postal_code, now):
+        """Return the restaurants delivering to ``postal_code`` that are open at the datetime ``now``,
+        and the datetime until which that answer holds (None when it never changes)."""
+        summaries = self.restaurants_for(postal_code)
+        postal_code = str(postal_code)
+        cached = self._open_listings.get(postal_code)
+        if cached is not None:
+            generation, valid_from, valid_until, open_summaries = cached
+            if generation == self.generation and valid_from <= now and (valid_until is None or now < valid_until):
+                return open_summaries, valid_until
+
+        generation, schedule = self.generation, self.schedule
+        by_id = {summary.RestaurantID: summary for summary in summaries}
+        open_summaries = [by_id[restaurant_id] for restaurant_id in schedule.open_among(by_id, now)]
+        valid_until = schedule.next_change(by_id, now)
+        self._open_listings[postal_code] = (generation, now, valid_until, open_summaries)
+        return open_summaries, valid_until
+
+    def open_restaurants_for(self, postal_code, now):
+        """Return the restaurants delivering to ``postal_code`` that are open at the datetime ``now``."""
+        return self.open_listing(postal_code, now)[0]
+
+
+delivery_index = DeliveryIndex()
+
+_WATCHED_MODELS = (Restaurant, DeliveryArea, OpeningHour)
+
+
+# mark the session when a watched row is flushed, invalidate once it is committed
+@event.listens_for(Session, 'after_flush')
+def _track_delivery_changes(session, flush_context):
+    changed = session.new | session.dirty | session.deleted
+    if any(isinstance(obj, _WATCHED_MODELS) for obj in changed):
+        session.info['delivery_index_dirty'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    if session.info.pop('delivery_index_dirty', False):
+        delivery_index.invalidate()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('delivery_index_dirty', None)
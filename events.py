@@ -0,0 +1,52 @@
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from flask_socketio import SocketIO
+
+# shared Socket.IO instance, bound to the app with socketio.init_app() in app.py
+socketio = SocketIO()
+
+# event names emitted to the clients
+ORDER_CREATED = 'order_created'
+ORDER_STATUS_CHANGED = 'order_status_changed'
+
+
+def restaurant_room(restaurant_id):
+    return f"restaurant_{restaurant_id}"
+
+
+def customer_room(customer_id):
+    return f"customer_{customer_id}"
+
+
+def order_payload(order, previous_status=None):
+    payload = {
+        "order_id": order.OrderID,
+        "restaurant_id": order.RestaurantID,
+        "customer_id": order.CustomerID,
+        "status": order.Status,
+        "total_amount": str(order.TotalAmount),
+    }
+    if previous_status is not None:
+        payload["previous_status"] = previous_status
+    return payload
+
+
+def queue_order_event(session, name, order, previous_status=None):
+    """Queue an order event on ``session``; it is emitted only once the session commits.
+
+    The event goes to the restaurant's room and to the ordering customer's room.
+    """
+    payload = order_payload(order, previous_status)
+    rooms = [restaurant_room(order.RestaurantID), customer_room(order.CustomerID)]
+    session.info.setdefault('pending_events', []).append((name, payload, rooms))
+
+
+@event.listens_for(Session, 'after_commit')
+def _emit_after_commit(session):
+    for name, payload, rooms in session.info.pop('pending_events', []):
+        socketio.emit(name, payload, to=rooms)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('pending_events', None)
@@ -0,0 +1,84 @@
+"""Cached rendering of template fragments.
+
+    {% cache 'menu-item', item.MenuItemID, item.Version %} ...card markup... {% endcache %}
+
+The rendered markup is stored under the template, the tag's position in it
+and the given key parts. Key parts must identify everything the fragment
+shows: an entity ID plus a stamp that changes whenever the entity does
+(Order.Version is bumped by every status change, MenuItem.Version by every
+update, RestaurantSummary.Version is a hash of the summary). The stamp must
+be the same in every process and survive restarts, the backend may be
+shared. Nothing is deleted on change, the new stamp makes a new key and
+the old entry ages out of the LRU. Fragments must not depend on the
+session or the request.
+"""
+from threading import Lock
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from cache import make_backend
+
+
+class FragmentCache:
+    """Rendered fragments by key, in any cache backend; ``backend=None`` renders every time."""
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+
+    def render(self, key, render):
+        if self.backend is None:
+            return render()
+        html = self.backend.get(key)
+        with self._lock:
+            if html is not None:
+                self.hits += 1
+                return Markup(html)
+            self.misses += 1
+        html = render()
+        self.backend.set(key, str(html))
+        return Markup(html)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.backend is not None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "size": len(self.backend) if hasattr(self.backend, '__len__') else None,
+        }
+
+
+fragment_cache = FragmentCache()
+
+
+class FragmentCacheExtension(Extension):
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        # the same key parts in two places of a template are two fragments
+        prefix = nodes.Const(f"fragment:{parser.name}:{lineno}")
+        return nodes.CallBlock(self.call_method('_render', [prefix, nodes.List(parts)]), [], [], body).set_lineno(lineno)
+
+    def _render(self, prefix, parts, caller):
+        return fragment_cache.render(':'.join([prefix, *map(str, parts)]), caller)
+
+
+def configure_fragment_cache(app):
+    url = app.config['FRAGMENT_CACHE_URL']
+    fragment_cache.backend = make_backend(
+        url,
+        maxsize=app.config['FRAGMENT_CACHE_SIZE'],
+        ttl=app.config['FRAGMENT_CACHE_TTL'] or None,
+    ) if url else None
+    app.jinja_env.add_extension(FragmentCacheExtension)
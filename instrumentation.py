@@ -0,0 +1,172 @@
+from collections import defaultdict
+from threading import Lock
+import heapq
+import re
+import time
+
+from flask import g, has_request_context, request, before_render_template, template_rendered
+from sqlalchemy import event
+
+# upper bounds in milliseconds, the last bucket catches everything slower
+TIME_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float('inf'))
+# upper bounds of statements per request
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, float('inf'))
+
+
+class Histogram:
+    """Cumulative-bucket histogram with count and sum, not thread-safe on its own."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def to_dict(self):
+        cumulative, buckets = 0, []
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            buckets.append(['+Inf' if bound == float('inf') else bound, cumulative])
+        return {"count": self.count, "sum": round(self.sum, 3), "buckets": buckets}
+
+
+class RouteStats:
+    def __init__(self, slowest):
+        self.sql_count = Histogram(COUNT_BUCKETS)
+        self.db_ms = Histogram(TIME_BUCKETS_MS)
+        self.render_ms = Histogram(TIME_BUCKETS_MS)
+        self.total_ms = Histogram(TIME_BUCKETS_MS)
+        self.slowest = []  # min-heap of (duration_ms, statement), keeps the ``slowest`` worst
+        self.max_slowest = slowest
+
+    def add_statement(self, duration_ms, statement):
+        entry = (duration_ms, statement)
+        if len(self.slowest) < self.max_slowest:
+            heapq.heappush(self.slowest, entry)
+        elif entry > self.slowest[0]:
+            heapq.heapreplace(self.slowest, entry)
+
+
+class RequestStats:
+    """Per-route aggregates of SQL statement count, DB time, render time and total time."""
+
+    def __init__(self, slowest=5):
+        self.slowest = slowest
+        self._routes = defaultdict(lambda: RouteStats(self.slowest))
+        self._lock = Lock()
+
+    def record(self, route, sql_count, db_ms, render_ms, total_ms, statements):
+        with self._lock:
+            stats = self._routes[route]
+            stats.sql_count.observe(sql_count)
+            stats.db_ms.observe(db_ms)
+            stats.render_ms.observe(render_ms)
+            stats.total_ms.observe(total_ms)
+            for duration_ms, statement in statements:
+                stats.add_statement(duration_ms, statement)
+
+    def routes(self):
+        with self._lock:
+            return {
+                route: {
+                    "sql_count": stats.sql_count.to_dict(),
+                    "db_ms": stats.db_ms.to_dict(),
+                    "render_ms": stats.render_ms.to_dict(),
+                    "total_ms": stats.total_ms.to_dict(),
+                    "slowest_statements": [
+                        {"ms": round(duration_ms, 3), "sql": statement}
+                        for duration_ms, statement in sorted(stats.slowest, reverse=True)
+                    ],
+                }
+                for route, stats in sorted(self._routes.items())
+            }
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+
+request_stats = RequestStats()
+
+
+def _route_name():
+    rule = request.url_rule.rule if request.url_rule else '<unmatched>'
+    return f"{request.method} {rule}"
+
+
+def _one_line(statement, limit=300):
+    statement = re.sub(r'\s+', ' ', statement).strip()
+    return statement if len(statement) <= limit else statement[:limit] + '...'
+
+
+def init_instrumentation(app, engine):
+    """Count SQL statements, DB time and template render time of every request.
+
+    Aggregates are kept per route in ``request_stats``. With SERVER_TIMING on
+    (the default in debug mode) each response carries a Server-Timing header.
+    Statements slower than SLOW_QUERY_MS are logged with their route.
+    """
+    slow_query_ms = app.config['SLOW_QUERY_MS']
+    request_stats.slowest = app.config['SLOWEST_STATEMENTS']
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        duration_ms = (time.perf_counter() - conn.info['query_started'].pop()) * 1000
+        in_request = has_request_context() and 'sql_count' in g
+        if in_request:
+            g.sql_count += 1
+            g.db_ms += duration_ms
+            g.statements.append((duration_ms, statement))
+        if slow_query_ms and duration_ms >= slow_query_ms:
+            route = _route_name() if in_request else '<no request>'
+            app.logger.warning("slow query (%.1f ms) in %s: %s", duration_ms, route, _one_line(statement))
+
+    @app.before_request
+    def _start_request_timer():
+        g.request_started = time.perf_counter()
+        g.sql_count = 0
+        g.db_ms = 0.0
+        g.render_ms = 0.0
+        g.statements = []
+
+    def _before_render(sender, template, context, **extra):
+        if 'render_ms' in g:
+            g.render_started = time.perf_counter()
+
+    def _after_render(sender, template, context, **extra):
+        if 'render_started' in g:
+            g.render_ms += (time.perf_counter() - g.pop('render_started')) * 1000
+
+    # strong references, the receivers are local functions
+    before_render_template.connect(_before_render, app, weak=False)
+    template_rendered.connect(_after_render, app, weak=False)
+
+    @app.after_request
+    def _record_request(response):
+        if 'request_started' not in g:
+            return response
+        total_ms = (time.perf_counter() - g.request_started) * 1000
+        # only the slowest few statements of a request can make it into the per-route list
+        statements = heapq.nlargest(request_stats.slowest, g.statements)
+        request_stats.record(_route_name(), g.sql_count, g.db_ms, g.render_ms, total_ms,
+                             [(duration_ms, _one_line(statement)) for duration_ms, statement in statements])
+
+        server_timing = app.config['SERVER_TIMING']
+        if server_timing or (server_timing is None and app.debug):
+            response.headers['Server-Timing'] = (
+                f'db;dur={g.db_ms:.2f};desc="{g.sql_count} queries", '
+                f'render;dur={g.render_ms:.2f}, total;dur={total_ms:.2f}'
+            )
+        return response
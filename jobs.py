@@ -0,0 +1,342 @@
+from datetime import datetime, timedelta, timezone
+from threading import Event, Lock, Thread
+import json
+import os
+import time
+
+from flask import current_app, has_app_context
+from sqlalchemy import and_, delete, event, func, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from metrics import registry
+from models import db, Job
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+_handlers = {}
+
+
+class PermanentJobError(Exception):
+    """Raised by a handler for a job that can never succeed, it fails without further attempts."""
+
+
+def job_handler(kind):
+    """Register the function that runs jobs of ``kind``, called with the job's payload as keyword arguments.
+
+    Handlers work in the worker's session and do not commit: their changes
+    commit together with the job being marked done, or not at all.
+    """
+    def decorator(fn):
+        _handlers[kind] = fn
+        return fn
+    return decorator
+
+
+def on_commit(fn, *args):
+    """Call ``fn(*args)`` once the running job has committed (e.g. metrics), skipped if it fails."""
+    db.session.info.setdefault('job_callbacks', []).append((fn, args))
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def enqueue(kind, payload, idempotency_key=None, delay=0):
+    """Add a job to the caller's transaction, it becomes visible to workers when that commits.
+
+    A job whose ``idempotency_key`` was used before is not added again.
+    Returns ``(JobID, created)``.
+    """
+    if idempotency_key is not None:
+        existing = db.session.execute(select(Job.JobID).where(Job.IdempotencyKey == idempotency_key)).scalar()
+        if existing is not None:
+            return existing, False
+
+    job = Job(Kind=kind, Payload=json.dumps(payload), IdempotencyKey=idempotency_key, Status=QUEUED,
+              Attempts=0, MaxAttempts=job_queue.max_attempts, RunAt=_utcnow() + timedelta(seconds=delay))
+    try:
+        with db.session.begin_nested():
+            db.session.add(job)
+    except IntegrityError:
+        # enqueued by a concurrent request in the meantime
+        return db.session.execute(select(Job.JobID).where(Job.IdempotencyKey == idempotency_key)).scalar_one(), False
+    db.session.info.setdefault('enqueued_jobs', []).append(kind)
+    return job.JobID, True
+
+
+class JobQueue:
+    """Durable job queue on the Jobs table, worked by threads in each process that calls ``start()``.
+
+    A worker claims the oldest due job with one conditional UPDATE and holds
+    a lease of ``lease_seconds`` on it; jobs of a worker that died are
+    claimed again once the lease ran out. Failed jobs are retried with
+    exponential backoff until ``max_attempts``. Idle workers delete jobs
+    that finished more than ``retention`` ago, at most every
+    ``prune_seconds`` per process.
+    """
+
+    def __init__(self, workers=1, poll_seconds=1.0, lease_seconds=60, retry_seconds=1.0, max_attempts=5,
+                 retention=timedelta(days=7), prune_seconds=300):
+        self.workers = workers
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self.retry_seconds = retry_seconds
+        self.max_attempts = max_attempts
+        self.retention = retention
+        self.prune_seconds = prune_seconds
+        self._pruned_at = None
+        self._wakeup = Event()
+        self._stopping = Event()
+        self._lock = Lock()
+        self._threads = []
+        self._pid = None
+
+    def notify(self):
+        self._wakeup.set()
+
+    def start(self, app, workers=None):
+        """Start the worker threads of this process, once (and again in a forked child)."""
+        workers = self.workers if workers is None else workers
+        if self._pid == os.getpid() or workers <= 0:
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stopping.clear()
+            self._threads = [
+                Thread(target=self._work, args=(app,), name=f"job-worker-{i}", daemon=True)
+                for i in range(workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self._pid = None
+
+    def _work(self, app):
+        while not self._stopping.is_set():
+            with app.app_context():
+                try:
+                    ran = self.run_once()
+                    if not ran:
+                        self._maybe_prune()
+                except Exception:
+                    db.session.rollback()
+                    app.logger.exception("job worker failed to claim a job")
+                    ran = False
+            if not ran:
+                self._wakeup.wait(self.poll_seconds)
+                self._wakeup.clear()
+
+    def _claim(self):
+        now = _utcnow()
+        queued_due = and_(Job.Status == QUEUED, Job.RunAt <= now)
+        lease_expired = and_(Job.Status == RUNNING, Job.LockedUntil < now)
+        due = or_(queued_due, lease_expired)
+        # a job of a dead worker first, then the oldest queued one; each subquery reads ix_Jobs_Status_RunAt
+        # in order and stops at the first row, instead of sorting every due job on each claim
+        oldest_due = func.coalesce(
+            select(Job.JobID).where(lease_expired).limit(1).scalar_subquery(),
+            select(Job.JobID).where(queued_due).order_by(Job.RunAt, Job.JobID).limit(1).scalar_subquery(),
+        )
+        claim = dict(Status=RUNNING, Attempts=Job.Attempts + 1, LockedUntil=now + timedelta(seconds=self.lease_seconds))
+        columns = (Job.JobID, Job.Kind, Job.Payload, Job.Attempts, Job.MaxAttempts, Job.RunAt)
+        if db.session.get_bind().dialect.update_returning:
+            # the condition is repeated so a job claimed concurrently is not claimed twice
+            row = db.session.execute(
+                update(Job).where(Job.JobID == oldest_due, due).values(**claim).returning(*columns)
+                .execution_options(synchronize_session=False)
+            ).first()
+        else:
+            row = self._claim_selected(oldest_due, due, claim, columns)
+        db.session.commit()
+        if row is not None:
+            JOB_LAG_SECONDS.observe(max((now - row.RunAt).total_seconds(), 0), kind=row.Kind)
+        return row
+
+    def _claim_selected(self, oldest_due, due, claim, columns):
+        # MySQL has no UPDATE ... RETURNING (nor a subquery on the updated table): pick the job, claim it
+        # with an UPDATE guarded by what was read, and read it back; a job another worker claimed in
+        # between changed its Attempts and LockedUntil, then the next one is tried
+        while True:
+            candidate = db.session.execute(
+                select(Job.JobID, Job.Attempts, Job.LockedUntil).where(Job.JobID == oldest_due)
+            ).first()
+            if candidate is None:
+                return None
+            claimed = db.session.execute(
+                update(Job).where(Job.JobID == candidate.JobID, Job.Attempts == candidate.Attempts,
+                                  Job.LockedUntil.is_not_distinct_from(candidate.LockedUntil), due)
+                .values(**claim).execution_options(synchronize_session=False)
+            ).rowcount
+            if claimed:
+                return db.session.execute(select(*columns).where(Job.JobID == candidate.JobID)).first()
+
+    def _finish(self, job, **values):
+        # only while the lease is ours, a worker that lost it must not overwrite the new attempt
+        return db.session.execute(
+            update(Job).where(Job.JobID == job.JobID, Job.Status == RUNNING, Job.Attempts == job.Attempts)
+            .values(LockedUntil=None, **values)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+
+    def run_once(self):
+        """Claim and run one due job, returns False when there was none."""
+        job = self._claim()
+        if job is None:
+            return False
+
+        started = time.perf_counter()
+        try:
+            handler = _handlers.get(job.Kind)
+            if handler is None:
+                raise PermanentJobError(f"No handler for job kind {job.Kind!r}")
+            handler(**json.loads(job.Payload))
+            if self._finish(job, Status=DONE, FinishedAt=_utcnow(), LastError=None):
+                db.session.commit()
+                outcome = DONE
+            else:
+                db.session.rollback()
+                outcome = 'lease_lost'
+        except Exception as e:
+            db.session.rollback()
+            db.session.info.pop('job_callbacks', None)
+            if isinstance(e, PermanentJobError) or job.Attempts >= job.MaxAttempts:
+                outcome = FAILED
+                self._finish(job, Status=FAILED, FinishedAt=_utcnow(), LastError=repr(e))
+            else:
+                outcome = 'retry'
+                backoff = self.retry_seconds * 2 ** (job.Attempts - 1)
+                self._finish(job, Status=QUEUED, RunAt=_utcnow() + timedelta(seconds=backoff), LastError=repr(e))
+            db.session.commit()
+            current_app.logger.warning("job %s (%s) attempt %s failed (%s): %r", job.JobID, job.Kind, job.Attempts, outcome, e)
+
+        for fn, args in db.session.info.pop('job_callbacks', []):
+            if outcome == DONE:
+                fn(*args)
+        JOB_RUN_SECONDS.observe(time.perf_counter() - started, kind=job.Kind)
+        JOBS_PROCESSED.inc(kind=job.Kind, outcome=outcome)
+        return True
+
+    def run(self, app, workers=None):
+        """Work the queue in the foreground until interrupted (``flask run-jobs``)."""
+        self.start(app, workers)
+        try:
+            while any(thread.is_alive() for thread in self._threads):
+                time.sleep(1)
+        except KeyboardInterrupt:
+            self.stop()
+
+    def stats(self):
+        # finished jobs pile up until they are pruned, only the unfinished part of ix_Jobs_Status_RunAt is counted
+        depth = dict(db.session.execute(
+            select(Job.Status, func.count()).where(Job.Status.in_((QUEUED, RUNNING))).group_by(Job.Status)
+        ).all())
+        oldest = db.session.execute(
+            select(func.min(Job.RunAt)).where(Job.Status == QUEUED, Job.RunAt <= _utcnow())
+        ).scalar()
+        return {
+            "depth": {status: depth.get(status, 0) for status in (QUEUED, RUNNING)},
+            "lag_seconds": round((_utcnow() - oldest).total_seconds(), 3) if oldest else 0,
+            "workers": len(self._threads),
+        }
+
+    def prune(self, older_than, batch_size=1000):
+        """Delete finished jobs (and so their idempotency keys) that finished before ``older_than`` ago.
+
+        Deletes and commits ``batch_size`` jobs at a time, so a large backlog
+        does not hold the write lock for long.
+        """
+        cutoff = _utcnow() - older_than
+        deleted = 0
+        while True:
+            batch = select(Job.JobID).where(Job.Status.in_((DONE, FAILED)), Job.FinishedAt < cutoff).limit(batch_size)
+            count = db.session.execute(delete(Job).where(Job.JobID.in_(batch))).rowcount
+            db.session.commit()
+            deleted += count
+            if count < batch_size:
+                return deleted
+
+    def _maybe_prune(self):
+        if not self.retention or not self.prune_seconds:
+            return
+        with self._lock:
+            if self._pruned_at is not None and time.monotonic() - self._pruned_at < self.prune_seconds:
+                return
+            self._pruned_at = time.monotonic()
+        self.prune(self.retention)
+
+
+job_queue = JobQueue()
+
+
+def init_jobs(app):
+    """Configure the queue from JOB_* settings and start this process's workers with its first request."""
+    job_queue.workers = app.config['JOB_WORKERS']
+    job_queue.poll_seconds = app.config['JOB_POLL_SECONDS']
+    job_queue.lease_seconds = app.config['JOB_LEASE_SECONDS']
+    job_queue.retry_seconds = app.config['JOB_RETRY_SECONDS']
+    job_queue.max_attempts = app.config['JOB_MAX_ATTEMPTS']
+    job_queue.retention = timedelta(days=app.config['JOB_RETENTION_DAYS'])
+    job_queue.prune_seconds = app.config['JOB_PRUNE_SECONDS']
+
+    @app.before_request
+    def _start_job_workers():
+        # started lazily so each forked server process gets its own threads
+        if job_queue._pid != os.getpid():
+            job_queue.start(app)
+
+
+_scraped = (0.0, None)
+
+
+def _scrape_stats():
+    # the depth and lag gauges are collected one after the other, one stats() serves both
+    global _scraped
+    scraped_at, stats = _scraped
+    if stats is None or time.monotonic() - scraped_at > 1.0:
+        stats = job_queue.stats()
+        _scraped = (time.monotonic(), stats)
+    return stats
+
+
+def _queue_depth():
+    if not has_app_context():
+        return {}
+    return {(('status', status),): count for status, count in _scrape_stats()["depth"].items()}
+
+
+def _queue_lag():
+    return _scrape_stats()["lag_seconds"] if has_app_context() else 0
+
+
+JOBS_ENQUEUED = registry.counter('lieferspatz_jobs_enqueued_total', "Background jobs enqueued, by kind.")
+JOBS_PROCESSED = registry.counter('lieferspatz_jobs_processed_total', "Background job attempts, by kind and outcome.")
+JOB_RUN_SECONDS = registry.histogram('lieferspatz_job_duration_seconds', "Time spent running a background job.")
+JOB_LAG_SECONDS = registry.histogram('lieferspatz_job_lag_seconds', "Time from a job being due to a worker claiming it.")
+registry.gauge('lieferspatz_job_queue_depth', "Unfinished background jobs, by status (queued, running).",
+               function=_queue_depth, shared=True)
+registry.gauge('lieferspatz_job_queue_lag_seconds', "How long the oldest due job has been waiting.",
+               function=_queue_lag, shared=True)
+
+
+# wake the workers of this process once enqueued jobs are committed
+@event.listens_for(Session, 'after_commit')
+def _notify_after_commit(session):
+    kinds = session.info.pop('enqueued_jobs', None)
+    if kinds:
+        for kind in kinds:
+            JOBS_ENQUEUED.inc(kind=kind)
+        job_queue.notify()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('enqueued_jobs', None)
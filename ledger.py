@@ -0,0 +1,109 @@
+from decimal import Decimal
+
+from sqlalchemy import func, insert, select, update
+
+from models import db, Order, Platform, PlatformFee, Restaurant
+
+
+def record_platform_fee(order_id, amount):
+    """Append the platform fee of an order to the ledger (part of the caller's transaction)."""
+    db.session.execute(insert(PlatformFee).values(OrderID=order_id, Amount=amount))
+
+
+def _platform_row():
+    return db.session.query(Platform).order_by(Platform.PlatformID).first()
+
+
+def platform_balance():
+    """Rolled-up platform balance plus every ledger entry not yet folded into it."""
+    platform = _platform_row()
+    rolled_up = Decimal(platform.Balance or 0) if platform else Decimal(0)
+    watermark = platform.RolledUpFeeID if platform else 0
+
+    pending = db.session.execute(
+        select(func.coalesce(func.sum(PlatformFee.Amount), 0)).where(PlatformFee.FeeID > watermark)
+    ).scalar()
+    return (rolled_up + Decimal(pending)).quantize(Decimal('0.01'))
+
+
+def rollup_platform_fees():
+    """Fold new ledger entries into Platform.Balance and advance the watermark.
+
+    The rollup is the only writer of the Platform row, so checkouts never
+    contend on it. Returns the amount that was folded in.
+    """
+    platform = _platform_row()
+    if platform is None:
+        platform = Platform(Balance=0, RolledUpFeeID=0)
+        db.session.add(platform)
+        db.session.flush()
+
+    watermark = platform.RolledUpFeeID
+    high_watermark, amount = db.session.execute(
+        select(func.max(PlatformFee.FeeID), func.coalesce(func.sum(PlatformFee.Amount), 0))
+        .where(PlatformFee.FeeID > watermark)
+    ).one()
+    if high_watermark is None:
+        db.session.commit()
+        return Decimal(0)
+
+    # guarded by the old watermark so two concurrent rollups cannot fold the same range twice
+    updated = db.session.execute(
+        update(Platform)
+        .where(Platform.PlatformID == platform.PlatformID, Platform.RolledUpFeeID == watermark)
+        .values(Balance=Platform.Balance + amount, RolledUpFeeID=high_watermark)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return Decimal(amount) if updated else Decimal(0)
+
+
+def apply_restaurant_balance(order, previous_status, new_status):
+    """Keep Restaurant.Balance equal to the sum of its completed orders across a status change.
+
+    Runs as a single in-place UPDATE inside the caller's transaction, so the
+    balance commits together with the new order status.
+    """
+    was_completed = previous_status == 'Completed'
+    is_completed = new_status == 'Completed'
+    if was_completed == is_completed:
+        return
+
+    amount = order.RestaurantAmount if is_completed else -order.RestaurantAmount
+    db.session.execute(
+        update(Restaurant)
+        .where(Restaurant.RestaurantID == order.RestaurantID)
+        .values(Balance=Restaurant.Balance + amount)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def reconcile_restaurant_balances(fix=False):
+    """Compare every running Restaurant.Balance against the full sum of its completed orders.
+
+    Returns ``(restaurant_id, running_balance, expected_balance)`` for each
+    mismatch; with ``fix=True`` the running balances are reset to the expected value.
+    """
+    completed = (
+        select(Order.RestaurantID, func.sum(Order.RestaurantAmount).label('total'))
+        .where(Order.Status == 'Completed')
+        .group_by(Order.RestaurantID)
+        .subquery()
+    )
+    # compare in cents, SQLite keeps Numeric columns as floating point
+    expected = func.round(func.coalesce(completed.c.total, 0), 2)
+    mismatches = [
+        (restaurant_id, Decimal(str(balance or 0)), Decimal(str(total)).quantize(Decimal('0.01')))
+        for restaurant_id, balance, total in db.session.execute(
+            select(Restaurant.RestaurantID, Restaurant.Balance, expected)
+            .outerjoin(completed, completed.c.RestaurantID == Restaurant.RestaurantID)
+            .where(func.round(func.coalesce(Restaurant.Balance, 0), 2) != expected)
+        )
+    ]
+
+    if fix and mismatches:
+        db.session.execute(update(Restaurant), [
+            {"RestaurantID": restaurant_id, "Balance": total} for restaurant_id, _, total in mismatches
+        ])
+        db.session.commit()
+    return mismatches
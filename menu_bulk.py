@@ -0,0 +1,250 @@
+"""Bulk menu import, export and batch edits for one restaurant.
+
+Every write is a fixed number of statements, however many items it touches:
+one SELECT to check which IDs belong to the restaurant, one executemany
+UPDATE for the changed items, one executemany INSERT for the new ones and
+one DELETE ... WHERE MenuItemID IN (...) for removals, each scoped to the
+restaurant. IN lists longer than CHUNK_SIZE are split so the bound
+parameters stay under SQLite's limit. Nothing here commits, the caller
+commits or rolls back the whole batch at once.
+"""
+from decimal import Decimal, InvalidOperation
+import csv
+import io
+import json
+
+from sqlalchemy import bindparam, delete, insert, select, update
+
+from cache import mark_menu_stale
+from models import db, MenuItem, CartItem
+
+FIELDS = ['MenuItemID', 'Name', 'Description', 'Price', 'Category', 'ImageURL', 'IsAvailable']
+EDITABLE = ['Name', 'Description', 'Price', 'Category', 'ImageURL', 'IsAvailable']
+CHUNK_SIZE = 500
+TRUE, FALSE = {'1', 'true', 'yes', 'y'}, {'0', 'false', 'no', 'n'}
+
+
+class MenuImportError(ValueError):
+    """An uploaded row is invalid; ``row`` is its 1-based position in the upload."""
+
+    def __init__(self, row, message):
+        super().__init__(f"Row {row}: {message}" if row else message)
+        self.row = row
+
+
+def _chunks(values):
+    values = list(values)
+    for start in range(0, len(values), CHUNK_SIZE):
+        yield values[start:start + CHUNK_SIZE]
+
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in TRUE:
+        return True
+    if text in FALSE:
+        return False
+    raise ValueError(f"IsAvailable must be true or false, not {value!r}")
+
+
+def _parse_price(value):
+    try:
+        price = Decimal(str(value).strip()).quantize(Decimal('0.01'))
+    except (InvalidOperation, ValueError):
+        raise ValueError(f"Price must be a number, not {value!r}") from None
+    if not price.is_finite() or price < 0:
+        raise ValueError("Price must not be negative")
+    return price
+
+
+def _clean(row, number, partial=False):
+    """Validate one uploaded row into column values; ``partial`` rows may leave out columns."""
+    item = {}
+    try:
+        item_id = row.get('MenuItemID')
+        if item_id not in (None, ''):
+            item['MenuItemID'] = int(item_id)
+        for field in EDITABLE:
+            value = row.get(field)
+            if isinstance(value, str):
+                value = value.strip()
+            if value in (None, ''):
+                if field == 'Name' and not partial:
+                    raise ValueError("Name is required")
+                continue
+            if field == 'Price':
+                value = _parse_price(value)
+            elif field == 'IsAvailable':
+                value = _parse_bool(value)
+            elif field == 'Name' and len(value) > 100:
+                raise ValueError("Name is longer than 100 characters")
+            item[field] = value
+    except (TypeError, ValueError) as e:
+        raise MenuImportError(number, str(e)) from None
+    if not partial:
+        if 'Price' not in item:
+            raise MenuImportError(number, "Price is required")
+        # every new row gets every column, a multi-row INSERT needs the same keys in each row
+        item.setdefault('Description', '')
+        item.setdefault('Category', 'Uncategorized')
+        item.setdefault('ImageURL', None)
+        item.setdefault('IsAvailable', True)
+    return item
+
+
+def parse_csv(stream):
+    """Rows of a CSV upload with a header line naming the columns (see FIELDS)."""
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    unknown = set(reader.fieldnames or []) - set(FIELDS)
+    if not reader.fieldnames or 'Name' not in reader.fieldnames:
+        raise MenuImportError(None, "The CSV header must name the columns, at least Name and Price")
+    if unknown:
+        raise MenuImportError(None, f"Unknown column(s): {', '.join(sorted(unknown))}")
+    return list(reader)
+
+
+def parse_json(data):
+    """Rows of a JSON upload, a list of items or ``{"items": [...]}``."""
+    items = data.get('items') if isinstance(data, dict) else data
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        raise MenuImportError(None, "Expected a list of items or {\"items\": [...]}")
+    return items
+
+
+def _owned_ids(restaurant_id, item_ids):
+    owned = set()
+    for chunk in _chunks(item_ids):
+        owned.update(db.session.execute(
+            select(MenuItem.MenuItemID).where(MenuItem.RestaurantID == restaurant_id, MenuItem.MenuItemID.in_(chunk))
+        ).scalars())
+    return owned
+
+
+def _update_by_id(restaurant_id, items):
+    """One executemany UPDATE per set of changed columns, usually just one, compiled once and cached."""
+    table = MenuItem.__table__
+    by_columns = {}
+    for item in items:
+        columns = tuple(field for field in EDITABLE if field in item)
+        if columns:
+            by_columns.setdefault(columns, []).append(item)
+    updated = 0
+    for columns, group in by_columns.items():
+        statement = (
+            update(table)
+            .where(table.c.RestaurantID == restaurant_id, table.c.MenuItemID == bindparam('_id'))
+            .values({field: bindparam(f'_{field}') for field in columns})
+        )
+        updated += db.session.execute(statement, [
+            {'_id': item['MenuItemID'], **{f'_{field}': item[field] for field in columns}} for item in group
+        ]).rowcount
+    return updated
+
+
+def _check_ownership(restaurant_id, items):
+    ids = [item['MenuItemID'] for item in items]
+    owned = _owned_ids(restaurant_id, ids)
+    for number, item in enumerate(items, start=1):
+        if item['MenuItemID'] not in owned:
+            raise MenuImportError(item.get('_row', number), f"Menu item {item['MenuItemID']} not found")
+    if len(set(ids)) != len(ids):
+        raise MenuImportError(None, "A menu item appears more than once")
+
+
+def import_menu(restaurant_id, rows, replace=False):
+    """Insert rows without a MenuItemID, update those with one; ``replace`` deletes every item not in ``rows``.
+
+    Returns ``{"created": n, "updated": n, "deleted": n}``. Raises
+    MenuImportError before writing anything if a row is invalid.
+    """
+    items = []
+    for number, row in enumerate(rows, start=1):
+        item = _clean(row, number)
+        item['_row'] = number
+        items.append(item)
+    existing = [item for item in items if 'MenuItemID' in item]
+    new = [item for item in items if 'MenuItemID' not in item]
+    _check_ownership(restaurant_id, existing)
+    for item in items:
+        del item['_row']
+
+    deleted = 0
+    if replace:
+        # the stale IDs are worked out here, a NOT IN of the whole upload would bind one parameter per row
+        keep = {item['MenuItemID'] for item in existing}
+        current = db.session.execute(select(MenuItem.MenuItemID).where(MenuItem.RestaurantID == restaurant_id)).scalars()
+        deleted = delete_items(restaurant_id, [item_id for item_id in current if item_id not in keep])
+
+    updated = _update_by_id(restaurant_id, existing)
+    if new:
+        db.session.execute(insert(MenuItem), [dict(item, RestaurantID=restaurant_id) for item in new])
+    mark_menu_stale(db.session, restaurant_id)
+    return {"created": len(new), "updated": updated, "deleted": deleted}
+
+
+def batch_update(restaurant_id, changes):
+    """Apply partial edits (price, availability, ...) to existing items, each change needs a MenuItemID."""
+    items = []
+    for number, change in enumerate(changes, start=1):
+        item = _clean(change, number, partial=True)
+        if 'MenuItemID' not in item:
+            raise MenuImportError(number, "MenuItemID is required")
+        item['_row'] = number
+        items.append(item)
+    _check_ownership(restaurant_id, items)
+    for item in items:
+        del item['_row']
+    updated = _update_by_id(restaurant_id, items)
+    mark_menu_stale(db.session, restaurant_id)
+    return updated
+
+
+def delete_items(restaurant_id, item_ids):
+    """Delete the restaurant's items among ``item_ids`` and drop them from carts; IDs of other restaurants are ignored."""
+    deleted = 0
+    for chunk in _chunks({int(item_id) for item_id in item_ids}):
+        owned = select(MenuItem.MenuItemID).where(MenuItem.RestaurantID == restaurant_id, MenuItem.MenuItemID.in_(chunk))
+        # drop the items from carts first, foreign keys are enforced
+        db.session.execute(delete(CartItem).where(CartItem.MenuItemID.in_(owned)))
+        deleted += db.session.execute(
+            delete(MenuItem).where(MenuItem.RestaurantID == restaurant_id, MenuItem.MenuItemID.in_(chunk))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+    if deleted:
+        mark_menu_stale(db.session, restaurant_id)
+    return deleted
+
+
+def export_rows(restaurant_id):
+    """The restaurant's menu as dicts in FIELDS order, fetched in batches rather than all at once."""
+    result = db.session.execute(
+        select(*(MenuItem.__table__.c[field] for field in FIELDS))
+        .where(MenuItem.RestaurantID == restaurant_id)
+        .order_by(MenuItem.MenuItemID)
+        .execution_options(yield_per=CHUNK_SIZE)
+    )
+    for row in result:
+        yield dict(row._mapping)
+
+
+def export_csv(restaurant_id):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=FIELDS)
+    writer.writeheader()
+    for number, row in enumerate(export_rows(restaurant_id), start=1):
+        writer.writerow(row)
+        if number % CHUNK_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def export_json(restaurant_id):
+    yield '{"items": ['
+    for number, row in enumerate(export_rows(restaurant_id)):
+        row['Price'] = str(row['Price'])
+        yield (',' if number else '') + json.dumps(row)
+    yield ']}'
@@ -0,0 +1,149 @@
+"""Socket.IO message queue shared by the worker processes of one host.
+
+Every worker publishes its emits and room changes to a small hub process
+listening on a UNIX socket (``local:///path/to.sock``), which forwards them
+to all workers. It stands in for Redis on a single machine; across machines
+use ``redis://`` (or any other Flask-SocketIO message queue) instead.
+"""
+from threading import Lock
+import os
+import selectors
+import socket
+import struct
+import time
+
+import socketio
+
+_HEADER = struct.Struct('!I')
+PUBLISHER, SUBSCRIBER = b'P', b'S'
+
+
+class LocalPubSubManager(socketio.PubSubManager):
+    name = 'local'
+
+    def __init__(self, url, channel='flask-socketio', write_only=False, logger=None, json=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        self.path = url[len('local://'):]
+        self._publisher = None
+        self._lock = Lock()
+
+    def _connect(self, role):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.path)
+        sock.sendall(role)
+        return sock
+
+    def _publish(self, data):
+        payload = self.json.dumps(data).encode()
+        frame = _HEADER.pack(len(payload)) + payload
+        with self._lock:
+            for retries_left in (1, 0):
+                try:
+                    if self._publisher is None:
+                        self._publisher = self._connect(PUBLISHER)
+                    self._publisher.sendall(frame)
+                    return
+                except OSError as e:
+                    if self._publisher is not None:
+                        self._publisher.close()
+                    self._publisher = None
+                    if not retries_left:
+                        self._get_logger().error('Cannot publish to the local message queue: %s', e)
+
+    def _listen(self):
+        retry_sleep = 1
+        while True:
+            try:
+                sock = self._connect(SUBSCRIBER)
+                retry_sleep = 1
+                buffer = b''
+                while True:
+                    chunk = sock.recv(65536)
+                    if not chunk:
+                        raise ConnectionError('hub closed the connection')
+                    buffer += chunk
+                    while len(buffer) >= _HEADER.size:
+                        (size,) = _HEADER.unpack_from(buffer)
+                        if len(buffer) < _HEADER.size + size:
+                            break
+                        yield buffer[_HEADER.size:_HEADER.size + size].decode()
+                        buffer = buffer[_HEADER.size + size:]
+            except OSError as e:
+                self._get_logger().error('Cannot receive from the local message queue, retrying in %s secs: %s',
+                                         retry_sleep, e)
+                time.sleep(retry_sleep)
+                retry_sleep = min(retry_sleep * 2, 30)
+
+
+def run_hub(path):
+    """Forward every frame a publisher sends to all subscribers, until the process is killed."""
+    if os.path.exists(path):
+        os.unlink(path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(128)
+
+    selector = selectors.DefaultSelector()
+    selector.register(server, selectors.EVENT_READ)
+    roles, buffers, subscribers = {}, {}, set()
+
+    def drop(conn):
+        selector.unregister(conn)
+        subscribers.discard(conn)
+        roles.pop(conn, None)
+        buffers.pop(conn, None)
+        conn.close()
+
+    while True:
+        for key, _ in selector.select():
+            conn = key.fileobj
+            if conn is server:
+                client, _ = server.accept()
+                selector.register(client, selectors.EVENT_READ)
+                buffers[client] = b''
+                continue
+            try:
+                chunk = conn.recv(65536)
+            except OSError:
+                chunk = b''
+            if not chunk:
+                drop(conn)
+                continue
+
+            if conn not in roles:
+                roles[conn], chunk = chunk[:1], chunk[1:]
+                if roles[conn] == SUBSCRIBER:
+                    subscribers.add(conn)
+            if roles[conn] != PUBLISHER:
+                continue
+
+            # forward complete frames only, a subscriber must never see half a message
+            buffer = buffers[conn] + chunk
+            end = 0
+            while len(buffer) - end >= _HEADER.size:
+                (size,) = _HEADER.unpack_from(buffer, end)
+                if len(buffer) - end < _HEADER.size + size:
+                    break
+                end += _HEADER.size + size
+            buffers[conn] = buffer[end:]
+            if end:
+                for subscriber in list(subscribers):
+                    try:
+                        subscriber.sendall(buffer[:end])
+                    except OSError:
+                        drop(subscriber)
+
+
+def socketio_options(config):
+    """Keyword arguments for ``socketio.init_app()`` from the SOCKETIO_* and SERVER_ASYNC_MODE settings."""
+    options = {}
+    url = config['SOCKETIO_MESSAGE_QUEUE']
+    if url and url.startswith('local://'):
+        options['client_manager'] = LocalPubSubManager(url)
+    elif url:
+        options['message_queue'] = url
+    if config['SOCKETIO_TRANSPORTS']:
+        options['transports'] = config['SOCKETIO_TRANSPORTS']
+    if config['SERVER_ASYNC_MODE']:
+        options['async_mode'] = config['SERVER_ASYNC_MODE']
+    return options
@@ -0,0 +1,316 @@
+from contextlib import ContextDecorator
+from datetime import datetime, timezone
+from threading import Lock
+import glob
+import json
+import os
+import time
+
+from cache import menu_cache
+from events import socketio
+
+# default histogram bounds in seconds, the +Inf bucket is implicit
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for _, v in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if value not in (float('inf'), float('-inf')) else ('+Inf' if value > 0 else '-Inf')
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, registry, name, documentation, function=None, shared=False):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.function = function  # computed when collected, returns {labels dict tuple: value} or a number
+        self.shared = shared  # same value in every process (e.g. read from the database), not added up
+        self._values = {}
+
+    def _snapshot(self):
+        if self.function is None:
+            return dict(self._values)
+        value = self.function()
+        return value if isinstance(value, dict) else {(): value}
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self.registry.lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        self.registry.maybe_flush()
+
+
+class Gauge(_Metric):
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        with self.registry.lock:
+            self._values[_label_key(labels)] = value
+        self.registry.maybe_flush()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self.registry.lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        self.registry.maybe_flush()
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class _Timer(ContextDecorator):
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def _recreate_cm(self):
+        # a decorated function gets a fresh timer per call, concurrent calls must not share started
+        return _Timer(self.histogram, self.labels)
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, registry, name, documentation, buckets=LATENCY_BUCKETS):
+        super().__init__(registry, name, documentation)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self.registry.lock:
+            # per-bucket (not cumulative) counts, then sum and count
+            values = self._values.get(key)
+            if values is None:
+                values = self._values[key] = [0] * (len(self.buckets) + 3)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    values[i] += 1
+                    break
+            else:
+                values[len(self.buckets)] += 1
+            values[-2] += value
+            values[-1] += 1
+        self.registry.maybe_flush()
+
+    def time(self, **labels):
+        """Observe the duration of a ``with`` block or of every call of a decorated function."""
+        return _Timer(self, labels)
+
+    def _snapshot(self):
+        return {key: list(values) for key, values in self._values.items()}
+
+
+class Registry:
+    """Thread-safe registry of counters, gauges and histograms rendered in the Prometheus text format.
+
+    With ``directory`` set, every process writes its values to a file there
+    at most every ``flush_interval`` seconds, and ``render()`` adds up the
+    files of all processes. Counters and histograms of exited processes are
+    kept, their gauges are dropped. Shared gauges are computed only by the
+    rendering process.
+    """
+
+    def __init__(self, directory=None, flush_interval=1.0):
+        self.lock = Lock()
+        self._flush_lock = Lock()
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._metrics = {}
+        self._flushed_at = 0.0
+
+    def _register(self, metric):
+        with self.lock:
+            existing = self._metrics.setdefault(metric.name, metric)
+        return existing
+
+    def counter(self, name, documentation, function=None):
+        return self._register(Counter(self, name, documentation, function))
+
+    def gauge(self, name, documentation, function=None, shared=False):
+        return self._register(Gauge(self, name, documentation, function, shared))
+
+    def histogram(self, name, documentation, buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(self, name, documentation, buckets))
+
+    def configure(self, directory=None, flush_interval=1.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _collect_local(self, shared=True):
+        with self.lock:
+            metrics = [metric for metric in self._metrics.values() if shared or not metric.shared]
+            samples = {metric.name: metric._snapshot() for metric in metrics if metric.function is None}
+        # callbacks may take locks of their own, run them outside the registry lock
+        for metric in metrics:
+            if metric.function is not None:
+                samples[metric.name] = metric._snapshot()
+        return samples
+
+    def _path(self, pid):
+        return os.path.join(self.directory, f"metrics-{pid}.json")
+
+    def flush(self):
+        if not self.directory:
+            return
+        with self._flush_lock:
+            self._write()
+
+    def _write(self):
+        # shared metrics are computed by the rendering process only
+        samples = self._collect_local(shared=False)
+        data = {name: [[list(map(list, key)), value] for key, value in values.items()] for name, values in samples.items()}
+        path = self._path(os.getpid())
+        with open(path + '.tmp', 'w') as f:
+            json.dump(data, f)
+        os.replace(path + '.tmp', path)
+        self._flushed_at = time.monotonic()
+
+    def maybe_flush(self):
+        # hot path: one clock read, and a thread that finds a flush in progress skips it
+        if self.directory and time.monotonic() - self._flushed_at >= self.flush_interval:
+            if self._flush_lock.acquire(blocking=False):
+                try:
+                    self._write()
+                finally:
+                    self._flush_lock.release()
+
+    def _collect(self):
+        samples = self._collect_local()
+        if not self.directory:
+            return samples
+
+        self.flush()
+        merged = {}
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            pid = int(os.path.basename(path)[len('metrics-'):-len('.json')])
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue  # being replaced right now
+            alive = pid == os.getpid() or _pid_alive(pid)
+            for name, values in data.items():
+                metric = self._metrics.get(name)
+                if metric is None or (metric.type == 'gauge' and not alive):
+                    continue
+                target = merged.setdefault(name, {})
+                for key, value in values:
+                    key = tuple(map(tuple, key))
+                    if isinstance(value, list):
+                        previous = target.get(key, [0] * len(value))
+                        target[key] = [a + b for a, b in zip(previous, value)]
+                    else:
+                        target[key] = target.get(key, 0) + value
+        for name, metric in self._metrics.items():
+            if metric.shared:
+                merged[name] = samples[name]
+        return merged
+
+    def render(self):
+        samples = self._collect()
+        lines = []
+        for name, metric in sorted(self._metrics.items()):
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.type}")
+            for key, value in sorted(samples.get(name, {}).items()):
+                if metric.type != 'histogram':
+                    lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (float('inf'),), value[:-2]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(key, [('le', _format_value(bound))])} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(key)} {_format_value(value[-2])}")
+                lines.append(f"{name}_count{_format_labels(key)} {value[-1]}")
+        return '\n'.join(lines) + '\n'
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+registry = Registry()
+
+# order pipeline
+ORDERS_CREATED = registry.counter('lieferspatz_orders_created_total', "Orders placed through create_order.")
+CHECKOUT_FAILURES = registry.counter('lieferspatz_checkout_failures_total', "Checkouts that did not create an order, by reason.")
+CHECKOUT_SECONDS = registry.histogram('lieferspatz_checkout_duration_seconds', "Time spent in create_order.")
+CART_ITEMS = registry.histogram('lieferspatz_checkout_cart_items', "Items (summed quantities) per checked out cart.",
+                                buckets=(1, 2, 3, 5, 8, 13, 20, 50, 100))
+ORDER_TRANSITIONS = registry.counter('lieferspatz_order_transitions_total', "Order status changes.")
+TRANSITION_SECONDS = registry.histogram('lieferspatz_order_transition_duration_seconds', "Time spent in the status change routes.")
+STATUS_AGE_SECONDS = registry.histogram('lieferspatz_order_status_age_seconds', "How long an order stayed in a status before leaving it.",
+                                        buckets=(30, 60, 120, 300, 600, 900, 1800, 3600, 7200, 86400))
+
+# socket.io
+SOCKET_JOINS = registry.counter('lieferspatz_socketio_joins_total', "Socket.IO room joins, by kind of room.")
+
+
+def observe_transition(previous_status, new_status, since):
+    """Count a status change; ``since`` is the order's UpdatedAt from before the change.
+
+    UpdatedAt is set on creation and on every status change by CURRENT_TIMESTAMP,
+    which is UTC, so the difference to now is the time spent in ``previous_status``.
+    """
+    ORDER_TRANSITIONS.inc(from_status=previous_status, to_status=new_status)
+    if since is not None:
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        STATUS_AGE_SECONDS.observe(max((now - since).total_seconds(), 0), from_status=previous_status, to_status=new_status)
+
+
+def room_kind(room):
+    return room.split('_', 1)[0]
+
+
+def socketio_room_counts():
+    """Open Socket.IO rooms by kind (user/customer/restaurant) in this process, ignoring per-client rooms."""
+    counts = {}
+    manager = getattr(socketio.server, 'manager', None)
+    if manager is None:
+        return counts
+    for rooms in list(manager.rooms.values()):
+        sids = set(rooms.get(None, ()))
+        for room in list(rooms):
+            if room is not None and room not in sids:
+                key = (('kind', room_kind(room)),)
+                counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+SOCKET_ROOMS = registry.gauge('lieferspatz_socketio_rooms', "Open Socket.IO rooms, by kind of room.",
+                              function=socketio_room_counts)
+registry.counter('lieferspatz_menu_cache_hits_total', "Menu cache hits.", function=lambda: menu_cache.hits)
+registry.counter('lieferspatz_menu_cache_misses_total', "Menu cache misses.", function=lambda: menu_cache.misses)
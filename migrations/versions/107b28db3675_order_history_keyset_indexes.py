@@ -0,0 +1,29 @@
+"""Keyset pagination indexes for order histories
+
+Revision ID: 107b28db3675
+Revises: 834e35fc4bfa
+Create Date: 2026-10-18 11:20:08.941577
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '107b28db3675'
+down_revision = '834e35fc4bfa'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # the composite index also serves plain CustomerID lookups
+    op.drop_index('ix_Orders_CustomerID', table_name='Orders')
+    op.create_index('ix_Orders_CustomerID_CreatedAt_OrderID', 'Orders', ['CustomerID', 'CreatedAt', 'OrderID'], unique=False)
+    op.create_index('ix_Orders_RestaurantID_CreatedAt_OrderID', 'Orders', ['RestaurantID', 'CreatedAt', 'OrderID'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Orders_RestaurantID_CreatedAt_OrderID', table_name='Orders')
+    op.drop_index('ix_Orders_CustomerID_CreatedAt_OrderID', table_name='Orders')
+    op.create_index('ix_Orders_CustomerID', 'Orders', ['CustomerID'], unique=False)
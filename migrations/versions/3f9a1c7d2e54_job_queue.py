@@ -0,0 +1,42 @@
+"""Durable background job queue
+
+Revision ID: 3f9a1c7d2e54
+Revises: 107b28db3675
+Create Date: 2026-10-18 19:40:12.512083
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9a1c7d2e54'
+down_revision = '107b28db3675'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('Jobs',
+    sa.Column('JobID', sa.Integer(), nullable=False),
+    sa.Column('Kind', sa.String(length=100), nullable=False),
+    sa.Column('Payload', sa.Text(), nullable=False),
+    sa.Column('IdempotencyKey', sa.String(length=255), nullable=True),
+    sa.Column('Status', sa.String(length=20), nullable=False),
+    sa.Column('Attempts', sa.Integer(), nullable=False),
+    sa.Column('MaxAttempts', sa.Integer(), nullable=False),
+    sa.Column('RunAt', sa.DateTime(), nullable=False),
+    sa.Column('LockedUntil', sa.DateTime(), nullable=True),
+    sa.Column('LastError', sa.Text(), nullable=True),
+    sa.Column('CreatedAt', sa.DateTime(), nullable=True),
+    sa.Column('FinishedAt', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('JobID')
+    )
+    op.create_index('ix_Jobs_Status_RunAt', 'Jobs', ['Status', 'RunAt'], unique=False)
+    op.create_index('ux_Jobs_IdempotencyKey', 'Jobs', ['IdempotencyKey'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ux_Jobs_IdempotencyKey', table_name='Jobs')
+    op.drop_index('ix_Jobs_Status_RunAt', table_name='Jobs')
+    op.drop_table('Jobs')
@@ -0,0 +1,26 @@
+"""Menu item version for fragment cache keys
+
+Revision ID: 6d2f0b9e4a13
+Revises: c4e8b2a61f07
+Create Date: 2026-10-18 20:41:07.518302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6d2f0b9e4a13'
+down_revision = 'c4e8b2a61f07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('MenuItems', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('Version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('MenuItems', schema=None) as batch_op:
+        batch_op.drop_column('Version')
@@ -0,0 +1,34 @@
+"""Running restaurant balance
+
+Revision ID: 834e35fc4bfa
+Revises: 94c8016af90c
+Create Date: 2026-10-18 10:41:55.630297
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '834e35fc4bfa'
+down_revision = '94c8016af90c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('Restaurants', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('Balance', sa.Numeric(precision=10, scale=2), server_default='0', nullable=False))
+
+    # backfill from the completed orders, afterwards the balance is maintained on each status change
+    op.execute("""
+        UPDATE Restaurants SET Balance = (
+            SELECT COALESCE(SUM(RestaurantAmount), 0) FROM Orders
+            WHERE Orders.RestaurantID = Restaurants.RestaurantID AND Orders.Status = 'Completed'
+        )
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('Restaurants', schema=None) as batch_op:
+        batch_op.drop_column('Balance')
@@ -0,0 +1,44 @@
+"""Append-only platform fee ledger
+
+Revision ID: 94c8016af90c
+Revises: e05a09334084
+Create Date: 2026-10-18 10:03:27.118402
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '94c8016af90c'
+down_revision = 'e05a09334084'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('PlatformFees',
+    sa.Column('FeeID', sa.Integer(), nullable=False),
+    sa.Column('OrderID', sa.Integer(), nullable=False),
+    sa.Column('Amount', sa.Numeric(precision=10, scale=2), nullable=False),
+    sa.Column('CreatedAt', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['OrderID'], ['Orders.OrderID'], ),
+    sa.PrimaryKeyConstraint('FeeID'),
+    sa.UniqueConstraint('OrderID')
+    )
+    # existing Platform.Balance already contains every fee charged so far
+    with op.batch_alter_table('Platform', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('RolledUpFeeID', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    # fold pending ledger entries back into the balance before dropping the ledger
+    op.execute("""
+        UPDATE Platform SET Balance = COALESCE(Balance, 0) + (
+            SELECT COALESCE(SUM(Amount), 0) FROM PlatformFees WHERE FeeID > Platform.RolledUpFeeID
+        )
+        WHERE PlatformID = (SELECT MIN(PlatformID) FROM Platform)
+    """)
+    with op.batch_alter_table('Platform', schema=None) as batch_op:
+        batch_op.drop_column('RolledUpFeeID')
+    op.drop_table('PlatformFees')
@@ -0,0 +1,92 @@
+"""FTS5 search index over restaurants and menu items
+
+Revision ID: a7c3f19d8b25
+Revises: 6d2f0b9e4a13
+Create Date: 2026-10-18 22:04:51.930217
+
+Contentless FTS5 tables kept in sync by triggers, see search.py; a menu
+item's search rowid is RestaurantID << 32 | MenuItemID. SQLite only, other
+databases skip this revision. A later batch_alter_table on Restaurants or
+MenuItems recreates the table and drops its triggers, such a migration has
+to create them again (flask rebuild-search-index).
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c3f19d8b25'
+down_revision = '6d2f0b9e4a13'
+branch_labels = None
+depends_on = None
+
+
+SCHEMA = [
+    """CREATE VIRTUAL TABLE RestaurantSearch USING fts5(
+        Name, Description, content='', tokenize='unicode61 remove_diacritics 2', prefix='2 3 4 5 6')""",
+    """CREATE TRIGGER RestaurantSearch_insert AFTER INSERT ON Restaurants BEGIN
+        INSERT INTO RestaurantSearch(rowid, Name, Description) VALUES (new.RestaurantID, new.Name, new.Description);
+    END""",
+    """CREATE TRIGGER RestaurantSearch_delete AFTER DELETE ON Restaurants BEGIN
+        INSERT INTO RestaurantSearch(RestaurantSearch, rowid, Name, Description)
+        VALUES ('delete', old.RestaurantID, old.Name, old.Description);
+    END""",
+    """CREATE TRIGGER RestaurantSearch_update AFTER UPDATE OF Name, Description ON Restaurants BEGIN
+        INSERT INTO RestaurantSearch(RestaurantSearch, rowid, Name, Description)
+        VALUES ('delete', old.RestaurantID, old.Name, old.Description);
+        INSERT INTO RestaurantSearch(rowid, Name, Description) VALUES (new.RestaurantID, new.Name, new.Description);
+    END""",
+    """CREATE VIRTUAL TABLE MenuItemNameSearch USING fts5(
+        Name, Restaurant, content='', tokenize='unicode61 remove_diacritics 2', prefix='2 3 4 5 6')""",
+    """CREATE VIRTUAL TABLE MenuItemSearch USING fts5(
+        Name, Description, Category, Restaurant, content='', tokenize='unicode61 remove_diacritics 2', prefix='2 3 4 5 6')""",
+    """CREATE TRIGGER MenuItemSearch_insert AFTER INSERT ON MenuItems BEGIN
+        INSERT INTO MenuItemNameSearch(rowid, Name, Restaurant) VALUES (new.RestaurantID * 4294967296 + new.MenuItemID, new.Name, 'r' || new.RestaurantID);
+        INSERT INTO MenuItemSearch(rowid, Name, Description, Category, Restaurant)
+        VALUES (new.RestaurantID * 4294967296 + new.MenuItemID, new.Name, new.Description, new.Category, 'r' || new.RestaurantID);
+    END""",
+    """CREATE TRIGGER MenuItemSearch_delete AFTER DELETE ON MenuItems BEGIN
+        INSERT INTO MenuItemNameSearch(MenuItemNameSearch, rowid, Name, Restaurant)
+        VALUES ('delete', old.RestaurantID * 4294967296 + old.MenuItemID, old.Name, 'r' || old.RestaurantID);
+        INSERT INTO MenuItemSearch(MenuItemSearch, rowid, Name, Description, Category, Restaurant)
+        VALUES ('delete', old.RestaurantID * 4294967296 + old.MenuItemID, old.Name, old.Description, old.Category, 'r' || old.RestaurantID);
+    END""",
+    """CREATE TRIGGER MenuItemSearch_update AFTER UPDATE OF Name, Description, Category, RestaurantID
+    ON MenuItems BEGIN
+        INSERT INTO MenuItemNameSearch(MenuItemNameSearch, rowid, Name, Restaurant)
+        VALUES ('delete', old.RestaurantID * 4294967296 + old.MenuItemID, old.Name, 'r' || old.RestaurantID);
+        INSERT INTO MenuItemSearch(MenuItemSearch, rowid, Name, Description, Category, Restaurant)
+        VALUES ('delete', old.RestaurantID * 4294967296 + old.MenuItemID, old.Name, old.Description, old.Category, 'r' || old.RestaurantID);
+        INSERT INTO MenuItemNameSearch(rowid, Name, Restaurant) VALUES (new.RestaurantID * 4294967296 + new.MenuItemID, new.Name, 'r' || new.RestaurantID);
+        INSERT INTO MenuItemSearch(rowid, Name, Description, Category, Restaurant)
+        VALUES (new.RestaurantID * 4294967296 + new.MenuItemID, new.Name, new.Description, new.Category, 'r' || new.RestaurantID);
+    END""",
+    # index the rows that existed before the triggers
+    "INSERT INTO RestaurantSearch(rowid, Name, Description) SELECT RestaurantID, Name, Description FROM Restaurants",
+    """INSERT INTO MenuItemNameSearch(rowid, Name, Restaurant)
+       SELECT RestaurantID * 4294967296 + MenuItemID, Name, 'r' || RestaurantID FROM MenuItems
+       ORDER BY RestaurantID, MenuItemID""",
+    """INSERT INTO MenuItemSearch(rowid, Name, Description, Category, Restaurant)
+       SELECT RestaurantID * 4294967296 + MenuItemID, Name, Description, Category, 'r' || RestaurantID FROM MenuItems
+       ORDER BY RestaurantID, MenuItemID""",
+    "INSERT INTO RestaurantSearch(RestaurantSearch) VALUES ('optimize')",
+    "INSERT INTO MenuItemNameSearch(MenuItemNameSearch) VALUES ('optimize')",
+    "INSERT INTO MenuItemSearch(MenuItemSearch) VALUES ('optimize')",
+]
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for statement in SCHEMA:
+        op.execute(statement)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for name in ('MenuItemSearch', 'RestaurantSearch'):
+        for action in ('update', 'delete', 'insert'):
+            op.execute(f"DROP TRIGGER {name}_{action}")
+    for name in ('MenuItemSearch', 'MenuItemNameSearch', 'RestaurantSearch'):
+        op.execute(f"DROP TABLE {name}")
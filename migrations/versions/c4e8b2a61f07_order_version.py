@@ -0,0 +1,26 @@
+"""Order version for optimistic status transitions
+
+Revision ID: c4e8b2a61f07
+Revises: 3f9a1c7d2e54
+Create Date: 2026-10-18 19:58:31.204467
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e8b2a61f07'
+down_revision = '3f9a1c7d2e54'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('Orders', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('Version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('Orders', schema=None) as batch_op:
+        batch_op.drop_column('Version')
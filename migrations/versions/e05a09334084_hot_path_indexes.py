@@ -0,0 +1,57 @@
+"""Indexes for hot lookup columns and unique cart lines
+
+Revision ID: e05a09334084
+Revises: 5337c729bc2f
+Create Date: 2026-10-18 09:12:41.503118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e05a09334084'
+down_revision = '5337c729bc2f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # merge duplicate cart lines into the oldest row before enforcing uniqueness
+    op.execute("""
+        UPDATE CartItems
+        SET Quantity = (
+            SELECT SUM(COALESCE(dup.Quantity, 1)) FROM CartItems AS dup
+            WHERE dup.UserID = CartItems.UserID AND dup.MenuItemID = CartItems.MenuItemID
+        )
+        WHERE CartItemID IN (
+            SELECT MIN(CartItemID) FROM CartItems
+            GROUP BY UserID, MenuItemID HAVING COUNT(*) > 1
+        )
+    """)
+    op.execute("""
+        DELETE FROM CartItems
+        WHERE CartItemID NOT IN (SELECT MIN(CartItemID) FROM CartItems GROUP BY UserID, MenuItemID)
+    """)
+
+    op.create_index('ux_CartItems_UserID_MenuItemID', 'CartItems', ['UserID', 'MenuItemID'], unique=True)
+    op.create_index('ix_Orders_RestaurantID_Status', 'Orders', ['RestaurantID', 'Status'], unique=False)
+    op.create_index(op.f('ix_Orders_CustomerID'), 'Orders', ['CustomerID'], unique=False)
+    op.create_index(op.f('ix_OrderItems_OrderID'), 'OrderItems', ['OrderID'], unique=False)
+    op.create_index(op.f('ix_MenuItems_RestaurantID'), 'MenuItems', ['RestaurantID'], unique=False)
+    op.create_index('ix_DeliveryAreas_PostalCode_RestaurantID', 'DeliveryAreas', ['PostalCode', 'RestaurantID'], unique=False)
+    op.create_index(op.f('ix_DeliveryAreas_RestaurantID'), 'DeliveryAreas', ['RestaurantID'], unique=False)
+    op.create_index(op.f('ix_Restaurants_UserID'), 'Restaurants', ['UserID'], unique=False)
+    op.create_index(op.f('ix_OpeningHours_RestaurantID'), 'OpeningHours', ['RestaurantID'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_OpeningHours_RestaurantID'), table_name='OpeningHours')
+    op.drop_index(op.f('ix_Restaurants_UserID'), table_name='Restaurants')
+    op.drop_index(op.f('ix_DeliveryAreas_RestaurantID'), table_name='DeliveryAreas')
+    op.drop_index('ix_DeliveryAreas_PostalCode_RestaurantID', table_name='DeliveryAreas')
+    op.drop_index(op.f('ix_MenuItems_RestaurantID'), table_name='MenuItems')
+    op.drop_index(op.f('ix_OrderItems_OrderID'), table_name='OrderItems')
+    op.drop_index(op.f('ix_Orders_CustomerID'), table_name='Orders')
+    op.drop_index('ix_Orders_RestaurantID_Status', table_name='Orders')
+    op.drop_index('ux_CartItems_UserID_MenuItemID', table_name='CartItems')
@@ -0,0 +1,25 @@
+"""Index CartItems.MenuItemID
+
+Revision ID: f3b8d41c9a07
+Revises: a7c3f19d8b25
+Create Date: 2026-10-19 09:12:37.402815
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b8d41c9a07'
+down_revision = 'a7c3f19d8b25'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # deleting menu items removes their cart lines, (UserID, MenuItemID) does not serve that
+    op.create_index('ix_CartItems_MenuItemID', 'CartItems', ['MenuItemID'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_CartItems_MenuItemID', table_name='CartItems')
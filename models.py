@@ -39,7 +39,7 @@ class Customer(db.Model):
 class Restaurant(db.Model):
     __tablename__ = 'Restaurants'
     RestaurantID = db.Column(db.Integer, primary_key=True)
-    UserID = db.Column(db.Integer, db.ForeignKey('Users.UserID'), nullable=False)
+    UserID = db.Column(db.Integer, db.ForeignKey('Users.UserID'), nullable=False, index=True)
     Name = db.Column(db.String(100), nullable=False)
     Address = db.Column(db.String(255), nullable=False) 
     PostalCode = db.Column(db.String(10), nullable=False)
@@ -47,6 +47,7 @@ class Restaurant(db.Model):
     ImageURL = db.Column(db.String(255), nullable=True) 
     OpenTime = db.Column(db.Time, nullable=False)
     CloseTime = db.Column(db.Time, nullable=False)
+    Balance = db.Column(db.Numeric(10, 2), nullable=False, default=0, server_default='0')  # sum of completed orders, kept by ledger.py
     
     # Relationships
     menu_items = db.relationship('MenuItem', backref='restaurant', lazy=True)
@@ -60,26 +61,39 @@ class Restaurant(db.Model):
 class MenuItem(db.Model):
     __tablename__ = 'MenuItems'
     MenuItemID = db.Column(db.Integer, primary_key=True)
-    RestaurantID = db.Column(db.Integer, db.ForeignKey('Restaurants.RestaurantID'), nullable=False)
+    RestaurantID = db.Column(db.Integer, db.ForeignKey('Restaurants.RestaurantID'), nullable=False, index=True)
     Name = db.Column(db.String(100), nullable=False)
     Description = db.Column(db.Text, nullable=False)
     Price = db.Column(db.Numeric(10, 2), nullable=False)
     Category = db.Column(db.String, nullable=False, default="Uncategorized")  # Add default value
     ImageURL = db.Column(db.String, nullable=True)
     IsAvailable = db.Column(db.Boolean, default=True)
+    # bumped by every UPDATE, ORM or bulk, so rendered menu cards can be cached by (MenuItemID, Version)
+    Version = db.Column(db.Integer, nullable=False, default=0, server_default='0', onupdate=db.column('Version') + 1)
 
 
 # Cart Item model
 class CartItem(db.Model):
     __tablename__ = 'CartItems'
+    __table_args__ = (
+        # one row per (user, menu item), also serves lookups by UserID alone
+        db.Index('ux_CartItems_UserID_MenuItemID', 'UserID', 'MenuItemID', unique=True),
+    )
     CartItemID = db.Column(db.Integer, primary_key=True)
     UserID = db.Column(db.Integer, db.ForeignKey('Users.UserID'), nullable=False)
-    MenuItemID = db.Column(db.Integer, db.ForeignKey('MenuItems.MenuItemID'), nullable=False)
+    # deleting menu items drops them from every cart first
+    MenuItemID = db.Column(db.Integer, db.ForeignKey('MenuItems.MenuItemID'), nullable=False, index=True)
     Quantity = db.Column(db.Integer, default=1)
 
 # Order model
 class Order(db.Model):
     __tablename__ = 'Orders'
+    __table_args__ = (
+        db.Index('ix_Orders_RestaurantID_Status', 'RestaurantID', 'Status'),
+        # keyset pagination of order histories, newest first
+        db.Index('ix_Orders_CustomerID_CreatedAt_OrderID', 'CustomerID', 'CreatedAt', 'OrderID'),
+        db.Index('ix_Orders_RestaurantID_CreatedAt_OrderID', 'RestaurantID', 'CreatedAt', 'OrderID'),
+    )
     OrderID = db.Column(db.Integer, primary_key=True)
     CustomerID = db.Column(db.Integer, db.ForeignKey('Users.UserID'), nullable=False)  # Changed this line
     RestaurantID = db.Column(db.Integer, db.ForeignKey('Restaurants.RestaurantID'), nullable=False)
@@ -90,6 +104,7 @@ class Order(db.Model):
     Notes = db.Column(db.Text, nullable=True)
     CreatedAt = db.Column(db.DateTime, default=db.func.current_timestamp())
     UpdatedAt = db.Column(db.DateTime, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
+    Version = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # bumped by every status change, see order_state.py
 
     order_items = db.relationship('OrderItem', backref='order', lazy=True)
     customer = db.relationship('User', backref='orders', lazy=True)
@@ -102,28 +117,62 @@ class OrderItem(db.Model):
     OrderItemID = db.Column(db.Integer, primary_key=True)
     MenuItemName = db.Column(db.String(255), nullable=False)  # Store name at order time
     MenuItemPrice = db.Column(db.Numeric(10, 2), nullable=False)  # Store price at order time
-    OrderID = db.Column(db.Integer, db.ForeignKey('Orders.OrderID'), nullable=False)
+    OrderID = db.Column(db.Integer, db.ForeignKey('Orders.OrderID'), nullable=False, index=True)
     Quantity = db.Column(db.Integer, nullable=False)
 
 
 # Delivery Area model
 class DeliveryArea(db.Model):
     __tablename__ = 'DeliveryAreas'
+    __table_args__ = (
+        # covering index for "who delivers to this postal code"
+        db.Index('ix_DeliveryAreas_PostalCode_RestaurantID', 'PostalCode', 'RestaurantID'),
+    )
     ID = db.Column(db.Integer, primary_key=True)
-    RestaurantID = db.Column(db.Integer, db.ForeignKey('Restaurants.RestaurantID'), nullable=False)
+    RestaurantID = db.Column(db.Integer, db.ForeignKey('Restaurants.RestaurantID'), nullable=False, index=True)
     PostalCode = db.Column(db.String(10), nullable=False)
 
 # Opening Hour model
 class OpeningHour(db.Model):
     __tablename__ = 'OpeningHours'
     OpeningHourID = db.Column(db.Integer, primary_key=True)
-    RestaurantID = db.Column(db.Integer, db.ForeignKey('Restaurants.RestaurantID'), nullable=False)
+    RestaurantID = db.Column(db.Integer, db.ForeignKey('Restaurants.RestaurantID'), nullable=False, index=True)
     DayOfWeek = db.Column(db.Integer, nullable=False)  # 0 (Monday) - 6 (Sunday)
     OpenTime = db.Column(db.String, nullable=False)
     CloseTime = db.Column(db.String, nullable=False)
 
+# Background job queue (jobs.py), finished rows stay behind as the record of what ran
+class Job(db.Model):
+    __tablename__ = 'Jobs'
+    __table_args__ = (
+        # workers claim the oldest due job per status
+        db.Index('ix_Jobs_Status_RunAt', 'Status', 'RunAt'),
+        db.Index('ux_Jobs_IdempotencyKey', 'IdempotencyKey', unique=True),
+    )
+    JobID = db.Column(db.Integer, primary_key=True)
+    Kind = db.Column(db.String(100), nullable=False)
+    Payload = db.Column(db.Text, nullable=False)  # JSON keyword arguments of the handler
+    IdempotencyKey = db.Column(db.String(255), nullable=True)
+    Status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    Attempts = db.Column(db.Integer, nullable=False, default=0)
+    MaxAttempts = db.Column(db.Integer, nullable=False, default=5)
+    RunAt = db.Column(db.DateTime, nullable=False)  # not before, UTC
+    LockedUntil = db.Column(db.DateTime, nullable=True)  # lease of the worker running it, UTC
+    LastError = db.Column(db.Text, nullable=True)
+    CreatedAt = db.Column(db.DateTime, default=db.func.current_timestamp())
+    FinishedAt = db.Column(db.DateTime, nullable=True)
+
 # Platform model (for tracking platform balance)
 class Platform(db.Model):
     __tablename__ = 'Platform'
     PlatformID = db.Column(db.Integer, primary_key=True)
-    Balance = db.Column(db.Numeric(10, 2), default=0.00)
\ No newline at end of file
+    Balance = db.Column(db.Numeric(10, 2), default=0.00)  # fees rolled up from the ledger
+    RolledUpFeeID = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # last PlatformFee included in Balance
+
+# Platform fee ledger, append-only: checkout inserts one row per order instead of updating Platform
+class PlatformFee(db.Model):
+    __tablename__ = 'PlatformFees'
+    FeeID = db.Column(db.Integer, primary_key=True)
+    OrderID = db.Column(db.Integer, db.ForeignKey('Orders.OrderID'), nullable=False, unique=True)
+    Amount = db.Column(db.Numeric(10, 2), nullable=False)
+    CreatedAt = db.Column(db.DateTime, default=db.func.current_timestamp())
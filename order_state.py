@@ -0,0 +1,89 @@
+from collections import namedtuple
+
+from sqlalchemy import select, update
+
+from events import queue_order_event, ORDER_STATUS_CHANGED
+from ledger import apply_restaurant_balance
+from models import db, Customer, Order
+
+PROCESSING, BEING_PREPARED, COMPLETED, CANCELLED = 'Processing', 'Being Prepared', 'Completed', 'Cancelled'
+
+# allowed status changes; the customer is charged at checkout, so no transition charges again
+TRANSITIONS = {
+    PROCESSING: {BEING_PREPARED, CANCELLED},
+    BEING_PREPARED: {COMPLETED, CANCELLED},
+    COMPLETED: set(),
+    CANCELLED: set(),
+}
+
+# a committed status change, ``since`` is when the order entered ``previous_status``
+Transition = namedtuple('Transition', ['order_id', 'previous_status', 'status', 'version', 'since'])
+
+
+class OrderNotFound(LookupError):
+    pass
+
+
+class InvalidTransition(ValueError):
+    pass
+
+
+class TransitionConflict(RuntimeError):
+    """The order changed between reading and updating it, the transition can be tried again."""
+
+
+def can_transition(current_status, new_status):
+    return new_status in TRANSITIONS.get(current_status, ())
+
+
+def transition(order_id, new_status, expected_status=None):
+    """Move an order to ``new_status`` with its balance effects, inside the caller's transaction.
+
+    The status change is one UPDATE conditional on the status and version
+    that were read, so of two concurrent transitions only one applies; the
+    other raises TransitionConflict. Cancelling refunds the customer and
+    completing credits the restaurant, both exactly once because they share
+    the transaction of the change that won. ``expected_status`` rejects the
+    transition if the order has moved on since the caller looked at it.
+    Returns the Transition, or None when the order already is in ``new_status``.
+    """
+    current = db.session.execute(
+        select(Order.Status, Order.Version, Order.UpdatedAt).where(Order.OrderID == order_id)
+    ).first()
+    if current is None:
+        raise OrderNotFound(f"Order {order_id} not found")
+    if current.Status == new_status:
+        return None
+    if expected_status is not None and current.Status != expected_status:
+        raise InvalidTransition(f"Order {order_id} is {current.Status}, not {expected_status}")
+    if not can_transition(current.Status, new_status):
+        raise InvalidTransition(f"Order {order_id} cannot change from {current.Status} to {new_status}")
+
+    stmt = (
+        update(Order)
+        .where(Order.OrderID == order_id, Order.Status == current.Status, Order.Version == current.Version)
+        .values(Status=new_status, Version=Order.Version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    columns = (Order.OrderID, Order.CustomerID, Order.RestaurantID, Order.Status, Order.TotalAmount,
+               Order.RestaurantAmount, Order.Version)
+    if db.session.get_bind().dialect.update_returning:
+        order = db.session.execute(stmt.returning(*columns)).first()
+    else:
+        # MySQL has no UPDATE ... RETURNING, read the row back in the same transaction if the UPDATE applied
+        order = None
+        if db.session.execute(stmt).rowcount:
+            order = db.session.execute(select(*columns).where(Order.OrderID == order_id)).first()
+    if order is None:
+        raise TransitionConflict(f"Order {order_id} changed concurrently")
+
+    if new_status == CANCELLED:
+        db.session.execute(
+            update(Customer)
+            .where(Customer.UserID == order.CustomerID)
+            .values(Balance=Customer.Balance + float(order.TotalAmount))
+            .execution_options(synchronize_session=False)
+        )
+    apply_restaurant_balance(order, current.Status, new_status)
+    queue_order_event(db.session, ORDER_STATUS_CHANGED, order, current.Status)
+    return Transition(order_id, current.Status, new_status, order.Version, current.UpdatedAt)
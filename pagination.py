@@ -0,0 +1,54 @@
+import base64
+from datetime import datetime
+
+from sqlalchemy import String, literal, tuple_
+
+from models import Order
+
+PAGE_SIZE = 20
+
+
+def encode_cursor(order):
+    """Opaque cursor pointing just past ``order`` in (CreatedAt, OrderID) descending order."""
+    raw = f"{order.CreatedAt.isoformat()}|{order.OrderID}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return ``(created_at, order_id)`` for a cursor, raise ValueError if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, order_id = raw.split('|')
+        return datetime.fromisoformat(created_at), int(order_id)
+    except (TypeError, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def _created_at_value(query, created_at):
+    # SQLite compares CreatedAt as text and CURRENT_TIMESTAMP stores it without
+    # microseconds, so bind the cursor in that same format rather than as a DateTime
+    if query.session.get_bind().dialect.name != 'sqlite':
+        return created_at
+    fmt = '%Y-%m-%d %H:%M:%S.%f' if created_at.microsecond else '%Y-%m-%d %H:%M:%S'
+    return literal(created_at.strftime(fmt), String)
+
+
+def order_page(query, cursor=None, page_size=PAGE_SIZE):
+    """Fetch one page of ``query`` newest first, keyset-paginated on (CreatedAt, OrderID).
+
+    The cost of a page does not depend on how many orders precede it, as long
+    as an index ends in (CreatedAt, OrderID) after the equality filters.
+    Returns ``(orders, next_cursor)``; ``next_cursor`` is None on the last page.
+    """
+    if cursor:
+        created_at, order_id = decode_cursor(cursor)
+        query = query.filter(
+            tuple_(Order.CreatedAt, Order.OrderID) < tuple_(_created_at_value(query, created_at), order_id)
+        )
+
+    # one extra row tells whether there is another page
+    orders = query.order_by(Order.CreatedAt.desc(), Order.OrderID.desc()).limit(page_size + 1).all()
+    if len(orders) > page_size:
+        orders = orders[:page_size]
+        return orders, encode_cursor(orders[-1])
+    return orders, None
@@ -0,0 +1,149 @@
+"""Password hashing on a bounded worker pool.
+
+Hashes are stored as ``scheme$params$salt$hash`` (base64), e.g.
+``scrypt$n=16384,r=8,p=1$...$...`` or ``pbkdf2_sha256$i=600000$...$...``.
+A stored value without a known scheme is a legacy plaintext password; it
+still verifies, and ``verify`` reports that it needs rehashing, as does a
+hash made with other cost parameters than the configured ones.
+
+A KDF costs tens to hundreds of milliseconds of CPU on purpose. Running it
+on the request thread would let a burst of logins take every CPU (or, under
+eventlet/gevent, stall the whole process), so it runs on a pool of
+``workers`` threads or processes. At most ``max_pending`` calls wait for it,
+beyond that PasswordPoolBusy is raised instead of queueing without bound.
+hashlib releases the GIL while hashing, so threads run in parallel; with
+green threads use processes, whose work the monkey-patched threads cannot
+block.
+"""
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from threading import BoundedSemaphore, Lock
+import base64
+import hashlib
+import hmac
+import os
+
+SCRYPT, PBKDF2 = 'scrypt', 'pbkdf2_sha256'
+
+
+class PasswordPoolBusy(RuntimeError):
+    """Too many hash computations are waiting already, the caller should answer 503 and let the user retry."""
+
+
+def _b64(data):
+    return base64.b64encode(data).decode().rstrip('=')
+
+
+def _unb64(text):
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+
+def _derive(scheme, params, password, salt):
+    if scheme == SCRYPT:
+        n, r, p = params['n'], params['r'], params['p']
+        # OpenSSL refuses more than 32 MiB unless told otherwise, scrypt needs 128 * n * r bytes and some slack
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, dklen=32, maxmem=256 * n * r * (p + 1))
+    if scheme == PBKDF2:
+        return hashlib.pbkdf2_hmac('sha256', password.encode(), salt, params['i'])
+    raise ValueError(f"Unknown password scheme {scheme!r}")
+
+
+def _format(scheme, params, salt, derived):
+    return f"{scheme}${','.join(f'{key}={value}' for key, value in params.items())}${_b64(salt)}${_b64(derived)}"
+
+
+def _parse(stored):
+    scheme, params, salt, derived = stored.split('$')
+    return scheme, {key: int(value) for key, value in (pair.split('=') for pair in params.split(','))}, _unb64(salt), _unb64(derived)
+
+
+def is_hashed(stored):
+    return stored.startswith((SCRYPT + '$', PBKDF2 + '$'))
+
+
+# module level so a process pool can pickle them
+
+def _hash(scheme, params, password):
+    salt = os.urandom(16)
+    return _format(scheme, params, salt, _derive(scheme, params, password, salt))
+
+
+def _check(password, stored):
+    scheme, params, salt, derived = _parse(stored)
+    return hmac.compare_digest(_derive(scheme, params, password, salt), derived)
+
+
+class PasswordHasher:
+    def __init__(self, scheme=SCRYPT, params=None, pool='thread', workers=2, max_pending=16, timeout=30):
+        self.scheme = scheme
+        self.params = params or {'n': 2 ** 14, 'r': 8, 'p': 1}
+        self.pool = pool
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor = None
+        self._pid = None
+        self._lock = Lock()
+        self._pending = BoundedSemaphore(max_pending)
+
+    def _get_executor(self):
+        # created on first use in each process, a forked server worker must not share its parent's pool
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    executor_class = ProcessPoolExecutor if self.pool == 'process' else ThreadPoolExecutor
+                    self._executor = executor_class(max_workers=self.workers)
+                    self._pid = os.getpid()
+        return self._executor
+
+    def _run(self, fn, *args):
+        if self.workers <= 0:
+            return fn(*args)
+        if not self._pending.acquire(blocking=False):
+            raise PasswordPoolBusy("Too many password checks in progress")
+        try:
+            return self._get_executor().submit(fn, *args).result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise PasswordPoolBusy("Password check timed out") from None
+        finally:
+            self._pending.release()
+
+    def hash(self, password):
+        return self._run(_hash, self.scheme, self.params, password)
+
+    def needs_rehash(self, stored):
+        if not is_hashed(stored):
+            return True
+        scheme, params, _, _ = _parse(stored)
+        return scheme != self.scheme or params != self.params
+
+    def verify(self, password, stored):
+        """Returns ``(matches, needs_rehash)``; legacy plaintext is compared in constant time, no pool needed."""
+        if not is_hashed(stored):
+            return hmac.compare_digest(password.encode(), stored.encode()), True
+        return self._run(_check, password, stored), self.needs_rehash(stored)
+
+    def shutdown(self):
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = self._pid = None
+
+
+password_hasher = PasswordHasher()
+
+
+def configure_password_hasher(app):
+    config = app.config
+    password_hasher.scheme = config['PASSWORD_SCHEME']
+    if password_hasher.scheme == SCRYPT:
+        password_hasher.params = {'n': config['PASSWORD_SCRYPT_N'], 'r': config['PASSWORD_SCRYPT_R'],
+                                  'p': config['PASSWORD_SCRYPT_P']}
+    elif password_hasher.scheme == PBKDF2:
+        password_hasher.params = {'i': config['PASSWORD_PBKDF2_ITERATIONS']}
+    else:
+        raise ValueError(f"Unknown PASSWORD_SCHEME {password_hasher.scheme!r}")
+    password_hasher.pool = config['PASSWORD_POOL']
+    password_hasher.workers = config['PASSWORD_WORKERS']
+    password_hasher.max_pending = config['PASSWORD_MAX_PENDING']
+    password_hasher._pending = BoundedSemaphore(max(config['PASSWORD_MAX_PENDING'], 1))
+    password_hasher.timeout = config['PASSWORD_TIMEOUT_SECONDS']
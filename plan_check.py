@@ -0,0 +1,218 @@
+"""Check that the queries the routes run use indexes.
+
+``check_routes(app)`` seeds a small database, drives the real routes
+through the Flask test client and runs every captured statement through
+EXPLAIN QUERY PLAN with its parameters. A plain ``SCAN <table>``, an
+automatic index or a sort of a whole order history or job queue is a
+finding. Used by tests/test_query_plans.py and ``python -m
+benchmarks.query_plans``; SQLite only.
+"""
+from contextlib import contextmanager
+from datetime import time as dtime
+
+from sqlalchemy import event
+
+from models import db, User, UserType, Customer, Restaurant, DeliveryArea, MenuItem, Order, OrderItem
+
+# reads every row on purpose: the one-row Platform balance, and the delivery index rebuild, which
+# runs before the routes are driven
+ALLOWED_SCANS = {'SCAN Platform'}
+# tables that grow without bound, ORDER BY on them must come from an index
+INDEX_ORDERED = ('Orders', 'Jobs')
+
+RESTAURANT_USER, CUSTOMER_USER, PASSWORD = 1, 2, 'secret'
+# more than a page, so the history pages have a cursor and the keyset predicate is part of the plan
+HISTORY = 30
+
+
+def seed():
+    db.session.add_all([
+        # a legacy plaintext password, the login rehashes it
+        User(UserID=RESTAURANT_USER, EmailAddress='restaurant@plans', Password=PASSWORD, UserType=UserType.Restaurant),
+        User(UserID=CUSTOMER_USER, EmailAddress='customer@plans', Password=PASSWORD, UserType=UserType.Customer),
+    ])
+    db.session.add(Customer(UserID=CUSTOMER_USER, FirstName='Plan', LastName='Check', Address='Hauptstr. 1',
+                            PostNumber='47051', Balance=10 ** 6))
+    db.session.add(Restaurant(RestaurantID=1, UserID=RESTAURANT_USER, Name='Pizzeria Plan', Address='Hauptstr. 2',
+                              PostalCode='47051', Description='pizza and pasta', OpenTime=dtime(0), CloseTime=dtime(0)))
+    db.session.add(DeliveryArea(RestaurantID=1, PostalCode='47051'))
+    db.session.add_all([
+        MenuItem(MenuItemID=i, RestaurantID=1, Name=f'Pizza {i}', Description='tomato', Price=8, Category='Pizza')
+        for i in range(1, 11)
+    ])
+    for i in range(1, HISTORY + 1):
+        order = Order(CustomerID=CUSTOMER_USER, RestaurantID=1, Status='Completed', TotalAmount=8, PlatformFee=1.2,
+                      RestaurantAmount=6.8)
+        order.order_items.append(OrderItem(MenuItemName='Pizza 1', MenuItemPrice=8, Quantity=1))
+        db.session.add(order)
+    db.session.commit()
+
+
+@contextmanager
+def capture(engine):
+    """Collect ``(statement, parameters)`` of everything ``engine`` runs inside the block."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')):
+            # an executemany passes a list of rows, unless insertmanyvalues sends it one row at a time
+            statements.append((statement, parameters[0] if executemany and isinstance(parameters, list) else parameters))
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def full_scans(connection, statement, parameters):
+    rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+    # sorting a cart or a page of search hits is fine, sorting every order or job is not
+    unbounded = any(f'FROM "{table}"' in statement for table in INDEX_ORDERED)
+    return [
+        detail for detail in (row[-1] for row in rows)
+        if (detail.startswith('SCAN ') and ' USING ' not in detail and 'VIRTUAL TABLE' not in detail
+            and detail not in ALLOWED_SCANS)
+        or 'AUTOMATIC' in detail
+        # order histories and the job claim must read in index order instead of sorting every match
+        or (unbounded and 'TEMP B-TREE FOR ORDER BY' in detail)
+    ]
+
+
+def _log_in(client, user_id, user_type):
+    from auth import principal_cache
+
+    # a cold principal cache, so the principal load is part of the plans
+    principal_cache.delete(user_id)
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+        session['user_type'] = user_type.value
+
+
+def _expect(response, *statuses):
+    assert response.status_code in statuses, f"{response.request.path}: {response.status_code}"
+    return response
+
+
+def route_steps(client):
+    """``(name, step)`` pairs, each step makes the requests of one route (or runs the job worker)."""
+    from cache import menu_cache
+    from jobs import job_queue
+
+    state = {}
+
+    def customer(request):
+        def step():
+            _log_in(client, CUSTOMER_USER, UserType.Customer)
+            return request()
+        return step
+
+    def restaurant(request):
+        def step():
+            _log_in(client, RESTAURANT_USER, UserType.Restaurant)
+            return request()
+        return step
+
+    def orders():
+        state['orders_next'] = _expect(client.get('/orders/page'), 200).get_json()['next_url']
+
+    def restaurant_orders():
+        state['restaurant_next'] = _expect(client.get('/restaurant_orders/page?restaurant_id=1'), 200).get_json()['next_url']
+
+    def create_order():
+        _expect(client.post('/api/cart/items/1', json={'quantity': 2}), 200)
+        _expect(client.post('/create_order', data={'note': ''}), 302)
+        with client.application.app_context():
+            state['order_id'] = db.session.execute(db.select(db.func.max(Order.OrderID))).scalar()
+
+    def run_jobs():
+        with client.application.app_context():
+            while job_queue.run_once():
+                pass
+
+    def restaurant_menu():
+        # a cold menu cache, so the menu load is part of the plans
+        menu_cache.invalidate(1)
+        _expect(client.get('/menu?restaurant_id=1'), 200)
+
+    def edit_item():
+        _expect(client.get('/restaurant_edit_item/1/6'), 200)
+        _expect(client.post('/restaurant_edit_item/1/6', data={
+            'item_name': 'Pizza Funghi', 'item_description': 'mushrooms', 'item_price': '9'}), 302)
+
+    def delete_item_form():
+        _expect(client.get('/restaurant_delete_item/1'), 200)
+        _expect(client.post('/restaurant_delete_item/1', data={'delete_items': ['8']}), 302)
+
+    return [
+        ('login', lambda: _expect(client.post('/login', data={'email': 'customer@plans', 'password': PASSWORD}), 302)),
+        ('home', customer(lambda: _expect(client.get('/'), 200))),
+        ('restaurants', customer(lambda: _expect(client.get('/restaurants'), 200))),
+        ('api_restaurants', customer(lambda: _expect(client.get('/api/restaurants'), 200))),
+        ('api_search', customer(lambda: _expect(client.get('/api/search?q=pizza+tom'), 200, 501))),
+        ('customer_menu', customer(lambda: _expect(client.get('/restaurant/1'), 200))),
+        ('add_to_cart', customer(lambda: _expect(client.get('/add_to_cart/2'), 302))),
+        ('api_cart_item', customer(lambda: _expect(client.put('/api/cart/items/2', json={'quantity': 3}), 200))),
+        ('remove_from_cart', customer(lambda: _expect(client.get('/remove_from_cart/2'), 302))),
+        ('cart', customer(lambda: _expect(client.get('/cart'), 200))),
+        ('api_cart', customer(lambda: _expect(client.get('/api/cart'), 200))),
+        ('create_order', customer(create_order)),
+        ('orders', customer(lambda: _expect(client.get('/orders'), 200))),
+        ('orders_page', customer(orders)),
+        ('orders_page, next', customer(lambda: _expect(client.get(state['orders_next']), 200))),
+        ('balance', customer(lambda: _expect(client.get('/balance'), 200))),
+        ('restaurant_dashboard', restaurant(lambda: _expect(client.get('/restaurant_dashboard'), 200))),
+        ('restaurant_orders', restaurant(lambda: _expect(client.get('/restaurant_orders?restaurant_id=1'), 200))),
+        ('restaurant_orders_page', restaurant(restaurant_orders)),
+        ('restaurant_orders_page, next', restaurant(lambda: _expect(client.get(state['restaurant_next']), 200))),
+        ('accept_or_reject_order', restaurant(lambda: _expect(
+            client.post(f"/accept_or_reject_order/{state['order_id']}/accept"), 302))),
+        ('job worker: accept', run_jobs),
+        ('mark_as_done', restaurant(lambda: _expect(client.post(f"/mark_as_done/{state['order_id']}"), 302))),
+        ('job worker: mark as done', run_jobs),
+        ('metrics', lambda: _expect(client.get('/metrics'), 200)),
+        ('metrics_jobs', lambda: _expect(client.get('/metrics/jobs'), 200)),
+        ('api_menu_export', restaurant(lambda: _expect(client.get('/api/menu/export?format=csv'), 200).get_data())),
+        ('api_menu_import', restaurant(lambda: _expect(client.post('/api/menu/import', json=[
+            {'MenuItemID': 3, 'Name': 'Pizza 3', 'Price': '8.50'}, {'Name': 'Calzone', 'Price': '9'},
+        ]), 200))),
+        ('api_menu_items, patch', restaurant(lambda: _expect(
+            client.patch('/api/menu/items', json=[{'MenuItemID': 4, 'IsAvailable': False}]), 200))),
+        ('api_menu_items, delete', restaurant(lambda: _expect(
+            client.delete('/api/menu/items', json={'ids': [5]}), 200))),
+        ('restaurant_menu', restaurant(restaurant_menu)),
+        ('restaurant_add_item', restaurant(lambda: _expect(client.post('/add_item/1', data={
+            'item_name': 'Focaccia', 'item_description': 'bread', 'item_price': '4'}), 302))),
+        ('restaurant_edit_item', restaurant(edit_item)),
+        ('update_item', restaurant(lambda: _expect(client.post('/update_item/7', data={
+            'name': 'Pizza Diavola', 'description': 'spicy', 'price': '10'}), 302))),
+        ('restaurant_delete_item', restaurant(delete_item_form)),
+        ('delete_items', restaurant(lambda: _expect(client.post('/delete_items/1', data={'delete_items': ['9']}), 302))),
+        # last: a new restaurant invalidates the delivery index, whose rebuild reads every row
+        ('sign_up_customer', lambda: _expect(client.post('/sign_up_customer', data={
+            'first_name': 'New', 'last_name': 'Customer', 'email': 'new-customer@plans', 'password': PASSWORD,
+            'confirm_password': PASSWORD, 'address': 'Hauptstr. 3', 'post_number': '47051'}), 302)),
+        ('sign_up_restaurant', lambda: _expect(client.post('/sign-up-restaurant', data={
+            'email': 'new-restaurant@plans', 'password': PASSWORD, 'restaurant_name': 'Sushi Plan',
+            'address': 'Hauptstr. 4', 'postal_code': '47051', 'open_time': '11:00', 'close_time': '22:00',
+            'description': 'sushi', 'delivery_areas': '47051, 47057'}), 302)),
+    ]
+
+
+def check_routes(app):
+    """Seed the database, drive every route step and return ``[(step, statement, scans)]`` for all statements."""
+    from delivery_index import delivery_index
+
+    results = []
+    with app.app_context():
+        seed()
+        delivery_index.rebuild()
+        engine = db.engine
+    client = app.test_client()
+    for name, step in route_steps(client):
+        with capture(engine) as statements:
+            step()
+        with engine.connect() as connection:
+            for statement, parameters in statements:
+                results.append((name, statement, full_scans(connection, statement, parameters)))
+    return results
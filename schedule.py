@@ -0,0 +1,148 @@
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import time as dtime, timedelta
+
+DAY = 24 * 3600
+WEEK = 7 * DAY
+
+
+def time_seconds(value):
+    """Seconds since midnight of a ``time`` or an "HH:MM[:SS]" string, "24:00" is the end of the day."""
+    if isinstance(value, dtime):
+        return value.hour * 3600 + value.minute * 60 + value.second
+    parts = [int(part) for part in value.strip().split(':')]
+    hours, minutes, seconds = (parts + [0, 0])[:3]
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def week_seconds(when):
+    """Position of a datetime in the week, 0 is Monday midnight."""
+    return when.weekday() * DAY + when.hour * 3600 + when.minute * 60 + when.second
+
+
+def day_spans(day, open_time, close_time):
+    """Week-second spans [start, end) for opening hours on weekday ``day`` (0 is Monday).
+
+    A closing time before the opening time runs past midnight into the next
+    day, equal times mean open around the clock. Spans past Sunday midnight
+    wrap around to Monday.
+    """
+    opens, close = time_seconds(open_time), time_seconds(close_time)
+    start = day * DAY + opens
+    if close > opens:
+        end = day * DAY + close
+    elif close == opens:
+        end = start + DAY
+    else:
+        end = (day + 1) * DAY + close
+    if end <= WEEK:
+        return [(start, end)]
+    return [(start, WEEK), (0, end - WEEK)]
+
+
+def _merge(spans):
+    merged = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _changes(merged):
+    # points of the week where the restaurant opens or closes, a span ending
+    # Sunday midnight continues into one starting Monday midnight
+    if merged == [(0, WEEK)]:
+        return []
+    wraps = merged[0][0] == 0 and merged[-1][1] == WEEK
+    changes = set()
+    for start, end in merged:
+        if not (start == 0 and wraps):
+            changes.add(start)
+        if not (end == WEEK and wraps):
+            changes.add(end % WEEK)
+    return sorted(changes)
+
+
+class Schedule:
+    """Weekly opening hours of many restaurants, compiled for "who is open at t" lookups.
+
+    The week is cut into buckets of ``bucket_seconds``. Each bucket holds the
+    restaurants open for all of it and the few spans that start or end inside
+    it, so a lookup is one set test per candidate plus a scan of a handful of
+    partial spans, whatever the number of restaurants.
+    """
+
+    def __init__(self, spans_by_restaurant, bucket_seconds=3600):
+        self.bucket_seconds = bucket_seconds
+        buckets = -(-WEEK // bucket_seconds)
+        always = [set() for _ in range(buckets)]
+        partial = [[] for _ in range(buckets)]
+        self._changes = {}
+
+        for restaurant_id, spans in spans_by_restaurant.items():
+            merged = _merge(spans)
+            self._changes[restaurant_id] = _changes(merged)
+            for start, end in merged:
+                # buckets entirely inside the span, the last bucket of the week may be shorter
+                full_from = -(-start // bucket_seconds)
+                full_to = buckets if end == WEEK else end // bucket_seconds
+                for bucket in range(full_from, full_to):
+                    always[bucket].add(restaurant_id)
+                for bucket in {start // bucket_seconds, (end - 1) // bucket_seconds}:
+                    if not full_from <= bucket < full_to:
+                        partial[bucket].append((start, end, restaurant_id))
+
+        self._always = [frozenset(ids) for ids in always]
+        self._partial = [tuple(spans) for spans in partial]
+
+    def __len__(self):
+        return len(self._changes)
+
+    def _open_now(self, when):
+        now = week_seconds(when)
+        bucket = now // self.bucket_seconds
+        return self._always[bucket], {restaurant_id for start, end, restaurant_id in self._partial[bucket] if start <= now < end}
+
+    def is_open(self, restaurant_id, when):
+        always, partial = self._open_now(when)
+        return restaurant_id in always or restaurant_id in partial
+
+    def open_among(self, restaurant_ids, when):
+        """The restaurant ids open at ``when``, in the given order; restaurants without hours are closed."""
+        always, partial = self._open_now(when)
+        return [restaurant_id for restaurant_id in restaurant_ids if restaurant_id in always or restaurant_id in partial]
+
+    def next_change(self, restaurant_ids, when):
+        """The first moment after ``when`` at which one of the restaurants opens or closes, None if none ever does."""
+        now = week_seconds(when)
+        delta = None
+        for restaurant_id in restaurant_ids:
+            changes = self._changes.get(restaurant_id)
+            if not changes:
+                continue
+            i = bisect_right(changes, now)
+            seconds = (changes[i] if i < len(changes) else changes[0] + WEEK) - now
+            if delta is None or seconds < delta:
+                delta = seconds
+        if delta is None:
+            return None
+        return when.replace(microsecond=0) + timedelta(seconds=delta)
+
+
+def compile_schedule(opening_hours, daily_hours, bucket_seconds=3600):
+    """Build a Schedule from OpeningHour rows and each restaurant's OpenTime/CloseTime.
+
+    ``opening_hours`` yields (RestaurantID, DayOfWeek, OpenTime, CloseTime).
+    Restaurants with OpeningHour rows are open exactly then, days without a
+    row are closed. The others keep their daily ``daily_hours`` (a dict of
+    RestaurantID -> (OpenTime, CloseTime)) on every day of the week.
+    """
+    spans = defaultdict(list)
+    for restaurant_id, day, open_time, close_time in opening_hours:
+        spans[restaurant_id].extend(day_spans(day, open_time, close_time))
+    for restaurant_id, (open_time, close_time) in daily_hours.items():
+        if restaurant_id not in spans:
+            spans[restaurant_id] = [span for day in range(7) for span in day_spans(day, open_time, close_time)]
+    return Schedule(spans, bucket_seconds)
@@ -0,0 +1,223 @@
+"""Full-text search over restaurants and menu items, backed by SQLite FTS5.
+
+RestaurantSearch indexes Restaurants.Name/Description, keyed by RestaurantID,
+and is ranked with bm25(); it is small enough for that.
+
+Menu items are searched among the restaurants that deliver to the customer
+and are open now, a few dozen of the whole corpus. Two contentless tables
+index them: MenuItemNameSearch (Name) and MenuItemSearch (Name, Description,
+Category). Their rowid is ``RestaurantID << 32 | MenuItemID``, so each
+restaurant's items are one contiguous rowid range, and a search runs the
+MATCH once per candidate restaurant, bounded to its range. That reads only
+the candidate restaurants' part of each doclist, however common the word is
+in the rest of the corpus. Every row also carries an ``r<RestaurantID>``
+token: with several words, FTS5 stops an AND at the end of the restaurant's
+token list instead of looking past the range for the next row that has all
+the words.
+
+Results come in two tiers, items whose name matches first, then items that
+match in any column, each in restaurant order. bm25() is not used for menu
+items, it computes its IDF over every matching row of the whole index for
+each query. UNION ALL stops at the limit, so a common word is answered from
+the first few restaurants.
+
+Triggers keep all three tables in sync, so every write path (ORM, bulk Core
+statements, raw SQL) updates them in the same transaction.
+"""
+import json
+import re
+
+from sqlalchemy import event, select, text
+
+from delivery_index import delivery_index
+from models import db, MenuItem
+
+RESTAURANT_WEIGHTS = (10.0, 1.0)
+MAX_TERMS = 8
+# longest prefix in the prefix index, a longer prefix is shortened rather than merging every matching term
+MAX_PREFIX = 6
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+_TOKENIZE = "tokenize='unicode61 remove_diacritics 2'"
+_MENU_ITEM_KEY = "new.RestaurantID * 4294967296 + new.MenuItemID"
+_OLD_MENU_ITEM_KEY = "old.RestaurantID * 4294967296 + old.MenuItemID"
+
+# also created by the search_index migration, for databases set up with db.create_all()
+SCHEMA = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS RestaurantSearch USING fts5(
+        Name, Description, content='', {_TOKENIZE}, prefix='2 3 4 5 6')""",
+    """CREATE TRIGGER IF NOT EXISTS RestaurantSearch_insert AFTER INSERT ON Restaurants BEGIN
+        INSERT INTO RestaurantSearch(rowid, Name, Description) VALUES (new.RestaurantID, new.Name, new.Description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS RestaurantSearch_delete AFTER DELETE ON Restaurants BEGIN
+        INSERT INTO RestaurantSearch(RestaurantSearch, rowid, Name, Description)
+        VALUES ('delete', old.RestaurantID, old.Name, old.Description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS RestaurantSearch_update AFTER UPDATE OF Name, Description ON Restaurants BEGIN
+        INSERT INTO RestaurantSearch(RestaurantSearch, rowid, Name, Description)
+        VALUES ('delete', old.RestaurantID, old.Name, old.Description);
+        INSERT INTO RestaurantSearch(rowid, Name, Description) VALUES (new.RestaurantID, new.Name, new.Description);
+    END""",
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS MenuItemNameSearch USING fts5(
+        Name, Restaurant, content='', {_TOKENIZE}, prefix='2 3 4 5 6')""",
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS MenuItemSearch USING fts5(
+        Name, Description, Category, Restaurant, content='', {_TOKENIZE}, prefix='2 3 4 5 6')""",
+    f"""CREATE TRIGGER IF NOT EXISTS MenuItemSearch_insert AFTER INSERT ON MenuItems BEGIN
+        INSERT INTO MenuItemNameSearch(rowid, Name, Restaurant) VALUES ({_MENU_ITEM_KEY}, new.Name, 'r' || new.RestaurantID);
+        INSERT INTO MenuItemSearch(rowid, Name, Description, Category, Restaurant)
+        VALUES ({_MENU_ITEM_KEY}, new.Name, new.Description, new.Category, 'r' || new.RestaurantID);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS MenuItemSearch_delete AFTER DELETE ON MenuItems BEGIN
+        INSERT INTO MenuItemNameSearch(MenuItemNameSearch, rowid, Name, Restaurant)
+        VALUES ('delete', {_OLD_MENU_ITEM_KEY}, old.Name, 'r' || old.RestaurantID);
+        INSERT INTO MenuItemSearch(MenuItemSearch, rowid, Name, Description, Category, Restaurant)
+        VALUES ('delete', {_OLD_MENU_ITEM_KEY}, old.Name, old.Description, old.Category, 'r' || old.RestaurantID);
+    END""",
+    # price, availability and Version changes leave the index alone
+    f"""CREATE TRIGGER IF NOT EXISTS MenuItemSearch_update AFTER UPDATE OF Name, Description, Category, RestaurantID
+    ON MenuItems BEGIN
+        INSERT INTO MenuItemNameSearch(MenuItemNameSearch, rowid, Name, Restaurant)
+        VALUES ('delete', {_OLD_MENU_ITEM_KEY}, old.Name, 'r' || old.RestaurantID);
+        INSERT INTO MenuItemSearch(MenuItemSearch, rowid, Name, Description, Category, Restaurant)
+        VALUES ('delete', {_OLD_MENU_ITEM_KEY}, old.Name, old.Description, old.Category, 'r' || old.RestaurantID);
+        INSERT INTO MenuItemNameSearch(rowid, Name, Restaurant) VALUES ({_MENU_ITEM_KEY}, new.Name, 'r' || new.RestaurantID);
+        INSERT INTO MenuItemSearch(rowid, Name, Description, Category, Restaurant)
+        VALUES ({_MENU_ITEM_KEY}, new.Name, new.Description, new.Category, 'r' || new.RestaurantID);
+    END""",
+]
+
+# index rows written while the triggers were missing
+BACKFILL = [
+    "INSERT INTO RestaurantSearch(rowid, Name, Description) SELECT RestaurantID, Name, Description FROM Restaurants",
+    """INSERT INTO MenuItemNameSearch(rowid, Name, Restaurant)
+       SELECT RestaurantID * 4294967296 + MenuItemID, Name, 'r' || RestaurantID FROM MenuItems
+       ORDER BY RestaurantID, MenuItemID""",
+    """INSERT INTO MenuItemSearch(rowid, Name, Description, Category, Restaurant)
+       SELECT RestaurantID * 4294967296 + MenuItemID, Name, Description, Category, 'r' || RestaurantID FROM MenuItems
+       ORDER BY RestaurantID, MenuItemID""",
+]
+
+# merge the index into one b-tree per table after a bulk load, a lookup then seeks one segment instead of dozens
+OPTIMIZE = [
+    "INSERT INTO RestaurantSearch(RestaurantSearch) VALUES ('optimize')",
+    "INSERT INTO MenuItemNameSearch(MenuItemNameSearch) VALUES ('optimize')",
+    "INSERT INTO MenuItemSearch(MenuItemSearch) VALUES ('optimize')",
+]
+
+DROP = [
+    "DROP TRIGGER IF EXISTS MenuItemSearch_update",
+    "DROP TRIGGER IF EXISTS MenuItemSearch_delete",
+    "DROP TRIGGER IF EXISTS MenuItemSearch_insert",
+    "DROP TABLE IF EXISTS MenuItemSearch",
+    "DROP TABLE IF EXISTS MenuItemNameSearch",
+    "DROP TRIGGER IF EXISTS RestaurantSearch_update",
+    "DROP TRIGGER IF EXISTS RestaurantSearch_delete",
+    "DROP TRIGGER IF EXISTS RestaurantSearch_insert",
+    "DROP TABLE IF EXISTS RestaurantSearch",
+]
+
+
+# db.create_all() knows nothing of virtual tables and triggers, add them on SQLite
+@event.listens_for(db.metadata, 'after_create')
+def _create_search_index(target, connection, **kw):
+    if connection.dialect.name == 'sqlite':
+        for statement in SCHEMA:
+            connection.exec_driver_sql(statement)
+
+
+@event.listens_for(db.metadata, 'before_drop')
+def _drop_search_index(target, connection, **kw):
+    if connection.dialect.name == 'sqlite':
+        for statement in DROP:
+            connection.exec_driver_sql(statement)
+
+
+def rebuild_search_index(connection):
+    """Drop, recreate and refill the search index, e.g. after a migration recreated an indexed table."""
+    for statement in DROP + SCHEMA + BACKFILL + OPTIMIZE:
+        connection.exec_driver_sql(statement)
+
+
+def include_object(obj, name, type_, reflected, compare_to):
+    """Alembic autogenerate filter, the FTS tables and their shadow tables are not in the models."""
+    return not (type_ == 'table' and reflected
+                and name.startswith(('RestaurantSearch', 'MenuItemNameSearch', 'MenuItemSearch')))
+
+
+def match_terms(query):
+    """FTS5 terms for user input: the words typed so far, the last one as a prefix.
+
+    Words are quoted, so FTS5 operators and punctuation in the input are
+    plain text. Returns an empty list when there is nothing to search for.
+    """
+    words = TOKEN_RE.findall(query.lower())[:MAX_TERMS]
+    if not words:
+        return []
+    *complete, last = words
+    return [f'"{word}"' for word in complete] + [f'"{last[:MAX_PREFIX]}"*']
+
+
+def search_available(session):
+    return session.get_bind().dialect.name == 'sqlite'
+
+
+def _tier(table, bounded):
+    # one MATCH per candidate restaurant (the outer json_each row), limited to that restaurant's rowid range
+    match = "'(' || :match || ') AND Restaurant: r' || candidate.value" if bounded else ":match"
+    return f"""
+        SELECT hit.rowid FROM json_each(:restaurant_ids) AS candidate CROSS JOIN {table} AS hit
+        ON hit.{table} MATCH {match}
+        AND hit.rowid BETWEEN candidate.value * 4294967296 AND candidate.value * 4294967296 + 4294967295"""
+
+
+def _menu_item_hits(bounded):
+    return text(f"""
+        SELECT rowid FROM ({_tier('MenuItemNameSearch', bounded)})
+        UNION ALL
+        SELECT rowid FROM ({_tier('MenuItemSearch', bounded)})
+        LIMIT :limit
+    """)
+
+
+# the restaurant token only pays off when an AND of several words could skip past the range
+MENU_ITEM_HITS = {bounded: _menu_item_hits(bounded) for bounded in (False, True)}
+
+
+def search(session, query, postal_code, now, limit=20):
+    """Restaurants and menu items matching ``query``, among restaurants delivering to ``postal_code``
+    that are open at ``now``.
+
+    Returns ``(restaurants, items)``: RestaurantSummary tuples, best match
+    first, and ``(MenuItem, RestaurantSummary)`` pairs, name matches first
+    and items of the matching restaurants before the others.
+    """
+    terms = match_terms(query)
+    open_restaurants = {summary.RestaurantID: summary
+                        for summary in delivery_index.open_restaurants_for(postal_code, now)}
+    if not terms or not open_restaurants:
+        return [], []
+    expression = ' '.join(terms)
+
+    # the restaurant index is small, ranking every match and dropping the closed ones is cheaper than
+    # a MATCH per open restaurant
+    ranked = session.execute(text(f"""
+        SELECT rowid FROM RestaurantSearch WHERE RestaurantSearch MATCH :match
+        ORDER BY bm25(RestaurantSearch, {', '.join(map(str, RESTAURANT_WEIGHTS))})
+    """), {"match": expression}).scalars()
+    restaurant_ids = [restaurant_id for restaurant_id in ranked if restaurant_id in open_restaurants][:limit]
+
+    matched = set(restaurant_ids)
+    candidates = restaurant_ids + [restaurant_id for restaurant_id in open_restaurants if restaurant_id not in matched]
+    # an item of the first tier shows up again in the second, so up to twice the limit are needed
+    keys = session.execute(MENU_ITEM_HITS[len(terms) > 1], {
+        # the words must not match the restaurant tokens
+        "match": f"- {{Restaurant}}: ({expression})", "restaurant_ids": json.dumps(candidates), "limit": 2 * limit,
+    }).scalars().all()
+    item_ids = list(dict.fromkeys(key & 0xFFFFFFFF for key in keys))[:limit]
+
+    items = {item.MenuItemID: item for item in session.execute(
+        select(MenuItem).where(MenuItem.MenuItemID.in_(item_ids))
+    ).scalars()} if item_ids else {}
+    restaurants = [open_restaurants[restaurant_id] for restaurant_id in restaurant_ids]
+    return restaurants, [(items[item_id], open_restaurants[items[item_id].RestaurantID])
+                         for item_id in item_ids if item_id in items]
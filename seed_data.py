@@ -0,0 +1,273 @@
+"""Generate a large synthetic dataset for benchmarks.
+
+Restaurants, menu items, delivery areas, customers and historical orders
+are generated from a fixed seed, so two runs with the same arguments
+produce identical rows. Popularity is skewed the way real marketplaces
+are: restaurants and dishes are drawn from a Zipf distribution, and order
+timestamps cluster around lunch and dinner.
+
+Rows are written with chunked executemany inserts on one connection,
+bypassing the ORM. Secondary indexes are dropped during the load and
+rebuilt afterwards, and on SQLite the load runs with synchronous=OFF.
+IDs continue after the highest existing ones, so the data can be added to
+a database that already has some. Point DATABASE_URL at the target
+database, the default is the development database in instance/.
+
+Usage: python seed_data.py [--restaurants 100000] [--items 30] [--customers 200000]
+           [--orders 1000000] [--seed 1]
+"""
+import argparse
+import bisect
+import itertools
+import random
+import time
+from array import array
+from datetime import datetime, time as dtime, timedelta
+
+from sqlalchemy import func, select
+
+from app import app
+from ledger import reconcile_restaurant_balances
+from models import db, User, UserType, Customer, Restaurant, MenuItem, DeliveryArea, Order, OrderItem, PlatformFee
+
+CUISINES = ["Pizzeria", "Grill", "Sushi Bar", "Burger", "Curry House", "Trattoria", "Taqueria", "Imbiss",
+            "Noodle Bar", "Döner", "Bistro", "Vegan Kitchen"]
+STREETS = ["Berliner Str.", "Hauptstr.", "Kaiserallee", "Mozartstr.", "Goethestr.", "Schillerstr.",
+           "Lindenweg", "Marktplatz", "Rheinstr.", "Bismarckstr."]
+DISHES = ["Margherita Pizza", "Balkan Burger", "Spaghetti Carbonara", "Grilled Chicken", "Caesar Salad",
+          "BBQ Ribs", "Tuna Salad", "Chicken Alfredo", "Beef Lasagna", "Falafel Wrap", "Pad Thai",
+          "Salmon Nigiri", "Chicken Tikka Masala", "Schnitzel", "Currywurst", "Veggie Bowl"]
+CATEGORIES = ["Starters", "Mains", "Sides", "Desserts", "Drinks"]
+FIRST_NAMES = ["Anna", "Ben", "Clara", "David", "Emma", "Felix", "Hannah", "Jonas", "Lena", "Lukas",
+               "Marie", "Noah", "Sophie", "Tim"]
+LAST_NAMES = ["Müller", "Schmidt", "Schneider", "Fischer", "Weber", "Meyer", "Wagner", "Becker", "Hoffmann"]
+
+# relative order volume per hour of day, peaks at lunch and dinner
+HOUR_WEIGHTS = [1, 0, 0, 0, 0, 0, 1, 2, 3, 3, 4, 9, 14, 11, 5, 4, 5, 9, 15, 16, 12, 7, 4, 2]
+
+
+def zipf_cum_weights(n, s):
+    """Cumulative weights of ranks 1..n under a Zipf distribution with exponent ``s``."""
+    return list(itertools.accumulate(1 / rank ** s for rank in range(1, n + 1)))
+
+
+def chunked(rows, size):
+    iterator = iter(rows)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def next_id(connection, column):
+    return (connection.execute(select(func.max(column))).scalar() or 0) + 1
+
+
+class Generator:
+    def __init__(self, args, connection):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.postal_codes = [str(10000 + 7 * i) for i in range(args.postal_codes)]
+        self.first_user = next_id(connection, User.UserID)
+        self.first_restaurant = next_id(connection, Restaurant.RestaurantID)
+        self.first_item = next_id(connection, MenuItem.MenuItemID)
+        self.first_area = next_id(connection, DeliveryArea.ID)
+        self.first_order = next_id(connection, Order.OrderID)
+        self.first_order_item = next_id(connection, OrderItem.OrderItemID)
+        self.first_fee = next_id(connection, PlatformFee.FeeID)
+        # customers get the user ids right after the restaurant accounts
+        self.first_customer = self.first_user + args.restaurants
+        # filled while generating menus, needed to price the orders
+        self.menu_start = array('q')
+        self.menu_size = array('l')
+        self.prices = array('d')
+        self.open_hours = []
+
+    def restaurant_users(self):
+        for i in range(self.args.restaurants):
+            yield {"UserID": self.first_user + i, "EmailAddress": f"seed-restaurant{self.first_restaurant + i}@lieferspatz.test",
+                   "Password": "password", "UserType": UserType.Restaurant}
+
+    def restaurants(self):
+        rng = self.rng
+        for i in range(self.args.restaurants):
+            open_hour, close_hour = rng.randint(6, 11), rng.randint(18, 23)
+            self.open_hours.append((open_hour, close_hour))
+            restaurant_id = self.first_restaurant + i
+            yield {
+                "RestaurantID": restaurant_id, "UserID": self.first_user + i,
+                "Name": f"{rng.choice(CUISINES)} {restaurant_id}",
+                "Address": f"{rng.choice(STREETS)} {rng.randint(1, 120)}",
+                "PostalCode": self.postal_codes[rng.randrange(len(self.postal_codes))],
+                "Description": "Generated by seed_data.py",
+                "OpenTime": dtime(open_hour), "CloseTime": dtime(close_hour),
+            }
+
+    def delivery_areas(self):
+        # restaurants deliver to a run of neighbouring postal codes
+        rng, area_id = self.rng, self.first_area
+        for i in range(self.args.restaurants):
+            size = min(len(self.postal_codes), max(1, int(rng.gauss(self.args.areas, self.args.areas / 3))))
+            start = rng.randrange(len(self.postal_codes))
+            for k in range(size):
+                yield {"ID": area_id, "RestaurantID": self.first_restaurant + i,
+                       "PostalCode": self.postal_codes[(start + k) % len(self.postal_codes)]}
+                area_id += 1
+
+    def menu_items(self):
+        rng, item_id = self.rng, self.first_item
+        for i in range(self.args.restaurants):
+            size = max(3, int(rng.expovariate(1 / self.args.items)))
+            self.menu_start.append(item_id)
+            self.menu_size.append(size)
+            for k in range(size):
+                price = round(rng.uniform(2.5, 24.9), 2)
+                self.prices.append(price)
+                yield {
+                    "MenuItemID": item_id, "RestaurantID": self.first_restaurant + i,
+                    "Name": DISHES[(i + k) % len(DISHES)], "Description": "Generated by seed_data.py",
+                    "Price": price, "Category": CATEGORIES[k % len(CATEGORIES)], "IsAvailable": True,
+                }
+                item_id += 1
+
+    def customer_users(self):
+        for i in range(self.args.customers):
+            user_id = self.first_customer + i
+            yield {"UserID": user_id, "EmailAddress": f"seed-customer{user_id}@lieferspatz.test",
+                   "Password": "password", "UserType": UserType.Customer}
+
+    def customers(self):
+        rng = self.rng
+        for i in range(self.args.customers):
+            yield {
+                "UserID": self.first_customer + i, "FirstName": rng.choice(FIRST_NAMES),
+                "LastName": rng.choice(LAST_NAMES), "Address": f"{rng.choice(STREETS)} {rng.randint(1, 120)}",
+                "PostNumber": self.postal_codes[rng.randrange(len(self.postal_codes))], "Balance": 100.0,
+            }
+
+    def orders(self):
+        """Yield ``(order, order_items, platform_fee)`` for every historical order."""
+        args, rng = self.args, self.rng
+        # which restaurants are popular is random, how popular follows Zipf
+        by_rank = list(range(args.restaurants))
+        rng.shuffle(by_rank)
+        restaurant_weights = zipf_cum_weights(args.restaurants, args.zipf)
+        dish_weights = zipf_cum_weights(max(self.menu_size), args.zipf)
+        hour_weights = list(itertools.accumulate(HOUR_WEIGHTS))
+        first_day = args.end - timedelta(days=args.days)
+
+        order_item_id = self.first_order_item
+        for n in range(args.orders):
+            order_id = self.first_order + n
+            restaurant = by_rank[bisect.bisect(restaurant_weights, rng.random() * restaurant_weights[-1])]
+            size = self.menu_size[restaurant]
+            open_hour, close_hour = self.open_hours[restaurant]
+
+            # peak-hour timestamp within opening hours, microseconds keep keyset cursors unambiguous
+            hour = bisect.bisect(hour_weights, rng.random() * hour_weights[-1])
+            hour = min(max(hour, open_hour), close_hour - 1)
+            created_at = datetime.combine(first_day + timedelta(days=rng.randrange(args.days)), dtime(hour)) + \
+                timedelta(seconds=rng.randrange(3600), microseconds=rng.randint(1, 999999))
+
+            lines, total = [], 0.0
+            for _ in range(rng.choice((1, 1, 2, 2, 3, 4))):
+                k = bisect.bisect(dish_weights, rng.random() * dish_weights[size - 1])
+                price = self.prices[self.menu_start[restaurant] - self.first_item + k]
+                quantity = rng.choice((1, 1, 1, 2))
+                total += price * quantity
+                lines.append({"OrderItemID": order_item_id, "OrderID": order_id, "MenuItemName": DISHES[(restaurant + k) % len(DISHES)],
+                              "MenuItemPrice": price, "Quantity": quantity})
+                order_item_id += 1
+
+            total = round(total, 2)
+            fee = round(total * 0.15, 2)
+            order = {
+                "OrderID": order_id, "CustomerID": self.first_customer + rng.randrange(args.customers),
+                "RestaurantID": self.first_restaurant + restaurant,
+                "Status": 'Cancelled' if rng.random() < args.cancelled else 'Completed',
+                "TotalAmount": total, "PlatformFee": fee, "RestaurantAmount": round(total - fee, 2),
+                "Notes": None, "CreatedAt": created_at, "UpdatedAt": created_at + timedelta(minutes=rng.randint(15, 60)),
+            }
+            yield order, lines, {"FeeID": self.first_fee + n, "OrderID": order_id, "Amount": fee, "CreatedAt": created_at}
+
+
+def load(connection, table, rows, chunk_size):
+    start, count = time.perf_counter(), 0
+    for chunk in chunked(rows, chunk_size):
+        connection.execute(table.insert(), chunk)
+        count += len(chunk)
+    connection.commit()
+    elapsed = time.perf_counter() - start
+    print(f"{table.name:>14}: {count:>10} rows in {elapsed:6.1f} s ({count / max(elapsed, 1e-9):,.0f} rows/s)")
+
+
+def load_orders(connection, generator, chunk_size):
+    tables = (Order.__table__, OrderItem.__table__, PlatformFee.__table__)
+    start, counts = time.perf_counter(), [0, 0, 0]
+    for chunk in chunked(generator.orders(), chunk_size):
+        batches = ([order for order, _, _ in chunk], [line for _, lines, _ in chunk for line in lines],
+                   [fee for _, _, fee in chunk])
+        for i, (table, batch) in enumerate(zip(tables, batches)):
+            connection.execute(table.insert(), batch)
+            counts[i] += len(batch)
+    connection.commit()
+    elapsed = time.perf_counter() - start
+    for table, count in zip(tables, counts):
+        print(f"{table.name:>14}: {count:>10} rows in {elapsed:6.1f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--restaurants', type=int, default=1000)
+    parser.add_argument('--items', type=int, default=30, help="mean menu size, exponentially distributed")
+    parser.add_argument('--areas', type=int, default=8, help="mean delivery areas per restaurant")
+    parser.add_argument('--postal-codes', type=int, default=2000)
+    parser.add_argument('--customers', type=int, default=5000)
+    parser.add_argument('--orders', type=int, default=50000)
+    parser.add_argument('--days', type=int, default=90, help="order history spans this many days before --end")
+    parser.add_argument('--end', type=datetime.fromisoformat, default=datetime(2026, 1, 1))
+    parser.add_argument('--zipf', type=float, default=1.1, help="popularity skew of restaurants and dishes")
+    parser.add_argument('--cancelled', type=float, default=0.05, help="share of cancelled orders")
+    parser.add_argument('--chunk-size', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--keep-indexes', action='store_true', help="maintain indexes during the load")
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        engine = db.engine
+        tables = [User.__table__, Restaurant.__table__, MenuItem.__table__, DeliveryArea.__table__,
+                  Customer.__table__, Order.__table__, OrderItem.__table__, PlatformFee.__table__]
+        deferred = [] if args.keep_indexes else [index for table in tables for index in table.indexes]
+
+        start = time.perf_counter()
+        with engine.connect() as connection:
+            if engine.dialect.name == 'sqlite':
+                connection.exec_driver_sql('PRAGMA synchronous=OFF')
+            for index in deferred:
+                index.drop(connection, checkfirst=True)
+            connection.commit()
+
+            generator = Generator(args, connection)
+            load(connection, User.__table__, generator.restaurant_users(), args.chunk_size)
+            load(connection, Restaurant.__table__, generator.restaurants(), args.chunk_size)
+            load(connection, DeliveryArea.__table__, generator.delivery_areas(), args.chunk_size)
+            load(connection, MenuItem.__table__, generator.menu_items(), args.chunk_size)
+            load(connection, User.__table__, generator.customer_users(), args.chunk_size)
+            load(connection, Customer.__table__, generator.customers(), args.chunk_size)
+            load_orders(connection, generator, args.chunk_size)
+
+            index_start = time.perf_counter()
+            for index in deferred:
+                index.create(connection, checkfirst=True)
+            if engine.dialect.name == 'sqlite':
+                connection.exec_driver_sql('PRAGMA synchronous=NORMAL')
+                connection.exec_driver_sql('ANALYZE')
+            connection.commit()
+            print(f"{'indexes':>14}: rebuilt in {time.perf_counter() - index_start:6.1f} s")
+
+        # running restaurant balances start out as the sum of their completed orders
+        reconcile_restaurant_balances(fix=True)
+        print(f"Seeded in {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+"""Production entry point: N forked worker processes on one listening socket.
+
+    SECRET_KEY=... python serve.py --workers 4 --bind 0.0.0.0:8000 [--async-mode threading|eventlet|gevent]
+
+The app is imported once in the parent and forked, so workers share its
+code pages. Each worker serves the socket with werkzeug's threaded server,
+or eventlet/gevent when chosen (and installed). With more than one worker,
+Socket.IO messages go through a message queue -- a local hub process unless
+SOCKETIO_MESSAGE_QUEUE points elsewhere -- and /metrics values through
+METRICS_DIR, so every worker sees every room and counter. Sessions are signed
+cookies, any worker can read them as long as all share SECRET_KEY. Menu
+caches are per worker unless MENU_CACHE_URL (or a redis:// message queue)
+names a shared Redis, so their entries then expire after MENU_CACHE_TTL
+seconds (2 by default); carts must be in the database or in Redis.
+
+Long-polling clients need to reach the worker holding their Engine.IO
+session, so unless STICKY_SESSIONS is set (the load balancer pins clients to
+a worker) only the websocket transport is allowed. Workers that die are
+restarted; SIGTERM or SIGINT stops them all.
+"""
+import argparse
+import os
+import signal
+import socket
+import sys
+import tempfile
+import time
+
+# seconds a worker may show a menu another worker changed, unless the menu cache is shared
+MULTI_WORKER_MENU_CACHE_TTL = 2
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('SERVER_WORKERS', os.cpu_count() or 1)))
+    parser.add_argument('--bind', default=os.environ.get('SERVER_BIND', '127.0.0.1:8000'), help="host:port")
+    parser.add_argument('--async-mode', choices=['threading', 'eventlet', 'gevent'],
+                        default=os.environ.get('SERVER_ASYNC_MODE') or 'threading')
+    parser.add_argument('--access-log', action='store_true', help="log every request to stderr")
+    return parser.parse_args()
+
+
+def monkey_patch(async_mode):
+    # before anything imports socket or threading
+    if async_mode == 'eventlet':
+        import eventlet
+        eventlet.monkey_patch()
+    elif async_mode == 'gevent':
+        from gevent import monkey
+        monkey.patch_all()
+
+
+def _per_process(url):
+    # memory:// and local:// stores live in each worker, a write in one is not seen by the others
+    return not url or url.startswith(('memory://', 'local://'))
+
+
+def configure_environment(args, runtime_dir):
+    os.environ['SERVER_ASYNC_MODE'] = args.async_mode
+    if args.workers > 1:
+        os.environ.setdefault('SOCKETIO_MESSAGE_QUEUE', f"local://{os.path.join(runtime_dir, 'socketio.sock')}")
+        os.environ.setdefault('METRICS_DIR', os.path.join(runtime_dir, 'metrics'))
+        if os.environ.get('STICKY_SESSIONS', '').lower() not in ('1', 'true', 'yes', 'on'):
+            os.environ.setdefault('SOCKETIO_TRANSPORTS', 'websocket')
+        configure_shared_state()
+
+
+def configure_shared_state():
+    """Keep state that several workers read consistent between them, refuse what cannot be."""
+    queue_url = os.environ['SOCKETIO_MESSAGE_QUEUE']
+    # a menu change only invalidates the cache of the worker that committed it: share one Redis
+    # between all workers, or let the others expire their copy after MENU_CACHE_TTL seconds
+    if _per_process(os.environ.get('MENU_CACHE_URL')) and queue_url.startswith(('redis://', 'rediss://')):
+        os.environ.setdefault('MENU_CACHE_URL', queue_url)
+    if _per_process(os.environ.get('MENU_CACHE_URL')):
+        os.environ.setdefault('MENU_CACHE_TTL', str(MULTI_WORKER_MENU_CACHE_TTL))
+        if os.environ['MENU_CACHE_TTL'] in ('', '0'):
+            raise SystemExit("Error: with several workers and a per-process MENU_CACHE_URL, MENU_CACHE_TTL "
+                             "must be more than 0, or other workers show changed menus forever")
+    if os.environ.get('CART_STORE_URL', '').startswith('local://'):
+        raise SystemExit("Error: CART_STORE_URL=local:// keeps a cart per worker, use redis:// "
+                         "or leave it empty to keep carts in the database")
+
+
+def listen(bind):
+    host, _, port = bind.rpartition(':')
+    sock = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host.strip('[]') or '0.0.0.0', int(port)))
+    sock.listen(1024)
+    sock.set_inheritable(True)
+    return sock
+
+
+def fork(target, *args):
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        try:
+            target(*args)
+        except Exception as e:
+            print(f"Error: {target.__name__} in process {os.getpid()} failed: {e}", file=sys.stderr)
+            os._exit(1)
+        os._exit(0)
+    return pid
+
+
+def run_worker(app, sock, args, index):
+    from app import run_platform_fee_rollup, socketio
+    from models import db
+
+    # connections inherited from the parent belong to it, open fresh ones here
+    with app.app_context():
+        db.engine.dispose(close=False)
+    if index == 0 and app.config['PLATFORM_FEE_ROLLUP_SECONDS'] > 0:
+        socketio.start_background_task(run_platform_fee_rollup, app.config['PLATFORM_FEE_ROLLUP_SECONDS'])
+
+    if args.async_mode == 'eventlet':
+        import eventlet.wsgi
+        eventlet.wsgi.server(sock, app, log_output=args.access_log)
+    elif args.async_mode == 'gevent':
+        from gevent.pywsgi import WSGIServer
+        from geventwebsocket.handler import WebSocketHandler
+        WSGIServer(sock, app, handler_class=WebSocketHandler, log='default' if args.access_log else None).serve_forever()
+    else:
+        import logging
+        from werkzeug.serving import make_server
+        if not args.access_log:
+            logging.getLogger('werkzeug').setLevel(logging.WARNING)
+        host, port = sock.getsockname()[:2]
+        make_server(host, port, app, threaded=True, fd=sock.fileno()).serve_forever()
+
+
+def main():
+    args = parse_args()
+    monkey_patch(args.async_mode)
+    if not os.environ.get('SECRET_KEY'):
+        raise SystemExit("Error: set SECRET_KEY, all workers must sign session cookies with the same key")
+
+    runtime_dir = tempfile.mkdtemp(prefix='lieferspatz-')
+    configure_environment(args, runtime_dir)
+
+    hub = None
+    queue_url = os.environ.get('SOCKETIO_MESSAGE_QUEUE', '')
+    if queue_url.startswith('local://'):
+        from message_queue import run_hub
+        path = queue_url[len('local://'):]
+        hub = fork(run_hub, path)
+        while not os.path.exists(path):
+            time.sleep(0.01)
+
+    sock = listen(args.bind)
+    from app import app
+
+    workers = {fork(run_worker, app, sock, args, index): index for index in range(args.workers)}
+    print(f"Serving on http://{args.bind} with {args.workers} {args.async_mode} worker(s)", flush=True)
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        while True:
+            pid, status = os.waitpid(-1, 0)
+            if pid == hub:
+                print("Error: socket.io message hub exited, restarting it", file=sys.stderr)
+                hub = fork(run_hub, queue_url[len('local://'):])
+            elif pid in workers:
+                index = workers.pop(pid)
+                print(f"Error: worker {index} (pid {pid}) exited with status {status}, restarting it", file=sys.stderr)
+                time.sleep(1)
+                workers[fork(run_worker, app, sock, args, index)] = index
+    except (KeyboardInterrupt, ChildProcessError):
+        pass
+
+    for pid in list(workers) + ([hub] if hub else []):
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    for pid in list(workers) + ([hub] if hub else []):
+        try:
+            os.waitpid(pid, 0)
+        except ChildProcessError:
+            pass
+
+
+if __name__ == '__main__':
+    main()
@@ -10,18 +10,72 @@ document.addEventListener("DOMContentLoaded", function () {
         });
     });
 
-    // function to fetch restaurants dynamically
+    // function to fetch restaurants dynamically, the server answers 304 while the list is unchanged
+    let restaurantsEtag = null;
+
+    function renderRestaurants(restaurants) {
+        let restaurantList = document.querySelector(".list");
+        if (!restaurantList) {
+            return;
+        }
+        restaurantList.innerHTML = "";
+
+        if (restaurants.length === 0) {
+            let empty = document.createElement("div");
+            empty.className = "title-2 roboto-semi-bold-black-24px";
+            empty.textContent = "No registered restaurants available at the moment.";
+            restaurantList.appendChild(empty);
+            return;
+        }
+
+        let row = document.createElement("div");
+        row.className = "row";
+        restaurants.forEach(restaurant => {
+            let link = document.createElement("a");
+            link.href = restaurant.url;
+            link.className = "restaurant-card";
+
+            let card = document.createElement("div");
+            card.className = "card";
+            let content = document.createElement("div");
+            content.className = "text-content";
+
+            let title = document.createElement("div");
+            title.className = "title roboto-semi-bold-black-24px";
+            title.textContent = restaurant.name;
+            content.appendChild(title);
+
+            [
+                restaurant.description,
+                "Delivery Area: " + restaurant.delivery_areas,
+                "Working hours: " + restaurant.open_time + " - " + restaurant.close_time
+            ].forEach(text => {
+                let line = document.createElement("p");
+                line.className = "subtitle roboto-bold-black-14px";
+                line.textContent = text;
+                content.appendChild(line);
+            });
+
+            card.appendChild(content);
+            link.appendChild(card);
+            row.appendChild(link);
+        });
+        restaurantList.appendChild(row);
+    }
+
     function fetchRestaurants() {
-        fetch("/restaurants")
-            .then(response => response.text())
-            .then(html => {
-                let parser = new DOMParser();
-                let doc = parser.parseFromString(html, "text/html");
-                let newList = doc.querySelector(".list") ? doc.querySelector(".list").innerHTML : "";
-
-                let restaurantList = document.querySelector(".list");
-                if (restaurantList) {
-                    restaurantList.innerHTML = newList;
+        let headers = restaurantsEtag ? { "If-None-Match": restaurantsEtag } : {};
+        fetch("/api/restaurants", { headers: headers, cache: "no-store" })
+            .then(response => {
+                if (response.status === 304 || !response.ok) {
+                    return null;  // list unchanged (or not available), keep the current markup
+                }
+                restaurantsEtag = response.headers.get("ETag");
+                return response.json();
+            })
+            .then(data => {
+                if (data) {
+                    renderRestaurants(data.restaurants);
                 }
             })
             .catch(error => console.error("Error fetching restaurants:", error));
@@ -32,6 +86,35 @@ document.addEventListener("DOMContentLoaded", function () {
         setInterval(fetchRestaurants, 10000);
     }
 
+    // infinite scroll for order histories: append the next page when the sentinel comes into view
+    const loadMore = document.getElementById("load-more");
+    if (loadMore && "IntersectionObserver" in window) {
+        let loading = false;
+        const observer = new IntersectionObserver(entries => {
+            if (!entries[0].isIntersecting || loading || !loadMore.dataset.nextUrl) {
+                return;
+            }
+            loading = true;
+            fetch(loadMore.dataset.nextUrl)
+                .then(response => response.json())
+                .then(data => {
+                    document.getElementById(loadMore.dataset.target).insertAdjacentHTML("beforeend", data.html || "");
+                    if (data.next_url) {
+                        loadMore.dataset.nextUrl = data.next_url;
+                        // re-observe so a sentinel that is still visible triggers the next page
+                        observer.unobserve(loadMore);
+                        observer.observe(loadMore);
+                    } else {
+                        observer.disconnect();
+                        loadMore.remove();
+                    }
+                })
+                .catch(error => console.error("Error fetching orders:", error))
+                .finally(() => { loading = false; });
+        }, { rootMargin: "200px" });
+        observer.observe(loadMore);
+    }
+
 // function to fetch and display balance
 function fetchBalance() {
     fetch("/balance")
@@ -102,66 +185,42 @@ function fetchBalance() {
 });
 
 
-// establish WebSocket connection
-var socket = io.connect('http://localhost:5000');
-
-// function to join a restaurant WebSocket room
-function joinRestaurantRoom(restaurantId) {
-    socket.emit('join_restaurant', { restaurant_id: restaurantId });
-}
-
-// function to handle new order notifications
-socket.on('new_order', function(data) {
-    console.log("New order received:", data);
-    if (data.restaurant_id == window.RESTAURANT_ID) {
-        // instead of reloading the page, appending the new order to an order list
-        let orderList = document.getElementById('order-list');
-        let newOrderItem = document.createElement('li');
-        newOrderItem.innerText = "New Order ID: " + data.order_id;
-        orderList.appendChild(newOrderItem);
-        alert("New order received! Order ID: " + data.order_id);
-    }
-});
+// establish WebSocket connection (only on pages that load the Socket.IO client); websocket
+// first, since with several server workers long-polling only works behind sticky sessions
+var socket = typeof io !== "undefined" ? io({ transports: ["websocket", "polling"] }) : null;
 
 if (!sessionStorage.getItem('tab_session_id')) {
     sessionStorage.setItem('tab_session_id', crypto.randomUUID());
 }
 const tabSessionId = sessionStorage.getItem('tab_session_id');
 
-socket.emit('join_user', {
-    user_id: USER_ID,
-    tab_session_id: TAB_SESSION_ID
-});
-
-const userId = 'USER_ID';
-// include tab_session_id in all outgoing requests
-fetch(`/some_endpoint?tab_session_id=${tabSessionId}`, {
-    method: 'POST',
-    body: JSON.stringify({ user_id: userId })
-});
-
-document.getElementById('login-form').addEventListener('submit', function (e) {
-    const tabSessionId = sessionStorage.getItem('tab_session_id');
-    const formData = new FormData(this);
-    formData.append('tab_session_id', tabSessionId);
+// function to join a restaurant WebSocket room
+function joinRestaurantRoom(restaurantId) {
+    socket.emit('join_restaurant', { restaurant_id: restaurantId });
+}
 
-    fetch('/login', {
-        method: 'POST',
-        body: formData
-    })
-    .then(response => response.json())
-    .then(data => {
-        if (data.success) {
-            window.location.href = '/home';
+if (socket) {
+    // (re)join the rooms on every connect so reconnects keep receiving events
+    socket.on('connect', function () {
+        let restaurantId = document.getElementById("restaurant-id")?.value;
+        if (restaurantId) {
+            joinRestaurantRoom(restaurantId);
         } else {
-            alert(data.message);
+            socket.emit('join_customer');
         }
-    })
-    .catch(error => console.error('Login error:', error));
+    });
 
-    e.preventDefault();
-});
+    // order events are pushed after commit, re-render the orders page instead of polling
+    socket.on('order_created', function (data) {
+        console.log("New order received:", data);
+        location.reload();
+    });
 
+    socket.on('order_status_changed', function (data) {
+        console.log("Order status changed:", data);
+        location.reload();
+    });
+}
 
 // define order statuses
 let orderStatuses = {
@@ -181,43 +240,68 @@ function updateOrderStatus(orderId, status) {
     })
     .then(response => response.json())
     .then(data => {
-        console.log('Order status updated:', data);
-        
-        // update the status on the frontend
-        document.getElementById(`order-status-${orderId}`).innerText = data.orderStatus;
-
-        // if available, update the balances as well
-        if (data.customerBalance !== undefined) {
-            document.getElementById(`customer-balance-${orderId}`).innerText = `Customer Balance: €${data.customerBalance}`;
-        }
-
-        if (data.restaurantBalance !== undefined) {
-            document.getElementById(`restaurant-balance-${orderId}`).innerText = `Restaurant Balance: €${data.restaurantBalance}`;
-        }
+        // the change is only queued, order_status_changed reloads the page once it is applied
+        console.log('Order status update:', data);
     })
     .catch(error => {
         console.error('Error updating status:', error);
     });
 }
 
+// cart changes go through the cart API, the page is only reloaded when the cart becomes empty
+function cartRequest(itemId, method) {
+    return fetch(`/api/cart/items/${itemId}`, { method: method })
+    .then(response => {
+        if (!response.ok) {
+            return response.json().then(data => { throw new Error(data.error || response.statusText); });
+        }
+        return response.json();
+    });
+}
+
+function renderCart(cart) {
+    if (cart.items.length === 0) {
+        location.reload();
+        return;
+    }
+    let quantities = {};
+    cart.items.forEach(item => { quantities[item.MenuItemID] = item.Quantity; });
+
+    document.querySelectorAll(".cart-item[data-item-id]").forEach(row => {
+        let quantity = quantities[row.getAttribute("data-item-id")];
+        if (quantity === undefined) {
+            row.remove();
+        } else {
+            row.querySelector(".quantity-display").innerText = quantity;
+        }
+    });
+
+    let total = document.getElementById("cart-total");
+    if (total) {
+        total.innerText = cart.total;
+    }
+}
+
 document.addEventListener("DOMContentLoaded", function () {
     document.querySelectorAll(".add-to-cart").forEach(button => {
         button.addEventListener("click", function () {
             let itemId = this.getAttribute("data-item-id");
 
-            fetch(`/cart/add/${itemId}`, { method: "GET" })
-            .then(response => response.text())
-            .then(() => {
-                alert("Item added to cart!");
-                location.reload(); // Refresh the page to update the cart
-            })
+            cartRequest(itemId, "POST")
+            .then(() => alert("Item added to cart!"))
             .catch(error => console.error("Error adding to cart:", error));
         });
     });
-});
 
+    document.querySelectorAll(".quantity-button[data-item-id]").forEach(button => {
+        button.addEventListener("click", function (event) {
+            event.preventDefault(); // the link is the fallback without JavaScript
+            let itemId = this.getAttribute("data-item-id");
+            let method = this.getAttribute("data-action") === "remove" ? "DELETE" : "POST";
 
-document.addEventListener("DOMContentLoaded", function() {
-    let cartItems = JSON.parse('{{ cart_items | tojson | safe }}');
-    document.getElementById("items-data").value = JSON.stringify(cartItems);
-});
\ No newline at end of file
+            cartRequest(itemId, method)
+            .then(renderCart)
+            .catch(error => console.error("Error updating cart:", error));
+        });
+    });
+});
@@ -0,0 +1,82 @@
+import os
+import tempfile
+from datetime import time as dtime
+
+# the app reads its configuration at import time, point it at a throwaway database first
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}"
+os.environ['JOB_WORKERS'] = '0'
+os.environ['PLATFORM_FEE_ROLLUP_SECONDS'] = '0'
+os.environ['PASSWORD_WORKERS'] = '0'
+os.environ['SLOW_QUERY_MS'] = '0'
+
+import pytest  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from app import app as flask_app  # noqa: E402
+from models import db, User, UserType, Customer, Restaurant, DeliveryArea, MenuItem  # noqa: E402
+
+
+@pytest.fixture
+def database():
+    """The app on empty tables, without an application context: test client requests then get their own
+    context (and ``g``) each, as in production."""
+    with flask_app.app_context():
+        db.create_all()
+    yield flask_app
+    with flask_app.app_context():
+        db.drop_all()
+
+
+@pytest.fixture
+def app(database):
+    """The app on empty tables with an application context pushed, for tests that use ``db.session`` directly."""
+    with database.app_context():
+        yield database
+        db.session.remove()
+
+
+@pytest.fixture
+def restaurant(app):
+    """An always open restaurant (ID 1, user 1) delivering to 47051, with two menu items."""
+    db.session.add(User(UserID=1, EmailAddress='restaurant@test', Password='x', UserType=UserType.Restaurant))
+    db.session.add(Restaurant(RestaurantID=1, UserID=1, Name="Mama's Pizza", Address='Hauptstr. 1', PostalCode='47051',
+                              Description='Pizza and pasta', OpenTime=dtime(0), CloseTime=dtime(0)))
+    db.session.add(DeliveryArea(RestaurantID=1, PostalCode='47051'))
+    db.session.add_all([
+        MenuItem(MenuItemID=1, RestaurantID=1, Name='Pizza Margherita', Description='tomato, mozzarella', Price=8,
+                 Category='Pizza'),
+        MenuItem(MenuItemID=2, RestaurantID=1, Name='Lasagne', Description='beef', Price=9, Category='Pasta'),
+    ])
+    db.session.commit()
+    return db.session.get(Restaurant, 1)
+
+
+@pytest.fixture
+def customer(app):
+    """A customer (user 2) in 47051."""
+    db.session.add(User(UserID=2, EmailAddress='customer@test', Password='x', UserType=UserType.Customer))
+    db.session.add(Customer(UserID=2, FirstName='Test', LastName='Kunde', Address='Hauptstr. 2', PostNumber='47051',
+                            Balance=1000))
+    db.session.commit()
+    return db.session.get(Customer, 2)
+
+
+def _reject_update_returning(conn, cursor, statement, parameters, context, executemany):
+    # as MySQL would
+    if statement.startswith('UPDATE') and 'RETURNING' in statement:
+        raise AssertionError(f"UPDATE ... RETURNING on a dialect without it: {statement}")
+
+
+@pytest.fixture
+def without_update_returning(app, monkeypatch):
+    """Make the app take its paths for dialects without UPDATE ... RETURNING (MySQL), and fail if it does not."""
+    monkeypatch.setattr(db.engine.dialect, 'update_returning', False)
+    event.listen(db.engine, 'before_cursor_execute', _reject_update_returning)
+    yield
+    event.remove(db.engine, 'before_cursor_execute', _reject_update_returning)
+
+
+def log_in(client, user_id, user_type):
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+        session['user_type'] = user_type.value
@@ -0,0 +1,64 @@
+import pytest
+
+import cart
+from models import db, UserType, CartItem, MenuItem, Order
+from tests.conftest import log_in
+
+
+@pytest.fixture(params=['upsert', 'update_or_insert'])
+def client(request, app, restaurant, customer, monkeypatch):
+    if request.param == 'update_or_insert':
+        # what dialects without INSERT ... ON CONFLICT and UPDATE ... RETURNING (MySQL) run
+        monkeypatch.setattr(cart, '_UPSERT_INSERTS', {})
+        monkeypatch.setattr(db.engine.dialect, 'update_returning', False)
+    client = app.test_client()
+    log_in(client, customer.UserID, UserType.Customer)
+    return client
+
+
+def quantities(response):
+    assert response.status_code == 200, response.get_json()
+    return {item['MenuItemID']: item['Quantity'] for item in response.get_json()['items']}
+
+
+def test_add_increments_one_line(client):
+    assert quantities(client.post('/api/cart/items/1', json={'quantity': 2})) == {1: 2}
+    assert quantities(client.post('/api/cart/items/1', json={'quantity': 3})) == {1: 5}
+    assert quantities(client.post('/api/cart/items/2')) == {1: 5, 2: 1}
+    assert CartItem.query.filter_by(UserID=2, MenuItemID=1).count() == 1
+
+
+def test_set_and_remove(client):
+    client.post('/api/cart/items/1', json={'quantity': 3})
+    assert quantities(client.put('/api/cart/items/1', json={'quantity': 7})) == {1: 7}
+    assert quantities(client.put('/api/cart/items/2', json={'quantity': 2})) == {1: 7, 2: 2}
+    assert quantities(client.delete('/api/cart/items/1')) == {1: 6, 2: 2}
+    assert quantities(client.put('/api/cart/items/2', json={'quantity': 0})) == {1: 6}
+
+
+def test_unknown_menu_item(client):
+    response = client.post('/api/cart/items/99')
+    assert response.status_code == 404
+    assert quantities(client.get('/api/cart')) == {}
+
+
+def test_add_to_cart_page(client):
+    response = client.get('/add_to_cart/1')
+    assert response.status_code == 302
+    assert quantities(client.get('/api/cart')) == {1: 1}
+
+
+def test_unavailable_menu_item(client):
+    client.post('/api/cart/items/2')
+    MenuItem.query.filter_by(MenuItemID=2).update({'IsAvailable': False})
+    db.session.commit()
+
+    response = client.post('/api/cart/items/2')
+    assert response.status_code == 409
+    assert client.put('/api/cart/items/2', json={'quantity': 3}).status_code == 409
+    assert quantities(client.get('/api/cart')) == {2: 1}
+
+    # the line added before the restaurant marked the item unavailable is not ordered
+    response = client.post('/create_order', data={'note': ''})
+    assert response.status_code == 302 and response.location.endswith('/cart')
+    assert Order.query.count() == 0
@@ -0,0 +1,36 @@
+from datetime import datetime
+
+from delivery_index import DeliveryIndex
+from models import db
+
+
+def test_rebuild_without_changes_keeps_generation(restaurant):
+    index = DeliveryIndex()
+    index.rebuild()
+    generation = index.generation
+    listing = index.open_restaurants_for('47051', datetime(2024, 1, 1, 12))
+
+    # the max_age rebuild
+    index.rebuild()
+    assert index.generation == generation
+    assert index.open_restaurants_for('47051', datetime(2024, 1, 1, 12)) is listing
+
+    restaurant.Description = 'Pizza, pasta and salads'
+    db.session.commit()
+    index.rebuild()
+    assert index.generation == generation + 1
+    assert index.restaurants_for('47051')[0].Description == 'Pizza, pasta and salads'
+
+
+def test_version_is_a_content_hash(restaurant):
+    # another worker, or this one after a restart, has its own generation but the same versions
+    first, second = DeliveryIndex(), DeliveryIndex()
+    first.rebuild()
+    second.rebuild()
+    [summary] = first.restaurants_for('47051')
+    assert second.restaurants_for('47051')[0].Version == summary.Version
+
+    restaurant.Name = "Mama's Trattoria"
+    db.session.commit()
+    second.rebuild()
+    assert second.restaurants_for('47051')[0].Version != summary.Version
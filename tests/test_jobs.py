@@ -0,0 +1,127 @@
+from datetime import timedelta
+import json
+
+import pytest
+from sqlalchemy import event
+
+import jobs
+from jobs import job_queue, job_handler, enqueue, _utcnow, QUEUED, RUNNING, DONE, FAILED
+from models import db, Job
+
+ran = []
+
+
+@job_handler('test_record')
+def record_job(value):
+    ran.append(value)
+
+
+def add_job(status, run_at, finished_at=None, locked_until=None):
+    job = Job(Kind='test_record', Payload=json.dumps({"value": status}), Status=status, Attempts=0, MaxAttempts=5,
+              RunAt=run_at, FinishedAt=finished_at, LockedUntil=locked_until)
+    db.session.add(job)
+    db.session.commit()
+    return job.JobID
+
+
+@pytest.fixture(params=['returning', 'select_then_update'])
+def claim_path(request, app):
+    if request.param == 'select_then_update':
+        request.getfixturevalue('without_update_returning')
+    return request.param
+
+
+def test_claims_expired_lease_then_oldest_queued(claim_path):
+    now = _utcnow()
+    newer = add_job(QUEUED, now - timedelta(seconds=5))
+    older = add_job(QUEUED, now - timedelta(seconds=10))
+    add_job(QUEUED, now + timedelta(hours=1))
+    add_job(RUNNING, now - timedelta(seconds=30), locked_until=now + timedelta(seconds=30))
+    expired = add_job(RUNNING, now - timedelta(seconds=1), locked_until=now - timedelta(seconds=1))
+
+    assert [job_queue._claim().JobID for _ in range(3)] == [expired, older, newer]
+    assert job_queue._claim() is None
+
+
+def test_claim_skips_a_job_claimed_concurrently(app, without_update_returning):
+    now = _utcnow()
+    first = add_job(QUEUED, now - timedelta(seconds=10))
+    second = add_job(QUEUED, now - timedelta(seconds=5))
+    claimed = []
+
+    def claim_first(conn, cursor, statement, parameters, context, executemany):
+        # another worker claims the job this one just selected
+        if statement.startswith('UPDATE "Jobs"') and not claimed:
+            claimed.append(statement)
+            cursor.execute('UPDATE "Jobs" SET "Status" = ?, "Attempts" = 1, "LockedUntil" = ? WHERE "JobID" = ?',
+                           (RUNNING, now + timedelta(seconds=60), first))
+
+    event.listen(db.engine, 'before_cursor_execute', claim_first)
+    try:
+        job = job_queue._claim()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', claim_first)
+    assert claimed and (job.JobID, job.Attempts) == (second, 1)
+    assert job_queue._claim() is None
+
+
+def test_stats_count_unfinished_jobs_only(app):
+    now = _utcnow()
+    add_job(QUEUED, now - timedelta(seconds=2))
+    add_job(RUNNING, now, locked_until=now + timedelta(seconds=60))
+    add_job(DONE, now, finished_at=now)
+    add_job(FAILED, now, finished_at=now)
+
+    stats = job_queue.stats()
+    assert stats["depth"] == {QUEUED: 1, RUNNING: 1}
+    assert stats["lag_seconds"] >= 2
+
+
+def test_scrape_runs_stats_once(app, monkeypatch):
+    monkeypatch.setattr(jobs, '_scraped', (0.0, None))
+    queries = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        queries.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        body = app.test_client().get('/metrics').get_data(as_text=True)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    assert 'lieferspatz_job_queue_depth{status="queued"} 0.0' in body
+    assert sum('GROUP BY "Jobs"."Status"' in query for query in queries) == 1
+
+
+def test_idle_worker_prunes_old_finished_jobs(app, monkeypatch):
+    now = _utcnow()
+    old = [add_job(status, now - timedelta(days=9), finished_at=now - timedelta(days=8)) for status in (DONE, FAILED) * 3]
+    recent = add_job(DONE, now, finished_at=now - timedelta(days=1))
+    queued = add_job(QUEUED, now + timedelta(hours=1))
+    monkeypatch.setattr(job_queue, 'retention', timedelta(days=7))
+    monkeypatch.setattr(job_queue, 'prune_seconds', 300)
+    monkeypatch.setattr(job_queue, '_pruned_at', None)
+
+    job_queue._maybe_prune()
+    remaining = set(db.session.execute(db.select(Job.JobID)).scalars())
+    assert remaining == {recent, queued} and not remaining & set(old)
+
+    # not again within prune_seconds
+    add_job(DONE, now, finished_at=now - timedelta(days=8))
+    job_queue._maybe_prune()
+    assert db.session.execute(db.select(db.func.count()).select_from(Job)).scalar() == 3
+
+
+def test_prune_deletes_in_batches(app):
+    now = _utcnow()
+    for _ in range(5):
+        add_job(DONE, now, finished_at=now - timedelta(days=2))
+    assert job_queue.prune(timedelta(days=1), batch_size=2) == 5
+    assert db.session.execute(db.select(db.func.count()).select_from(Job)).scalar() == 0
+
+
+def test_run_once_runs_a_queued_job(claim_path):
+    enqueue('test_record', {"value": "hello"})
+    db.session.commit()
+    assert job_queue.run_once()
+    assert ran[-1] == "hello"
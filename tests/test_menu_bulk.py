@@ -0,0 +1,24 @@
+import sqlite3
+
+import menu_bulk
+from models import db, MenuItem
+
+
+def test_replace_import_binds_chunks_only(app, restaurant):
+    db.session.execute(db.insert(MenuItem), [
+        {"MenuItemID": i, "RestaurantID": 1, "Name": f"Item {i}", "Description": "", "Price": 5, "Category": "Pizza"}
+        for i in range(3, 1003)
+    ])
+    db.session.commit()
+    # far below SQLite's default, an upload larger than the limit used to fail with "too many SQL variables"
+    connection = db.session.connection().connection.driver_connection
+    limit = connection.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, menu_bulk.CHUNK_SIZE + 50)
+    try:
+        counts = menu_bulk.import_menu(1, [{"MenuItemID": i, "Name": f"Item {i}", "Price": "6"} for i in range(1, 901)],
+                                       replace=True)
+    finally:
+        connection.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, limit)
+    db.session.commit()
+
+    assert counts == {"created": 0, "updated": 900, "deleted": 102}
+    assert db.session.execute(db.select(db.func.max(MenuItem.MenuItemID))).scalar() == 900
@@ -0,0 +1,58 @@
+from threading import Event, Thread
+import time
+
+import metrics
+from metrics import Registry
+
+
+def test_timer_decorator_times_overlapping_calls_separately():
+    registry = Registry()
+    histogram = registry.histogram('test_seconds', "Test durations.", buckets=(0.1, 0.3))
+    slow_running, fast_done = Event(), Event()
+
+    # like a route, one decorated function serving overlapping requests
+    @histogram.time(route='test')
+    def handle(slow):
+        if slow:
+            time.sleep(0.3)
+            # the fast call starts and ends before this one
+            slow_running.set()
+            fast_done.wait(5)
+        else:
+            time.sleep(0.01)
+
+    def run_fast():
+        slow_running.wait(5)
+        handle(False)
+        fast_done.set()
+
+    threads = [Thread(target=handle, args=(True,)), Thread(target=run_fast)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # per-bucket counts: <= 0.1, <= 0.3, +Inf, then sum and count
+    *buckets, total, count = histogram._snapshot()[(('route', 'test'),)]
+    assert count == 2
+    assert buckets == [1, 0, 1]
+    assert total >= 0.31
+
+
+def test_timer_as_context_manager():
+    registry = Registry()
+    histogram = registry.histogram('test_seconds', "Test durations.")
+    with histogram.time():
+        pass
+    assert histogram._snapshot()[()][-1] == 1
+
+
+def test_user_join_is_counted_not_printed(database, capsys):
+    from events import socketio
+
+    before = metrics.SOCKET_JOINS._values.get((('kind', 'user'),), 0)
+    client = socketio.test_client(database)
+    client.emit('join_user', {'user_id': 7, 'tab_session_id': 'tab'})
+    client.disconnect()
+    assert metrics.SOCKET_JOINS._values[(('kind', 'user'),)] == before + 1
+    assert 'joined room' not in capsys.readouterr().out
@@ -0,0 +1,19 @@
+from sqlalchemy.dialects import postgresql
+
+from models import db, MenuItem
+
+
+def test_menu_item_version_is_quoted():
+    # an unquoted Version folds to version on Postgres, which has no such column
+    sql = str(db.update(MenuItem).values(Price=1).compile(dialect=postgresql.dialect()))
+    assert '"Version"=("Version" + ' in sql
+
+
+def test_every_update_bumps_menu_item_version(restaurant):
+    item = db.session.get(MenuItem, 1)
+    item.Price = 9
+    db.session.commit()
+    db.session.execute(db.update(MenuItem).where(MenuItem.MenuItemID == 1).values(Name='Margherita'))
+    db.session.commit()
+    db.session.refresh(item)
+    assert item.Version == 2
@@ -0,0 +1,60 @@
+import pytest
+
+from jobs import job_queue
+from models import db, Job, Order
+from order_state import PROCESSING, BEING_PREPARED, COMPLETED
+
+
+@pytest.fixture
+def order(app, restaurant, customer):
+    order = Order(CustomerID=customer.UserID, RestaurantID=restaurant.RestaurantID, Status=PROCESSING, TotalAmount=10,
+                  PlatformFee=1.5, RestaurantAmount=8.5)
+    db.session.add(order)
+    db.session.commit()
+    return order.OrderID
+
+
+def job_count():
+    return db.session.execute(db.select(db.func.count()).select_from(Job)).scalar()
+
+
+def flashes(client):
+    with client.session_transaction() as session:
+        return [message for _, message in session.pop('_flashes', [])]
+
+
+def status(order_id):
+    db.session.expire_all()
+    return db.session.get(Order, order_id).Status
+
+
+def test_update_order_status_is_only_queued(app, order):
+    client = app.test_client()
+    response = client.post(f'/update-order-status/{order}', json={'status': BEING_PREPARED})
+    assert response.status_code == 202
+    assert response.get_json()['status'] == 'queued'
+    assert 'orderStatus' not in response.get_json()
+    assert status(order) == PROCESSING
+
+    assert job_queue.run_once()
+    assert status(order) == BEING_PREPARED
+
+
+def test_update_to_the_current_status_queues_nothing(app, order):
+    response = app.test_client().post(f'/update-order-status/{order}', json={'status': PROCESSING})
+    assert response.status_code == 200
+    assert response.get_json()['orderStatus'] == PROCESSING
+    assert job_count() == 0
+
+
+def test_restaurant_actions_say_queued(app, order):
+    client = app.test_client()
+    assert client.post(f'/accept_or_reject_order/{order}/accept').status_code == 302
+    assert flashes(client) == [f"Order #{order}: acceptance queued."]
+    assert status(order) == PROCESSING
+
+    assert job_queue.run_once()
+    assert client.post(f'/mark_as_done/{order}').status_code == 302
+    assert flashes(client) == [f"Order #{order}: completion queued."]
+    assert job_queue.run_once()
+    assert status(order) == COMPLETED
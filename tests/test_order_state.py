@@ -0,0 +1,55 @@
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import event
+
+from models import db, Customer, Order, Restaurant
+from order_state import transition, TransitionConflict, PROCESSING, BEING_PREPARED, COMPLETED, CANCELLED
+
+
+@pytest.fixture(params=['returning', 'update_then_select'])
+def order(request, app, restaurant, customer):
+    if request.param == 'update_then_select':
+        request.getfixturevalue('without_update_returning')
+    order = Order(CustomerID=customer.UserID, RestaurantID=restaurant.RestaurantID, Status=PROCESSING, TotalAmount=10,
+                  PlatformFee=1.5, RestaurantAmount=8.5)
+    db.session.add(order)
+    db.session.commit()
+    return order.OrderID
+
+
+def test_complete_credits_the_restaurant(order):
+    accepted = transition(order, BEING_PREPARED, PROCESSING)
+    completed = transition(order, COMPLETED, BEING_PREPARED)
+    db.session.commit()
+
+    assert (accepted.previous_status, accepted.status, accepted.version) == (PROCESSING, BEING_PREPARED, 1)
+    assert (completed.previous_status, completed.status, completed.version) == (BEING_PREPARED, COMPLETED, 2)
+    assert db.session.get(Order, order).Status == COMPLETED
+    assert db.session.get(Restaurant, 1).Balance == Decimal('8.50')
+    assert transition(order, COMPLETED) is None
+
+
+def test_cancel_refunds_the_customer(order):
+    transition(order, CANCELLED)
+    db.session.commit()
+    assert db.session.get(Customer, 2).Balance == 1010
+
+
+def test_concurrent_change_conflicts(order):
+    bumped = []
+
+    def bump_version(conn, cursor, statement, parameters, context, executemany):
+        # another worker changes the order between our read and our UPDATE
+        if statement.startswith('UPDATE "Orders"') and not bumped:
+            bumped.append(statement)
+            cursor.execute('UPDATE "Orders" SET "Version" = "Version" + 1')
+
+    event.listen(db.engine, 'before_cursor_execute', bump_version)
+    try:
+        with pytest.raises(TransitionConflict):
+            transition(order, BEING_PREPARED)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', bump_version)
+    db.session.rollback()
+    assert db.session.get(Order, order).Status == PROCESSING
@@ -0,0 +1,19 @@
+from plan_check import check_routes, full_scans
+from models import db
+
+
+def test_routes_use_indexes(database):
+    results = check_routes(database)
+    failures = [(name, ' '.join(statement.split()), scans) for name, statement, scans in results if scans]
+    assert not failures
+    # every step ran queries the check could see
+    assert {'login', 'create_order', 'job worker: accept', 'metrics', 'api_search', 'api_menu_items, delete',
+            'restaurant_menu', 'restaurant_delete_item', 'delete_items', 'sign_up_customer', 'sign_up_restaurant'} <= {
+        name for name, _, _ in results}
+
+
+def test_full_scans_are_reported(app):
+    with db.engine.connect() as connection:
+        assert full_scans(connection, 'SELECT * FROM "Orders" WHERE "Notes" = ?', ('x',)) == ['SCAN Orders']
+        assert full_scans(connection, 'SELECT * FROM "Orders" WHERE "CustomerID" = ? ORDER BY "TotalAmount"', (1,))
+        assert not full_scans(connection, 'SELECT * FROM "CartItems" WHERE "UserID" = ? ORDER BY "Quantity"', (1,))
@@ -0,0 +1,42 @@
+from delivery_index import DeliveryIndex, delivery_index
+from models import db, UserType
+from tests.conftest import log_in
+
+
+def test_api_restaurants_etag_is_the_same_in_every_worker(app, restaurant, customer, monkeypatch):
+    client = app.test_client()
+    log_in(client, customer.UserID, UserType.Customer)
+    first = client.get('/api/restaurants')
+    assert first.status_code == 200
+    assert [r['name'] for r in first.get_json()['restaurants']] == ["Mama's Pizza"]
+
+    # another worker, or this one after a restart, with an index of its own
+    other = DeliveryIndex()
+    other.generation = 41
+    monkeypatch.setattr('app.delivery_index', other)
+    assert client.get('/api/restaurants', headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+
+    restaurant.Description = 'Pizza, pasta and salads'
+    db.session.commit()
+    other.invalidate()  # the commit hook invalidates the module's index only
+    changed = client.get('/api/restaurants', headers={'If-None-Match': first.headers['ETag']})
+    assert changed.status_code == 200
+    assert changed.get_json()['restaurants'][0]['description'] == 'Pizza, pasta and salads'
+
+
+def test_restaurant_cards_survive_a_restart(app, restaurant, customer, monkeypatch):
+    client = app.test_client()
+    log_in(client, customer.UserID, UserType.Customer)
+    assert b'Pizza and pasta' in client.get('/restaurants').data
+
+    # the fragment cache (possibly shared) keeps the card, the restarted worker's index starts over
+    restaurant.Description = 'Pizza, pasta and salads'
+    db.session.commit()
+    # ... and reaches the generation the cards were cached under
+    restarted = DeliveryIndex()
+    restarted.rebuild()
+    restarted.generation = delivery_index.generation
+    monkeypatch.setattr('app.delivery_index', restarted)
+    page = client.get('/restaurants').data
+    assert b'Pizza, pasta and salads' in page
+    assert b'Pizza and pasta' not in page
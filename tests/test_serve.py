@@ -0,0 +1,95 @@
+from argparse import Namespace
+import os
+import time
+
+import pytest
+
+import serve
+from cache import menu_cache, configure_menu_cache
+from models import db, MenuItem
+
+SHARED_STATE = ['SOCKETIO_MESSAGE_QUEUE', 'METRICS_DIR', 'SOCKETIO_TRANSPORTS', 'SERVER_ASYNC_MODE', 'STICKY_SESSIONS',
+                'MENU_CACHE_URL', 'MENU_CACHE_TTL', 'CART_STORE_URL']
+
+
+@pytest.fixture
+def environ(monkeypatch):
+    for name in SHARED_STATE:
+        monkeypatch.delenv(name, raising=False)
+    return monkeypatch
+
+
+def configure(workers, runtime_dir):
+    serve.configure_environment(Namespace(workers=workers, async_mode='threading'), str(runtime_dir))
+
+
+def test_single_worker_keeps_defaults(environ, tmp_path):
+    configure(1, tmp_path)
+    assert 'MENU_CACHE_TTL' not in os.environ
+    assert 'SOCKETIO_MESSAGE_QUEUE' not in os.environ
+
+
+def test_per_process_menu_cache_expires(environ, tmp_path):
+    configure(2, tmp_path)
+    assert os.environ['MENU_CACHE_TTL'] == str(serve.MULTI_WORKER_MENU_CACHE_TTL)
+
+
+def test_redis_message_queue_doubles_as_menu_cache(environ, tmp_path):
+    environ.setenv('SOCKETIO_MESSAGE_QUEUE', 'redis://cache:6379/0')
+    configure(2, tmp_path)
+    assert os.environ['MENU_CACHE_URL'] == 'redis://cache:6379/0'
+    assert 'MENU_CACHE_TTL' not in os.environ
+
+
+def test_refuses_per_process_menu_cache_without_ttl(environ, tmp_path):
+    environ.setenv('MENU_CACHE_TTL', '0')
+    with pytest.raises(SystemExit):
+        configure(2, tmp_path)
+
+
+def test_refuses_per_process_cart_store(environ, tmp_path):
+    environ.setenv('CART_STORE_URL', 'local://')
+    with pytest.raises(SystemExit):
+        configure(2, tmp_path)
+
+
+def test_menu_edit_reaches_the_other_worker(app, restaurant, environ, tmp_path):
+    configure(2, tmp_path)
+    environ.setitem(app.config, 'MENU_CACHE_URL', os.environ.get('MENU_CACHE_URL', 'memory://'))
+    environ.setitem(app.config, 'MENU_CACHE_TTL', int(os.environ['MENU_CACHE_TTL']))
+    configure_menu_cache(app)
+    assert menu_cache.get(1).items[0].Price == 8  # cached before the fork, like a warmed up worker
+
+    edited_read, edited_write = os.pipe()
+    seen_read, seen_write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        # the other worker: waits for the edit, then reads its own copy of the menu until it changes
+        status = 1
+        try:
+            db.engine.dispose(close=False)
+            os.read(edited_read, 1)
+            started = time.monotonic()
+            while time.monotonic() - started < serve.MULTI_WORKER_MENU_CACHE_TTL + 2:
+                db.session.remove()
+                price = menu_cache.get(1).items[0].Price
+                if price != 8:
+                    os.write(seen_write, str(price).encode())
+                    break
+                time.sleep(0.05)
+            status = 0
+        finally:
+            os._exit(status)
+
+    try:
+        db.session.get(MenuItem, 1).Price = 9.5
+        db.session.commit()
+        assert menu_cache.get(1).items[0].Price == 9.5
+        os.write(edited_write, b'x')
+        os.close(seen_write)
+        seen = os.read(seen_read, 64).decode()
+    finally:
+        os.waitpid(pid, 0)
+        environ.undo()
+        configure_menu_cache(app)
+    assert seen == '9.50'